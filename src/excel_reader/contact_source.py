@@ -0,0 +1,392 @@
+import os
+import time
+import importlib.util
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+import pandas as pd
+
+from excel_reader.workbook_watcher import read_sheet_signatures
+
+# O leitor de CSV do pyarrow (opcional) usa várias threads dentro de um mesmo arquivo
+_HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Resultado da leitura de uma aba: (nome, dados, erro, segundos)
+SheetResult = Tuple[str, Optional[pd.DataFrame], Optional[Exception], float]
+
+class SourceReader(ABC):
+    """Leitor aberto de uma fonte de contatos (usado com with)"""
+    
+    def __enter__(self) -> 'SourceReader':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """Libera os recursos do leitor"""
+        pass
+    
+    @property
+    @abstractmethod
+    def sheet_names(self) -> List[str]:
+        """Nomes de todas as abas (ou partições) da fonte, na ordem original"""
+    
+    @abstractmethod
+    def read(self, sheet_names: List[str]) -> Iterator[SheetResult]:
+        """
+        Lê as abas informadas.
+        
+        Args:
+            sheet_names: Abas a serem lidas
+        
+        Yields:
+            Tupla (aba, dados, erro, segundos) na ordem de sheet_names; dados é
+            None e erro é preenchido quando a aba não pode ser lida
+        """
+
+class ContactSource(ABC):
+    # Se os dados lidos podem ser guardados no cache em disco de WorkbookCache
+    supports_cache = False
+    # Se só as abas com nomes de meses são lidas (as demais são ignoradas)
+    month_sheets_only = True
+    
+    def __init__(self, path: str):
+        """
+        Inicializa uma fonte de contatos organizada em abas mensais.
+        
+        Args:
+            path: Caminho do arquivo ou diretório da fonte
+        """
+        self.path = path
+    
+    @abstractmethod
+    def open(self) -> SourceReader:
+        """
+        Abre a fonte para leitura.
+        
+        Returns:
+            Leitor a ser usado com with
+        """
+    
+    def sheet_signatures(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Lê uma assinatura barata do conteúdo de cada aba, usada para reler só as abas alteradas.
+        
+        Returns:
+            Dicionário aba -> assinatura (vazio se a fonte não tiver assinaturas)
+        """
+        return {}
+    
+    def stat(self) -> Optional[Tuple[int, int]]:
+        """
+        Obtém o estado atual da fonte para detectar alterações.
+        
+        Returns:
+            Tupla (mtime_ns, tamanho) ou None se a fonte não existir
+        """
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+def _parse_excel_sheets(path: str, sheet_names: List[str]) -> List[SheetResult]:
+    """
+    Lê algumas abas de uma planilha num processo separado.
+    
+    Cada processo abre a planilha uma única vez e lê o seu lote de abas; os
+    DataFrames voltam ao processo principal serializados pelo pickle.
+    
+    Args:
+        path: Caminho da planilha
+        sheet_names: Abas do lote
+    
+    Returns:
+        Lista de tuplas (aba, dados, erro, segundos)
+    """
+    results = []
+    with pd.ExcelFile(path) as excel_file:
+        for sheet in sheet_names:
+            start = time.perf_counter()
+            try:
+                results.append((sheet, excel_file.parse(sheet_name=sheet), None, time.perf_counter() - start))
+            except Exception as e:
+                results.append((sheet, None, e, time.perf_counter() - start))
+    return results
+
+class _ExcelReader(SourceReader):
+    def __init__(self, path: str, processes: Optional[int] = None):
+        # A planilha é aberta uma única vez; todas as abas são lidas do mesmo arquivo aberto
+        self._path = path
+        self._processes = processes
+        self._excel_file = pd.ExcelFile(path)
+    
+    def close(self) -> None:
+        self._excel_file.close()
+    
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._excel_file.sheet_names)
+    
+    def read(self, sheet_names: List[str]) -> Iterator[SheetResult]:
+        if self._processes and self._processes > 1 and len(sheet_names) > 1:
+            yield from self._read_in_processes(sheet_names)
+            return
+        
+        # O openpyxl não permite ler abas do mesmo arquivo em paralelo
+        for sheet in sheet_names:
+            start = time.perf_counter()
+            try:
+                df = self._excel_file.parse(sheet_name=sheet)
+                yield sheet, df, None, time.perf_counter() - start
+            except Exception as e:
+                yield sheet, None, e, time.perf_counter() - start
+    
+    def _read_in_processes(self, sheet_names: List[str]) -> Iterator[SheetResult]:
+        """
+        Lê as abas em paralelo, distribuídas em lotes entre vários processos.
+        
+        Args:
+            sheet_names: Abas a serem lidas
+        
+        Yields:
+            Tupla (aba, dados, erro, segundos) na ordem de sheet_names
+        """
+        workers = min(self._processes, len(sheet_names))
+        # Distribuição alternada, para que as abas grandes não caiam no mesmo lote
+        batches = [sheet_names[index::workers] for index in range(workers)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for batch in batches:
+                future = executor.submit(_parse_excel_sheets, self._path, batch)
+                for sheet in batch:
+                    futures[sheet] = future
+            
+            results = {}
+            for sheet in sheet_names:
+                if sheet not in results:
+                    batch_future = futures[sheet]
+                    try:
+                        for result in batch_future.result():
+                            results[result[0]] = result
+                    except Exception as e:
+                        # Falha do processo (ex.: falta de memória): o lote inteiro fica sem dados
+                        for other, future in futures.items():
+                            if future is batch_future:
+                                results[other] = (other, None, e, 0.0)
+                yield results.pop(sheet)
+
+class ExcelSource(ContactSource):
+    supports_cache = True
+    
+    def __init__(self, path: str, processes: Optional[int] = None):
+        """
+        Inicializa a fonte de contatos de uma planilha Excel.
+        
+        Args:
+            path: Caminho da planilha
+            processes: Quantidade de processos para ler várias abas em paralelo
+                (opcional; por padrão as abas são lidas em sequência)
+        """
+        super().__init__(path)
+        self.processes = processes
+    
+    def open(self) -> SourceReader:
+        return _ExcelReader(self.path, self.processes)
+    
+    def sheet_signatures(self) -> Dict[str, Tuple[int, int]]:
+        return read_sheet_signatures(self.path)
+
+class _PartitionReader(SourceReader):
+    def __init__(self, source: 'PartitionedFileSource'):
+        self._source = source
+        self._partitions = source.partitions()
+    
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._partitions)
+    
+    def _read_one(self, sheet: str) -> SheetResult:
+        start = time.perf_counter()
+        try:
+            if sheet not in self._partitions:
+                raise KeyError(f"Partição '{sheet}' não encontrada")
+            df = self._source.read_file(self._partitions[sheet])
+            return sheet, df, None, time.perf_counter() - start
+        except Exception as e:
+            return sheet, None, e, time.perf_counter() - start
+    
+    def read(self, sheet_names: List[str]) -> Iterator[SheetResult]:
+        if len(sheet_names) <= 1 or self._source.max_workers == 1:
+            yield from map(self._read_one, sheet_names)
+            return
+        
+        # Cada partição é um arquivo independente, então são lidas em paralelo
+        with ThreadPoolExecutor(max_workers=self._source.max_workers) as executor:
+            yield from executor.map(self._read_one, sheet_names)
+
+class PartitionedFileSource(ContactSource):
+    # Extensões de arquivo reconhecidas como partições
+    extensions = ()
+    # Os arquivos do diretório já são as partições escolhidas; todos são lidos
+    month_sheets_only = False
+    
+    def __init__(self, path: str, max_workers: Optional[int] = None, **read_options: Any):
+        """
+        Inicializa uma fonte em que cada arquivo é uma aba.
+        
+        O caminho pode ser um único arquivo (uma aba com o nome do arquivo) ou
+        um diretório com um arquivo por aba, como "Janeiro 2025.csv". Ao
+        contrário das planilhas Excel, os nomes dos arquivos não precisam ser
+        meses (ex.: "contatos.csv").
+        
+        Args:
+            path: Caminho do arquivo ou diretório
+            max_workers: Máximo de arquivos lidos em paralelo (opcional)
+            read_options: Opções repassadas à função de leitura do pandas
+        """
+        super().__init__(path)
+        self.max_workers = max_workers
+        self.read_options = read_options
+    
+    def partitions(self) -> Dict[str, str]:
+        """
+        Lista os arquivos da fonte.
+        
+        Returns:
+            Dicionário nome da aba -> caminho do arquivo, em ordem alfabética
+        """
+        if os.path.isdir(self.path):
+            files = sorted(name for name in os.listdir(self.path)
+                           if name.lower().endswith(self.extensions))
+            return {os.path.splitext(name)[0]: os.path.join(self.path, name) for name in files}
+        return {os.path.splitext(os.path.basename(self.path))[0]: self.path}
+    
+    def open(self) -> SourceReader:
+        return _PartitionReader(self)
+    
+    @abstractmethod
+    def read_file(self, file_path: str) -> pd.DataFrame:
+        """
+        Lê um arquivo da fonte.
+        
+        Args:
+            file_path: Caminho do arquivo
+        
+        Returns:
+            Dados do arquivo
+        """
+    
+    def sheet_signatures(self) -> Dict[str, Tuple[int, int]]:
+        signatures = {}
+        for sheet, file_path in self.partitions().items():
+            try:
+                stat = os.stat(file_path)
+                signatures[sheet] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return signatures
+    
+    def stat(self) -> Optional[Tuple[int, int]]:
+        if not os.path.isdir(self.path):
+            return super().stat()
+        
+        # Num diretório, considerar também alterações dentro dos arquivos
+        signatures = self.sheet_signatures()
+        if not signatures:
+            return None
+        return (max(mtime for mtime, _ in signatures.values()),
+                sum(size for _, size in signatures.values()) + len(signatures))
+
+class CsvSource(PartitionedFileSource):
+    extensions = ('.csv',)
+    
+    def read_file(self, file_path: str) -> pd.DataFrame:
+        options = dict(self.read_options)
+        if _HAS_PYARROW and 'engine' not in options:
+            options['engine'] = 'pyarrow'
+        return pd.read_csv(file_path, **options)
+
+class ParquetSource(PartitionedFileSource):
+    extensions = ('.parquet', '.pq')
+    
+    def read_file(self, file_path: str) -> pd.DataFrame:
+        # Requer pyarrow ou fastparquet instalado
+        return pd.read_parquet(file_path, **self.read_options)
+
+def open_contact_source(path: str, processes: Optional[int] = None) -> ContactSource:
+    """
+    Escolhe a fonte de contatos adequada para um caminho.
+    
+    Arquivos .csv e .parquet (ou diretórios com esses arquivos) usam as
+    fontes colunares; qualquer outro caminho é tratado como planilha Excel.
+    
+    Args:
+        path: Caminho do arquivo ou diretório
+        processes: Processos usados para ler as abas de planilhas Excel (opcional)
+    
+    Returns:
+        Fonte de contatos
+    """
+    if os.path.isdir(path):
+        names = [name.lower() for name in os.listdir(path)]
+        if any(name.endswith(ParquetSource.extensions) for name in names):
+            return ParquetSource(path)
+        return CsvSource(path)
+    
+    extension = os.path.splitext(path)[1].lower()
+    if extension in CsvSource.extensions:
+        return CsvSource(path)
+    if extension in ParquetSource.extensions:
+        return ParquetSource(path)
+    return ExcelSource(path, processes=processes)
+
+if __name__ == "__main__":
+    # Comparação entre leitura sequencial e em processos de uma planilha com 12 abas
+    # (executar a partir de src/: python -m excel_reader.contact_source [linhas] [processos])
+    import io
+    import sys
+    import tempfile
+    import contextlib
+    import numpy as np
+    
+    from excel_reader.excel_handler import ExcelHandler
+    
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    months = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+              "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "sintetica.xlsx")
+        with pd.ExcelWriter(path) as writer:
+            for month_number, month in enumerate(months):
+                start = month_number * rows
+                pd.DataFrame({
+                    "Data": pd.date_range(f"2025-{month_number + 1:02d}-01", periods=rows, freq="min"),
+                    "Técnico": np.random.choice(["REGINALDO", "MARCOS", "JOSE"], rows),
+                    "Tipo de serviço": np.random.choice(["ATIVAÇÃO", "MUD END", "REPARO"], rows),
+                    "SA": [f"SA-{i}" for i in range(start, start + rows)],
+                    "Documento": [f"{i:011d}" for i in range(start, start + rows)],
+                    "Cliente": [f"Cliente {i}" for i in range(start, start + rows)],
+                    "Endereço": [f"Rua {i}, {i % 500}" for i in range(start, start + rows)],
+                    "Telefone": np.arange(19990000000 + start, 19990000000 + start + rows),
+                    "Status": np.random.choice(["Finalizado", "ausente", None], rows),
+                    "Cidade": np.random.choice(["Cosmopolis", "Paulinia"], rows),
+                    "OBS:": [None] * rows,
+                }).to_excel(writer, sheet_name=f"{month} 25", index=False)
+        
+        timings = {}
+        for label, workers in (("sequencial", None), (f"{processes} processos", processes)):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                handler = ExcelHandler(path, cache_dir=None, processes=workers)
+            timings[label] = time.perf_counter() - start
+            assert len(handler.sheet_names) == len(months)
+        
+        print(f"{len(months)} abas x {rows} linhas, {os.cpu_count()} CPUs")
+        for label, elapsed in timings.items():
+            print(f"{label:>14}: {elapsed:.2f}s")
\ No newline at end of file
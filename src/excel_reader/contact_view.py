@@ -0,0 +1,276 @@
+import re
+from collections.abc import Mapping
+from typing import Dict, Any, Optional, Iterator, Callable, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Marcadores de modelo de mensagem, como {nome} ou {endereço}
+_PLACEHOLDER_PATTERN = re.compile(r'\{([^{}]+)\}')
+
+class ContactView:
+    def __init__(self, df: pd.DataFrame):
+        """
+        Inicializa uma visão colunar e somente leitura dos contatos de uma aba.
+        
+        Cada coluna é mantida como o array do próprio DataFrame (sem cópia), e os
+        contatos são acessados por posição, sem criar um dicionário por linha.
+        
+        Args:
+            df: Dados da aba
+        """
+        self.frame = df
+        self.columns = list(df.columns)
+        self._arrays = [df[column].to_numpy() for column in self.columns]
+        self._positions = {column: index for index, column in enumerate(self.columns)}
+        
+        # Marcadores usam o nome da coluna em minúsculas; a primeira coluna prevalece
+        self._lower_positions = {}
+        for index, column in enumerate(self.columns):
+            self._lower_positions.setdefault(str(column).lower(), index)
+        
+        self._sa_column = self._positions.get('SA')
+        self._nome_column = self._first_column('Nome', 'Cliente')
+        self._telefone_column = self._positions.get('Telefone')
+        self._endereco_column = self._first_column('Endereço', 'Endereco')
+    
+    def _first_column(self, *names: str) -> Optional[int]:
+        """
+        Obtém a posição da primeira coluna existente entre os nomes informados.
+        
+        Args:
+            names: Nomes de coluna em ordem de preferência
+        
+        Returns:
+            Posição da coluna ou None se nenhuma existir
+        """
+        for name in names:
+            if name in self._positions:
+                return self._positions[name]
+        return None
+    
+    def __len__(self) -> int:
+        return len(self.frame)
+    
+    def value(self, position: int, column: int) -> Any:
+        """
+        Obtém o valor de uma célula com tipo nativo do Python.
+        
+        Args:
+            position: Posição da linha
+            column: Posição da coluna
+        
+        Returns:
+            Valor da célula
+        """
+        value = self._arrays[column][position]
+        if isinstance(value, np.datetime64):
+            # .item() devolveria nanossegundos; datas vazias (NaT) viram None
+            return None if np.isnat(value) else pd.Timestamp(value)
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def text(self, position: int, column: Optional[int]) -> str:
+        """
+        Obtém o valor de uma célula como texto ('' para células vazias).
+        
+        Args:
+            position: Posição da linha
+            column: Posição da coluna (None se a coluna não existir)
+        
+        Returns:
+            Texto da célula
+        """
+        if column is None:
+            return ''
+        value = self.value(position, column)
+        if value is None or (isinstance(value, float) and value != value):
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+    
+    def record(self, position: int) -> 'Contact':
+        """
+        Obtém o contato de uma linha.
+        
+        Args:
+            position: Posição da linha
+        
+        Returns:
+            Contato da linha
+        """
+        return Contact(self, position)
+    
+    def records(self, positions: Optional[Sequence[int]] = None) -> Iterator['Contact']:
+        """
+        Percorre os contatos da aba.
+        
+        Args:
+            positions: Posições das linhas (opcional, todas por padrão)
+        
+        Yields:
+            Contato de cada linha
+        """
+        for position in (range(len(self)) if positions is None else positions):
+            yield Contact(self, int(position))
+    
+    def compile_template(self, template: str) -> Callable[[int], str]:
+        """
+        Prepara um modelo de mensagem para ser preenchido linha a linha.
+        
+        Os marcadores são resolvidos para posições de coluna uma única vez; cada
+        preenchimento apenas junta os trechos fixos com os valores da linha.
+        Marcadores sem coluna correspondente são mantidos no texto.
+        
+        Args:
+            template: Modelo de mensagem com marcadores como {nome}
+        
+        Returns:
+            Função que recebe a posição da linha e devolve a mensagem
+        """
+        pieces = []
+        for index, piece in enumerate(_PLACEHOLDER_PATTERN.split(template)):
+            # Índices ímpares são o conteúdo dos marcadores
+            if index % 2 and piece in self._lower_positions:
+                pieces.append(self._lower_positions[piece])
+            elif index % 2:
+                pieces.append('{' + piece + '}')
+            elif piece:
+                pieces.append(piece)
+        
+        def render(position: int) -> str:
+            return ''.join(piece if isinstance(piece, str) else str(self.value(position, piece))
+                           for piece in pieces)
+        
+        return render
+
+class Contact(Mapping):
+    __slots__ = ('_view', 'position')
+    
+    def __init__(self, view: ContactView, position: int):
+        """
+        Inicializa um contato compacto ligado a uma linha da visão colunar.
+        
+        O contato também funciona como um dicionário somente leitura das
+        colunas da aba, mas os valores só são lidos quando acessados.
+        
+        Args:
+            view: Visão colunar da aba
+            position: Posição da linha
+        """
+        self._view = view
+        self.position = position
+    
+    @property
+    def view(self) -> ContactView:
+        """Visão colunar à qual o contato pertence"""
+        return self._view
+    
+    @property
+    def sa(self) -> str:
+        """SA do contato"""
+        return self._view.text(self.position, self._view._sa_column)
+    
+    @property
+    def nome(self) -> str:
+        """Nome do contato (coluna Nome ou Cliente)"""
+        return self._view.text(self.position, self._view._nome_column)
+    
+    @property
+    def telefone(self) -> str:
+        """Telefone do contato como texto"""
+        return self._view.text(self.position, self._view._telefone_column)
+    
+    @property
+    def endereco(self) -> str:
+        """Endereço do contato"""
+        return self._view.text(self.position, self._view._endereco_column)
+    
+    def __getitem__(self, column: str) -> Any:
+        index = self._view._positions.get(column)
+        if index is None:
+            raise KeyError(column)
+        return self._view.value(self.position, index)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._view.columns)
+    
+    def __len__(self) -> int:
+        return len(self._view.columns)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converte o contato em dicionário (para serialização).
+        
+        Returns:
+            Dicionário coluna -> valor
+        """
+        return {column: self._view.value(self.position, index)
+                for index, column in enumerate(self._view.columns)}
+    
+    def render(self, template: str) -> str:
+        """
+        Preenche um modelo de mensagem com os dados do contato.
+        
+        Args:
+            template: Modelo de mensagem com marcadores como {nome}
+        
+        Returns:
+            Mensagem personalizada
+        """
+        return self._view.compile_template(template)(self.position)
+    
+    def __repr__(self) -> str:
+        return f"Contact(sa={self.sa!r}, nome={self.nome!r}, telefone={self.telefone!r})"
+
+
+if __name__ == "__main__":
+    # Comparação de memória entre dicionários por linha e a visão compacta
+    import time
+    import tracemalloc
+    
+    rows = 100_000
+    df = pd.DataFrame({
+        "Data": pd.date_range("2025-01-01", periods=rows, freq="min"),
+        "Técnico": np.random.choice(["REGINALDO", "MARCOS", "JOSE"], rows),
+        "Tipo de serviço": np.random.choice(["ATIVAÇÃO", "MUD END", "REPARO"], rows),
+        "SA": [f"SA-{i}" for i in range(rows)],
+        "Documento": [f"{i:011d}" for i in range(rows)],
+        "Cliente": [f"Cliente {i}" for i in range(rows)],
+        "Endereço": [f"Rua {i}, {i % 500}" for i in range(rows)],
+        "Telefone": np.arange(19990000000, 19990000000 + rows),
+        "Status": np.random.choice(["Finalizado", "ausente", None], rows),
+        "Cidade": np.random.choice(["Cosmopolis", "Paulinia"], rows),
+        "OBS:": [None] * rows,
+    })
+    template = "Olá {cliente}, sua visita (SA {sa}) em {endereço} foi agendada."
+    
+    # Dicionário por linha, como to_dict('records')
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = df.to_dict('records')
+    for record in records:
+        message = template
+        for key, value in record.items():
+            message = message.replace('{' + key.lower() + '}', str(value))
+    dict_time = time.perf_counter() - start
+    dict_peak = tracemalloc.get_traced_memory()[1]
+    del records
+    tracemalloc.stop()
+    
+    # Visão colunar com contatos compactos
+    tracemalloc.start()
+    start = time.perf_counter()
+    view = ContactView(df)
+    contacts = list(view.records())
+    render = view.compile_template(template)
+    for contact in contacts:
+        message = render(contact.position)
+    view_time = time.perf_counter() - start
+    view_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    print(f"{rows} linhas, {len(df.columns)} colunas")
+    print(f"to_dict('records'):     pico {dict_peak / 1e6:.1f} MB, {dict_time:.2f}s para preencher o modelo")
+    print(f"ContactView + Contact:  pico {view_peak / 1e6:.1f} MB, {view_time:.2f}s para preencher o modelo")
+    print(f"Exemplo: {message}")
\ No newline at end of file
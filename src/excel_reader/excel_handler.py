@@ -1,54 +1,846 @@
 import pandas as pd
 import os
-from typing import Dict, List, Any, Optional
+import sys
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 import re
+import time
+import threading
+import warnings
+from collections import OrderedDict
+
+# Adicionar diretório pai ao path para importação
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_reader.contact_view import ContactView, Contact
+from excel_reader.sheet_snapshot import SheetSnapshot, normalize_sa, normalize_phone
+from excel_reader.workbook_cache import WorkbookCache
+from excel_reader.workbook_watcher import WorkbookWatcher
+from excel_reader.contact_source import ContactSource, SourceReader, open_contact_source
+
+# Diretório padrão do cache das planilhas já lidas
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 "storage", "excel_cache")
 
 class ExcelHandler:
-    def __init__(self, excel_path: str):
+    # Quantidade de dígitos finais usada para comparar telefones
+    PHONE_SUFFIX_LENGTH = 8
+    
+    # Tipos declarados das colunas conhecidas, aplicados quando a aba é lida:
+    # 'text' vira texto normalizado (sem ".0" e sem espaços), 'date' vira data
+    # e 'category' guarda cada valor repetido uma única vez
+    COLUMN_SCHEMA = {
+        'SA': 'text',
+        'Telefone': 'text',
+        'Data': 'date',
+        'Técnico': 'category',
+        'Tipo de serviço': 'category',
+        'Status': 'category',
+        'Cidade': 'category'
+    }
+    
+    def __init__(self, excel_path: str, lazy: bool = False,
+                 max_loaded_sheets: Optional[int] = None,
+                 max_loaded_bytes: Optional[int] = None,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 source: Optional[ContactSource] = None,
+                 processes: Optional[int] = None):
         """
         Inicializa o manipulador de Excel.
         
         Args:
-            excel_path: Caminho para o arquivo Excel
+            excel_path: Caminho para o arquivo Excel (ou arquivo/diretório .csv ou .parquet)
+            lazy: Se True, apenas os nomes das abas são lidos na inicialização e
+                cada aba é carregada no primeiro uso
+            max_loaded_sheets: Máximo de abas mantidas em memória (opcional)
+            max_loaded_bytes: Máximo de bytes de abas mantidos em memória (opcional)
+            cache_dir: Diretório do cache das abas já lidas (None desativa o cache)
+            source: Fonte dos contatos (opcional, escolhida pela extensão de excel_path)
+            processes: Se informado, as abas de planilhas Excel são lidas em
+                paralelo por essa quantidade de processos
         """
         self.excel_path = excel_path
+        self.source = source if source is not None else open_contact_source(excel_path, processes=processes)
+        self.lazy = lazy
+        self.max_loaded_sheets = max_loaded_sheets
+        self.max_loaded_bytes = max_loaded_bytes
         self.data = None
-        self.sheet_data = {}  # Dados de todas as abas por mês
+        self.sheet_names = []  # Abas lidas da fonte (mensais, numa planilha Excel), na ordem original
+        self.sheet_data = OrderedDict()  # Abas em memória, da menos para a mais recentemente usada
+        self.sheet_sizes = {}  # Memória ocupada (bytes) por aba carregada
         self.current_sheet = None  # Aba atual em uso
+        self.sheet_sa_index = {}  # Índice SA -> posição da linha, por aba
+        self.sheet_snapshots = {}  # Fotografia imutável de cada aba em memória
+        self.sa_index = {}  # Índice SA da aba atual
+        self.sheet_phone_index = {}  # Índices de telefone (dígitos, sufixo) -> SA, por aba
+        self.phone_index = {}  # Dígitos do telefone -> (aba, SA)
+        self.phone_suffix_index = {}  # Últimos dígitos do telefone -> (aba, SA)
+        self.load_timings = {}  # Tempo de leitura (segundos) de cada aba
+        self.generation = 0  # Incrementado sempre que os índices das abas mudam
+        self._lock = threading.RLock()
+        # CSV e Parquet já são lidos rapidamente; o cache em disco é só para
+        # planilhas Excel (e requer o pyarrow, usado para gravar as abas)
+        self._cache = (WorkbookCache(cache_dir, excel_path)
+                       if cache_dir and self.source.supports_cache and WorkbookCache.available else None)
+        self._cache_writable = False  # Se o cache corresponde ao arquivo lido e pode receber abas
+        self._refresh_thread = None
+        self._reload_lock = threading.Lock()  # Serializa releituras da planilha
+        self._sheet_signatures = {}  # Assinatura do XML de cada aba no arquivo lido
+        self._current_snapshot = SheetSnapshot.empty()  # Fotografia da aba atual
+        self._watcher = None
         self._load_data()
     
     def _load_data(self) -> None:
         """Carrega os dados do arquivo Excel, focando nas abas com nomes de meses"""
         try:
-            # Identificar todas as abas na planilha
-            excel_file = pd.ExcelFile(self.excel_path)
-            sheet_names = excel_file.sheet_names
-            
-            # Filtrar abas com nomes de meses
-            month_sheets = self._filter_month_sheets(sheet_names)
-            
-            if not month_sheets:
-                print("Nenhuma aba com nome de mês encontrada na planilha.")
+            self._sheet_signatures = self.source.sheet_signatures()
+            if not self._load_from_cache() and not self._load_from_workbook():
                 return
             
-            # Carregar dados de cada aba mensal
-            for sheet in month_sheets:
-                try:
-                    self.sheet_data[sheet] = pd.read_excel(self.excel_path, sheet_name=sheet)
-                    print(f"Aba '{sheet}' carregada com sucesso. {len(self.sheet_data[sheet])} registros encontrados.")
-                except Exception as e:
-                    print(f"Erro ao carregar aba '{sheet}': {str(e)}")
+            self._build_phone_index()
             
             # Usar a primeira aba mensal como aba atual por padrão
-            if month_sheets:
-                self.current_sheet = month_sheets[0]
-                self.data = self.sheet_data[self.current_sheet]
+            if self.sheet_names and self.set_current_sheet(self.sheet_names[0]):
                 print(f"Usando aba '{self.current_sheet}' como padrão.")
             
         except Exception as e:
             print(f"Erro ao carregar a planilha: {str(e)}")
             self.data = pd.DataFrame()
     
+    def _load_from_workbook(self) -> bool:
+        """
+        Lê as abas mensais diretamente do arquivo Excel.
+        
+        Returns:
+            True se foram encontradas abas mensais
+        """
+        # Impressão digital tirada antes da leitura, para que alterações
+        # feitas durante a leitura invalidem o cache na próxima execução
+        fingerprint = self._cache.fingerprint() if self._cache else None
+        
+        # Abrir a fonte uma única vez; todas as abas são lidas do mesmo leitor
+        with self.source.open() as reader:
+            # Escolher as abas lidas (numa planilha Excel, só as mensais)
+            month_sheets = self._select_sheets(reader.sheet_names)
+            
+            if not month_sheets:
+                if self.source.month_sheets_only:
+                    print("Nenhuma aba com nome de mês encontrada na planilha.")
+                else:
+                    print(f"Nenhum arquivo encontrado em {self.excel_path}.")
+                return False
+            
+            self.sheet_names = list(month_sheets)
+            
+            if self._cache:
+                self._cache.reset(fingerprint, self.sheet_names)
+                self._cache_writable = True
+            
+            # No modo sob demanda as abas são lidas no primeiro uso
+            if not self.lazy:
+                # A primeira aba será a atual e não deve ser descarregada
+                self.current_sheet = month_sheets[0]
+                self._parse_sheets(reader, month_sheets)
+        
+        return True
+    
+    def _load_from_cache(self) -> bool:
+        """
+        Carrega as abas do cache em disco, se houver um cache desta planilha.
+        
+        Se a planilha mudou desde a criação do cache, os dados do cache são
+        usados imediatamente e a planilha é relida em segundo plano.
+        
+        Returns:
+            True se os dados vieram do cache
+        """
+        if self._cache is None:
+            return False
+        
+        manifest = self._cache.load_manifest()
+        if not manifest or not manifest.get("sheet_names"):
+            return False
+        
+        fresh = self._cache.is_fresh(manifest)
+        self.sheet_names = list(manifest["sheet_names"])
+        self._cache_writable = fresh
+        
+        if not self.lazy:
+            # A primeira aba será a atual e não deve ser descarregada
+            self.current_sheet = self.sheet_names[0]
+            missing = [sheet for sheet in list(self.sheet_names) if not self._load_cached_sheet(sheet)]
+            
+            # Um cache parcial (gravado por uma execução sob demanda, por
+            # exemplo) não tem todas as abas: as que faltam são lidas da planilha
+            if missing:
+                try:
+                    with self.source.open() as reader:
+                        self._parse_sheets(reader, missing)
+                except Exception as e:
+                    print(f"Erro ao ler da planilha as abas ausentes do cache: {str(e)}")
+        
+        print(f"Planilha carregada do cache ({len(self.sheet_names)} abas mensais).")
+        
+        if not fresh:
+            print("A planilha foi alterada desde a criação do cache. Atualizando em segundo plano...")
+            self._refresh_thread = threading.Thread(target=self._refresh_from_workbook, daemon=True)
+            self._refresh_thread.start()
+        
+        return True
+    
+    def _load_cached_sheet(self, sheet_name: str) -> bool:
+        """
+        Carrega uma aba do cache em disco para a memória.
+        
+        Args:
+            sheet_name: Nome da aba
+            
+        Returns:
+            True se a aba estava no cache
+        """
+        payload = self._cache.load_sheet(sheet_name) if self._cache else None
+        if payload is None:
+            return False
+        
+        self._store_sheet(sheet_name, payload["data"], sa_index=payload.get("sa_index"),
+                          phone_index=payload.get("phone_index"), size=payload.get("size"))
+        return True
+    
+    def _refresh_from_workbook(self) -> None:
+        """Relê a planilha alterada, atualiza o cache e substitui os dados em memória"""
+        try:
+            with self._reload_lock:
+                fingerprint = self._cache.fingerprint()
+                fresh = ExcelHandler(self.excel_path, lazy=self.lazy,
+                                     max_loaded_sheets=self.max_loaded_sheets,
+                                     max_loaded_bytes=self.max_loaded_bytes,
+                                     cache_dir=None, source=self.source)
+                if not fresh.sheet_names:
+                    print("Não foi possível reler a planilha alterada; mantendo os dados do cache.")
+                    return
+                
+                self._cache.reset(fingerprint, fresh.sheet_names)
+                for sheet in fresh.sheet_data:
+                    self._cache.save_sheet(sheet, fresh._sheet_payload(sheet))
+                
+                self._swap_state(fresh)
+                print("Planilha atualizada a partir do arquivo alterado.")
+        except Exception as e:
+            print(f"Erro ao atualizar a planilha em segundo plano: {str(e)}")
+    
+    def _swap_state(self, fresh: 'ExcelHandler') -> None:
+        """
+        Substitui os dados e índices em memória pelos de outro manipulador.
+        
+        Args:
+            fresh: Manipulador com a planilha recém-lida
+        """
+        with self._lock:
+            previous_sheet = self.current_sheet
+            
+            self.sheet_names = fresh.sheet_names
+            self.sheet_data = fresh.sheet_data
+            self.sheet_sizes = fresh.sheet_sizes
+            self.sheet_sa_index = fresh.sheet_sa_index
+            self.sheet_snapshots = fresh.sheet_snapshots
+            self.sheet_phone_index = fresh.sheet_phone_index
+            self.phone_index = fresh.phone_index
+            self.phone_suffix_index = fresh.phone_suffix_index
+            self.load_timings = fresh.load_timings
+            self._sheet_signatures = fresh._sheet_signatures
+            self._cache_writable = self._cache is not None
+            self.generation += 1
+            
+            # Manter a aba em uso, se ela ainda existir
+            sheet = previous_sheet if previous_sheet in self.sheet_names else fresh.current_sheet
+            if not sheet or not self.set_current_sheet(sheet):
+                self._set_current_snapshot(SheetSnapshot.empty())
+    
+    def _sheet_payload(self, sheet_name: str) -> Dict[str, Any]:
+        """
+        Monta os dados de uma aba em memória no formato gravado no cache.
+        
+        Args:
+            sheet_name: Nome da aba
+            
+        Returns:
+            Dicionário com dados, índices e tamanho da aba
+        """
+        return {
+            "data": self.sheet_data[sheet_name],
+            "sa_index": self.sheet_sa_index.get(sheet_name),
+            "phone_index": self.sheet_phone_index.get(sheet_name),
+            "size": self.sheet_sizes.get(sheet_name)
+        }
+    
+    def _parse_sheets(self, reader: SourceReader, sheet_names: List[str]) -> None:
+        """
+        Lê as abas informadas a partir de uma fonte já aberta.
+        
+        Abas que falham na leitura são removidas da lista de abas disponíveis.
+        
+        Args:
+            reader: Leitor aberto da fonte de contatos
+            sheet_names: Abas a serem carregadas
+        """
+        total_start = time.perf_counter()
+        
+        for sheet, df, error, elapsed in reader.read(sheet_names):
+            try:
+                if error is not None:
+                    raise error
+                df = self._apply_schema(df)
+                self.load_timings[sheet] = elapsed
+                self._store_sheet(sheet, df)
+                if self._cache and self._cache_writable:
+                    self._cache.save_sheet(sheet, self._sheet_payload(sheet))
+                print(f"Aba '{sheet}' carregada com sucesso. {len(df)} registros encontrados "
+                      f"em {self.load_timings[sheet]:.2f}s ({self.sheet_sizes[sheet] / 1e6:.2f} MB).")
+            except Exception as e:
+                print(f"Erro ao carregar aba '{sheet}': {str(e)}")
+                if sheet in self.sheet_names:
+                    self.sheet_names.remove(sheet)
+                    if self._cache and self._cache_writable:
+                        self._cache.set_sheet_names(self.sheet_names)
+        
+        if len(sheet_names) > 1:
+            print(f"{len(sheet_names)} abas lidas em {time.perf_counter() - total_start:.2f}s.")
+    
+    def _apply_schema(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converte as colunas conhecidas para os tipos de COLUMN_SCHEMA.
+        
+        As conversões são feitas uma única vez na leitura, então as consultas
+        não precisam converter SA e telefone a cada comparação. Colunas fora
+        do esquema ficam como foram lidas (texto livre, como observações, não
+        vira categoria).
+        
+        Args:
+            df: Dados da aba como lidos da planilha
+            
+        Returns:
+            Dados da aba com as colunas conhecidas tipadas
+        """
+        columns = list(df.columns)
+        for column, kind in self.COLUMN_SCHEMA.items():
+            # Colunas ausentes ou repetidas na aba ficam como foram lidas
+            if columns.count(column) != 1:
+                continue
+            
+            if kind == 'text':
+                df[column] = df[column].map(self._normalize_sa).astype(object)
+            elif kind == 'date':
+                # Linhas de cabeçalho repetidas e textos que não são datas ficam vazios
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    df[column] = pd.to_datetime(df[column], errors='coerce', dayfirst=True)
+            elif kind == 'category':
+                df[column] = df[column].astype('category')
+        return df
+    
+    def _store_sheet(self, sheet_name: str, df: pd.DataFrame,
+                     sa_index: Optional[Dict[str, int]] = None,
+                     phone_index: Optional[Tuple[Dict[str, str], Dict[str, str]]] = None,
+                     size: Optional[int] = None) -> None:
+        """
+        Guarda uma aba lida em memória, indexa e aplica o limite de memória.
+        
+        Args:
+            sheet_name: Nome da aba
+            df: Dados da aba
+            sa_index: Índice SA já montado (opcional, vindo do cache)
+            phone_index: Índices de telefone já montados (opcional, vindos do cache)
+            size: Memória ocupada pela aba em bytes (opcional, vinda do cache)
+        """
+        self.sheet_data[sheet_name] = df
+        self.sheet_data.move_to_end(sheet_name)
+        self.sheet_sizes[sheet_name] = size if size is not None else int(df.memory_usage(deep=True).sum())
+        sa_index = sa_index if sa_index is not None else self._build_sa_index(df)
+        # Reler uma aba descarregada sem alterações não muda os índices
+        indexes_changed = (self.sheet_sa_index.get(sheet_name) != sa_index
+                           or sheet_name not in self.sheet_phone_index)
+        self.sheet_sa_index[sheet_name] = sa_index
+        self.sheet_snapshots[sheet_name] = SheetSnapshot(sheet_name, df, self.sheet_sa_index[sheet_name])
+        
+        # Os índices de SA e de telefone são pequenos e continuam valendo após
+        # a aba ser descarregada; os de telefone só são montados na primeira leitura
+        if sheet_name not in self.sheet_phone_index:
+            self.sheet_phone_index[sheet_name] = (tuple(phone_index) if phone_index is not None
+                                                  else self._build_sheet_phone_index(df))
+        
+        if indexes_changed:
+            self.generation += 1
+        self._evict_sheets(keep=sheet_name)
+    
+    def _is_over_budget(self) -> bool:
+        """
+        Verifica se as abas em memória ultrapassam o limite configurado.
+        
+        Returns:
+            True se o limite de abas ou de bytes foi ultrapassado
+        """
+        if self.max_loaded_sheets is not None and len(self.sheet_data) > self.max_loaded_sheets:
+            return True
+        if self.max_loaded_bytes is not None:
+            loaded_bytes = sum(self.sheet_sizes.get(sheet, 0) for sheet in self.sheet_data)
+            return loaded_bytes > self.max_loaded_bytes
+        return False
+    
+    def _evict_sheets(self, keep: Optional[str] = None) -> None:
+        """
+        Descarrega as abas usadas há mais tempo até respeitar o limite de memória.
+        
+        Args:
+            keep: Aba que também não deve ser descarregada (além da aba atual)
+        """
+        while len(self.sheet_data) > 1 and self._is_over_budget():
+            victim = next((sheet for sheet in self.sheet_data
+                           if sheet not in (self.current_sheet, keep)), None)
+            if victim is None:
+                break
+            
+            del self.sheet_data[victim]
+            self.sheet_sizes.pop(victim, None)
+            self.sheet_snapshots.pop(victim, None)
+            print(f"Aba '{victim}' descarregada da memória.")
+    
+    def _load_sheet(self, sheet_name: str) -> Optional[pd.DataFrame]:
+        """
+        Obtém os dados de uma aba, lendo da planilha se não estiverem em memória.
+        
+        Args:
+            sheet_name: Nome da aba
+            
+        Returns:
+            Dados da aba ou None se a aba não existir ou não puder ser lida
+        """
+        with self._lock:
+            if sheet_name in self.sheet_data:
+                self.sheet_data.move_to_end(sheet_name)
+                return self.sheet_data[sheet_name]
+            
+            if sheet_name not in self.sheet_names:
+                return None
+            
+            first_load = sheet_name not in self.sheet_phone_index
+            if not self._load_cached_sheet(sheet_name):
+                try:
+                    with self.source.open() as reader:
+                        self._parse_sheets(reader, [sheet_name])
+                except Exception as e:
+                    print(f"Erro ao abrir a planilha para ler a aba '{sheet_name}': {str(e)}")
+                    return None
+            
+            if first_load:
+                self._build_phone_index()
+            return self.sheet_data.get(sheet_name)
+    
+    def _index_all_sheets(self) -> None:
+        """Lê uma vez as abas ainda não indexadas (modo sob demanda) para completar os índices"""
+        with self._lock:
+            missing = [sheet for sheet in self.sheet_names if sheet not in self.sheet_phone_index]
+            if not missing:
+                return
+            
+            pending = [sheet for sheet in missing if not self._load_cached_sheet(sheet)]
+            if not pending:
+                self._build_phone_index()
+                return
+            
+            try:
+                with self.source.open() as reader:
+                    self._parse_sheets(reader, pending)
+            except Exception as e:
+                print(f"Erro ao indexar abas da planilha: {str(e)}")
+            
+            self._build_phone_index()
+    
+    def start_watching(self, interval: float = 5.0) -> None:
+        """
+        Passa a observar o arquivo Excel e relê as abas alteradas automaticamente.
+        
+        Args:
+            interval: Intervalo entre verificações em segundos
+        """
+        if self._watcher is None:
+            self._watcher = WorkbookWatcher(self.excel_path, self._on_workbook_changed, interval,
+                                            stat_func=self.source.stat)
+        self._watcher.start()
+    
+    def stop_watching(self) -> None:
+        """Para de observar o arquivo Excel"""
+        if self._watcher is not None:
+            self._watcher.stop()
+    
+    def _on_workbook_changed(self) -> None:
+        """Chamado pelo observador quando o arquivo Excel muda"""
+        print(f"Alteração detectada na planilha {os.path.basename(self.excel_path)}. Relendo abas alteradas...")
+        self.reload_changed_sheets()
+    
+    def reload_changed_sheets(self) -> Dict[str, Dict[str, int]]:
+        """
+        Relê apenas as abas mensais cujo conteúdo mudou no arquivo Excel.
+        
+        As abas novas são lidas fora do lock de leitura e os dados, índices SA e
+        índices de telefone são trocados de uma só vez, então leitores
+        concorrentes nunca veem uma aba pela metade.
+        
+        Returns:
+            Dicionário aba -> contagem de SAs novas, removidas e alteradas
+        """
+        with self._reload_lock:
+            try:
+                fingerprint = self._cache.fingerprint() if self._cache else None
+                signatures = self.source.sheet_signatures()
+                
+                with self.source.open() as reader:
+                    new_sheet_names = self._select_sheets(reader.sheet_names)
+                    
+                    # Sem assinaturas (ex.: .xls) todas as abas são consideradas alteradas
+                    changed = [sheet for sheet in new_sheet_names
+                               if not signatures or sheet not in self.sheet_names
+                               or signatures.get(sheet) != self._sheet_signatures.get(sheet)]
+                    removed = [sheet for sheet in self.sheet_names if sheet not in new_sheet_names]
+                    
+                    if not changed and not removed:
+                        self._sheet_signatures = signatures
+                        if self._cache and self._cache_writable:
+                            self._cache.update_fingerprint(fingerprint)
+                        return {}
+                    
+                    parsed = {}
+                    for sheet, df, error, _ in reader.read(changed):
+                        try:
+                            if error is not None:
+                                raise error
+                            parsed[sheet] = self._apply_schema(df)
+                        except Exception as e:
+                            print(f"Erro ao reler aba '{sheet}': {str(e)}")
+            except Exception as e:
+                print(f"Erro ao reler a planilha: {str(e)}")
+                return {}
+            
+            summary = {}
+            payloads = {}
+            for sheet, df in parsed.items():
+                diff = self._diff_frames(self._resident_or_cached(sheet), df)
+                summary[sheet] = {key: len(value) for key, value in diff.items()}
+                payloads[sheet] = {
+                    "data": df,
+                    "sa_index": self._build_sa_index(df),
+                    "phone_index": self._build_sheet_phone_index(df),
+                    "size": int(df.memory_usage(deep=True).sum())
+                }
+            
+            # Abas que falharam na releitura continuam com os dados anteriores
+            new_sheet_names = [sheet for sheet in new_sheet_names
+                               if sheet in parsed or sheet in self.sheet_names]
+            
+            with self._lock:
+                sheet_data = OrderedDict((sheet, df) for sheet, df in self.sheet_data.items()
+                                         if sheet in new_sheet_names)
+                sheet_sizes = {sheet: size for sheet, size in self.sheet_sizes.items() if sheet in sheet_data}
+                sheet_sa_index = {sheet: index for sheet, index in self.sheet_sa_index.items()
+                                  if sheet in new_sheet_names}
+                sheet_phone_index = {sheet: index for sheet, index in self.sheet_phone_index.items()
+                                     if sheet in new_sheet_names}
+                
+                sheet_snapshots = {sheet: snapshot for sheet, snapshot in self.sheet_snapshots.items()
+                                   if sheet in sheet_data}
+                
+                for sheet, payload in payloads.items():
+                    # Abas descarregadas (modo sob demanda/limite de memória) só têm os índices atualizados
+                    if sheet in sheet_data or sheet == self.current_sheet or not self.lazy:
+                        sheet_data[sheet] = payload["data"]
+                        sheet_sizes[sheet] = payload["size"]
+                        sheet_snapshots[sheet] = SheetSnapshot(sheet, payload["data"], payload["sa_index"])
+                    sheet_sa_index[sheet] = payload["sa_index"]
+                    sheet_phone_index[sheet] = payload["phone_index"]
+                
+                phone_index, suffix_index = self._merge_phone_indexes(new_sheet_names, sheet_phone_index)
+                
+                self.sheet_names = new_sheet_names
+                self.sheet_data = sheet_data
+                self.sheet_sizes = sheet_sizes
+                self.sheet_sa_index = sheet_sa_index
+                self.sheet_snapshots = sheet_snapshots
+                self.sheet_phone_index = sheet_phone_index
+                self.phone_index = phone_index
+                self.phone_suffix_index = suffix_index
+                self._sheet_signatures = signatures
+                self.generation += 1
+                
+                if self.current_sheet in sheet_snapshots:
+                    self._set_current_snapshot(sheet_snapshots[self.current_sheet])
+                elif new_sheet_names:
+                    self.set_current_sheet(new_sheet_names[0])
+                else:
+                    self._set_current_snapshot(SheetSnapshot.empty())
+                
+                self._evict_sheets()
+            
+            self._update_cache_after_reload(fingerprint, payloads, removed)
+            
+            for sheet, counts in summary.items():
+                print(f"Aba '{sheet}' relida: {counts['added']} SAs novas, "
+                      f"{counts['removed']} removidas, {counts['changed']} alteradas.")
+            for sheet in removed:
+                print(f"Aba '{sheet}' não existe mais na planilha.")
+            
+            return summary
+    
+    def _resident_or_cached(self, sheet_name: str) -> Optional[pd.DataFrame]:
+        """
+        Obtém os dados atuais de uma aba sem relê-la da planilha.
+        
+        Args:
+            sheet_name: Nome da aba
+            
+        Returns:
+            Dados da aba em memória ou no cache, ou None se não disponíveis
+        """
+        if sheet_name in self.sheet_data:
+            return self.sheet_data[sheet_name]
+        payload = self._cache.load_sheet(sheet_name) if self._cache else None
+        return payload["data"] if payload else None
+    
+    def _update_cache_after_reload(self, fingerprint: Optional[Dict[str, Any]],
+                                   payloads: Dict[str, Dict[str, Any]], removed: List[str]) -> None:
+        """
+        Atualiza o cache em disco com as abas relidas.
+        
+        Args:
+            fingerprint: Impressão digital do arquivo relido
+            payloads: Dados e índices das abas relidas
+            removed: Abas que deixaram de existir
+        """
+        if not self._cache or not self._cache_writable:
+            return
+        
+        for sheet in removed:
+            self._cache.drop_sheet(sheet)
+        for sheet, payload in payloads.items():
+            self._cache.save_sheet(sheet, payload)
+        self._cache.set_sheet_names(self.sheet_names)
+        self._cache.update_fingerprint(fingerprint)
+    
+    def _diff_frames(self, old_df: Optional[pd.DataFrame],
+                     new_df: pd.DataFrame,
+                     columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Compara duas versões de uma aba pela coluna SA.
+        
+        Args:
+            old_df: Versão anterior (None se desconhecida)
+            new_df: Versão nova
+            columns: Colunas comparadas nas SAs presentes nas duas versões
+                (opcional, todas as colunas em comum por padrão)
+            
+        Returns:
+            Dicionário com SAs novas ('added'), removidas ('removed') e
+            alteradas ('changed', SA -> colunas alteradas)
+        """
+        new_keyed = self._keyed_by_sa(new_df)
+        if old_df is None:
+            return {"added": new_keyed.index.tolist(), "removed": [], "changed": {}}
+        old_keyed = self._keyed_by_sa(old_df)
+        
+        added = new_keyed.index.difference(old_keyed.index, sort=False)
+        removed = old_keyed.index.difference(new_keyed.index, sort=False)
+        common = new_keyed.index.intersection(old_keyed.index, sort=False)
+        columns = [column for column in new_keyed.columns if column in old_keyed.columns
+                   and (columns is None or column in columns)]
+        
+        changed = {}
+        if len(common) and columns:
+            # Colunas categóricas só podem ser comparadas com as mesmas categorias
+            old_values = old_keyed.loc[common, columns].astype(object)
+            new_values = new_keyed.loc[common, columns].astype(object)
+            # Valores vazios nas duas versões não contam como alteração
+            different = (old_values != new_values) & ~(old_values.isna() & new_values.isna())
+            rows = different.any(axis=1)
+            for sa, flags in zip(different.index[rows], different[rows].to_numpy()):
+                changed[sa] = [column for column, flag in zip(columns, flags) if flag]
+        
+        return {"added": added.tolist(), "removed": removed.tolist(), "changed": changed}
+    
+    def _keyed_by_sa(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Indexa uma aba pela SA normalizada, mantendo a primeira ocorrência de cada SA.
+        
+        Args:
+            df: Dados da aba
+            
+        Returns:
+            Dados indexados pela SA
+        """
+        if df is None or 'SA' not in df.columns:
+            return pd.DataFrame()
+        
+        keys = df['SA'].map(self._normalize_sa)
+        keyed = df[keys.notna()].set_index(keys[keys.notna()].rename(None))
+        return keyed[~keyed.index.duplicated(keep='first')]
+    
+    # Normalização de SA compartilhada com as fotografias das abas
+    _normalize_sa = staticmethod(normalize_sa)
+    
+    def _build_sa_index(self, df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Constrói o índice SA -> posição da linha de uma aba.
+        
+        Args:
+            df: Dados da aba
+            
+        Returns:
+            Dicionário com a posição da primeira linha de cada SA
+        """
+        index = {}
+        if df is None or 'SA' not in df.columns:
+            return index
+        
+        for position, value in enumerate(df['SA'].tolist()):
+            key = self._normalize_sa(value)
+            # Manter a primeira ocorrência, como na busca original
+            if key is not None and key not in index:
+                index[key] = position
+        return index
+    
+    # Normalização de telefone compartilhada com as fotografias das abas
+    _normalize_phone = staticmethod(normalize_phone)
+    
+    def _build_sheet_phone_index(self, df: pd.DataFrame) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Constrói os índices de telefone de uma aba.
+        
+        Args:
+            df: Dados da aba
+            
+        Returns:
+            Tupla com os dicionários dígitos -> SA e sufixo -> SA
+        """
+        phones = {}
+        suffixes = {}
+        if 'SA' not in df.columns or 'Telefone' not in df.columns:
+            return phones, suffixes
+        
+        for phone, sa in zip(df['Telefone'].tolist(), df['SA'].tolist()):
+            digits = self._normalize_phone(phone)
+            sa_key = self._normalize_sa(sa)
+            if not digits or sa_key is None:
+                continue
+            
+            phones.setdefault(digits, sa_key)
+            suffixes.setdefault(digits[-self.PHONE_SUFFIX_LENGTH:], sa_key)
+        
+        return phones, suffixes
+    
+    def _build_phone_index(self) -> None:
+        """
+        Combina os índices de telefone das abas já lidas.
+        
+        As abas são percorridas na ordem da planilha e as linhas na ordem da
+        aba; a primeira ocorrência de cada número (ou sufixo) prevalece.
+        """
+        self.phone_index, self.phone_suffix_index = self._merge_phone_indexes(
+            self.sheet_names, self.sheet_phone_index)
+        self.generation += 1
+    
+    @staticmethod
+    def _merge_phone_indexes(sheet_names: List[str],
+                             sheet_phone_index: Dict[str, Tuple[Dict[str, str], Dict[str, str]]]
+                             ) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, Tuple[str, str]]]:
+        """
+        Combina os índices de telefone por aba respeitando a ordem das abas.
+        
+        Args:
+            sheet_names: Abas na ordem da planilha
+            sheet_phone_index: Índices de telefone de cada aba
+            
+        Returns:
+            Tupla com os dicionários dígitos -> (aba, SA) e sufixo -> (aba, SA)
+        """
+        phone_index = {}
+        suffix_index = {}
+        
+        for sheet in sheet_names:
+            if sheet not in sheet_phone_index:
+                continue
+            
+            phones, suffixes = sheet_phone_index[sheet]
+            for digits, sa in phones.items():
+                phone_index.setdefault(digits, (sheet, sa))
+            for suffix, sa in suffixes.items():
+                suffix_index.setdefault(suffix, (sheet, sa))
+        
+        return phone_index, suffix_index
+    
+    def find_client_by_phone(self, phone: str) -> Optional[Tuple[str, str]]:
+        """
+        Busca a aba e a SA de um cliente pelo telefone em todas as abas.
+        
+        A prioridade é: número completo igual, depois sufixo de
+        PHONE_SUFFIX_LENGTH dígitos e, por fim, números curtos da planilha
+        que terminem o telefone informado (do mais longo ao mais curto).
+        Dentro de cada caso vale a ordem das abas na planilha.
+        
+        Args:
+            phone: Número de telefone em qualquer formato
+            
+        Returns:
+            Tupla (aba, SA) ou None se não encontrado
+        """
+        digits = self._normalize_phone(phone)
+        if not digits:
+            return None
+        
+        # No modo sob demanda, completar os índices com as abas ainda não lidas
+        if self.lazy:
+            self._index_all_sheets()
+        
+        return self.match_phone(digits, self.phone_index, self.phone_suffix_index)
+    
+    @classmethod
+    def match_phone(cls, digits: str, phone_index: Dict[str, Any],
+                    suffix_index: Dict[str, Any]) -> Optional[Any]:
+        """
+        Aplica a prioridade de busca por telefone sobre um par de índices.
+        
+        Args:
+            digits: Telefone já normalizado (apenas dígitos)
+            phone_index: Índice número completo -> entrada
+            suffix_index: Índice sufixo -> entrada
+            
+        Returns:
+            Entrada encontrada ou None
+        """
+        entry = phone_index.get(digits)
+        if entry is not None:
+            return entry
+        
+        # Números da planilha com menos dígitos que o sufixo ficam indexados
+        # inteiros, então basta testar os sufixos mais curtos do telefone
+        for length in range(min(len(digits), cls.PHONE_SUFFIX_LENGTH), 0, -1):
+            entry = suffix_index.get(digits[-length:])
+            if entry is not None:
+                return entry
+        return None
+    
+    def _select_sheets(self, sheet_names: List[str]) -> List[str]:
+        """
+        Escolhe as abas da fonte que são lidas.
+        
+        Planilhas Excel usam só as abas mensais; nas fontes particionadas
+        (CSV/Parquet) cada arquivo é uma aba e todos são lidos.
+        
+        Args:
+            sheet_names: Lista com todos os nomes de abas da fonte
+            
+        Returns:
+            Lista das abas a serem lidas, na ordem original
+        """
+        if not self.source.month_sheets_only:
+            return list(sheet_names)
+        return self._filter_month_sheets(sheet_names)
+    
     def _filter_month_sheets(self, sheet_names: List[str]) -> List[str]:
         """
         Filtra abas com nomes de meses em português.
@@ -80,11 +872,80 @@ class ExcelHandler:
         Returns:
             True se a aba foi encontrada e definida, False caso contrário
         """
-        if sheet_name in self.sheet_data:
-            self.current_sheet = sheet_name
-            self.data = self.sheet_data[sheet_name]
+        with self._lock:
+            snapshot = self.get_snapshot(sheet_name)
+            if snapshot is None:
+                return False
+            
+            self._set_current_snapshot(snapshot)
+            self._evict_sheets()
             return True
-        return False
+    
+    def _set_current_snapshot(self, snapshot: SheetSnapshot) -> None:
+        """
+        Troca a aba atual; a fotografia é publicada numa única atribuição.
+        
+        Args:
+            snapshot: Fotografia da nova aba atual
+        """
+        self._current_snapshot = snapshot
+        self.current_sheet = snapshot.name
+        self.data = snapshot.data
+        self.sa_index = snapshot.sa_index
+    
+    def get_snapshot(self, sheet_name: Optional[str] = None) -> Optional[SheetSnapshot]:
+        """
+        Obtém a fotografia imutável de uma aba, sem alterar a aba atual.
+        
+        Abas em memória são devolvidas sem lock; no modo sob demanda a aba é
+        lida na primeira consulta.
+        
+        Args:
+            sheet_name: Nome da aba (opcional, usa a aba atual por padrão)
+            
+        Returns:
+            Fotografia da aba ou None se a aba não existir ou não puder ser lida
+        """
+        if sheet_name is None:
+            return self._current_snapshot
+        
+        snapshot = self.sheet_snapshots.get(sheet_name)
+        if snapshot is not None:
+            # Com limite de memória, marcar a aba como usada recentemente
+            if self.max_loaded_sheets is not None or self.max_loaded_bytes is not None:
+                with self._lock:
+                    if sheet_name in self.sheet_data:
+                        self.sheet_data.move_to_end(sheet_name)
+            return snapshot
+        
+        with self._lock:
+            if self._load_sheet(sheet_name) is None:
+                return None
+            return self.sheet_snapshots.get(sheet_name)
+    
+    def _snapshot(self, sheet_name: Optional[str]) -> SheetSnapshot:
+        """
+        Obtém a fotografia de uma aba para consulta, vazia se a aba não existir.
+        
+        Args:
+            sheet_name: Nome da aba (None para a aba atual)
+            
+        Returns:
+            Fotografia da aba
+        """
+        snapshot = self.get_snapshot(sheet_name)
+        return snapshot if snapshot is not None else SheetSnapshot.empty()
+    
+    def get_memory_usage(self) -> Dict[str, int]:
+        """
+        Retorna a memória ocupada por cada aba carregada.
+        
+        Returns:
+            Dicionário aba -> bytes, na ordem da planilha
+        """
+        with self._lock:
+            return {sheet: self.sheet_sizes[sheet] for sheet in self.sheet_names
+                    if sheet in self.sheet_data and sheet in self.sheet_sizes}
     
     def get_available_sheets(self) -> List[str]:
         """
@@ -93,84 +954,242 @@ class ExcelHandler:
         Returns:
             Lista de nomes de abas mensais
         """
-        return list(self.sheet_data.keys())
+        return list(self.sheet_names)
     
-    def get_contacts_by_sa(self, sa_list: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    def get_contacts_by_sa(self, sa_list: Optional[List[str]] = None,
+                           sheet_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Obtém contatos filtrados por SA.
         
         Args:
             sa_list: Lista de SAs para filtrar (opcional)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
             
         Returns:
             Lista de dicionários com informações dos contatos
         """
-        if self.data is None or self.data.empty:
-            return []
+        return list(self.iter_contacts(sa_list, sheet_name=sheet_name))
+    
+    def iter_contacts(self, sa_list: Optional[List[str]] = None,
+                      chunk_size: int = 1000,
+                      sheet_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre os contatos de uma aba sem materializar a lista inteira.
         
-        # Verificar se a coluna SA existe
-        if 'SA' not in self.data.columns:
-            print("Coluna SA não encontrada na planilha.")
-            return []
+        As linhas são convertidas em dicionários em blocos de chunk_size, então
+        o primeiro contato fica disponível imediatamente e a memória extra não
+        cresce com o tamanho da aba. A iteração usa sempre a mesma fotografia,
+        mesmo que a aba atual mude ou seja relida no meio do caminho.
         
-        # Filtrar por SA se fornecido
-        filtered_data = self.data if sa_list is None else self.data[self.data['SA'].isin(sa_list)]
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            chunk_size: Quantidade de linhas convertidas por vez
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
+        Yields:
+            Dicionário com informações de cada contato, na ordem da planilha
+        """
+        return self._snapshot(sheet_name).iter_contacts(sa_list, chunk_size)
+    
+    def iter_contact_records(self, sa_list: Optional[List[str]] = None,
+                             sheet_name: Optional[str] = None) -> Iterator[Contact]:
+        """
+        Percorre os contatos de uma aba como registros compactos, sem criar dicionários.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
+        Yields:
+            Contato de cada linha, na ordem da planilha
+        """
+        return self._snapshot(sheet_name).iter_contact_records(sa_list)
+    
+    def get_client_record(self, sa: str, sheet_name: Optional[str] = None) -> Optional[Contact]:
+        """
+        Obtém o registro compacto de um cliente por SA.
         
-        # Converter para lista de dicionários
-        return filtered_data.to_dict('records')
+        Args:
+            sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
+        Returns:
+            Contato ou None se não encontrado
+        """
+        return self._snapshot(sheet_name).get_client_record(sa)
     
-    def get_all_sa_numbers(self) -> List[str]:
+    def get_contact_view(self, sheet_name: Optional[str] = None) -> Optional[ContactView]:
+        """
+        Obtém a visão colunar compacta de uma aba.
+        
+        Args:
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
+        Returns:
+            Visão da aba ou None se a aba não existir
+        """
+        snapshot = self.get_snapshot(sheet_name)
+        return snapshot.view if snapshot is not None else None
+    
+    def count_contacts(self, sa_list: Optional[List[str]] = None, unique: bool = True,
+                       sheet_name: Optional[str] = None) -> int:
+        """
+        Conta os contatos com telefone que seriam percorridos por iter_contacts.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            unique: Se True, conta apenas a primeira linha de cada SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
+        Returns:
+            Quantidade de contatos
+        """
+        return self._snapshot(sheet_name).count_contacts(sa_list, unique)
+    
+    def get_all_sa_numbers(self, sheet_name: Optional[str] = None) -> List[str]:
         """
         Retorna todas as SAs disponíveis na planilha
         
+        Args:
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+            
         Returns:
             Lista de SAs
         """
-        if self.data is None or self.data.empty or 'SA' not in self.data.columns:
-            return []
-            
-        return self.data['SA'].dropna().astype(str).tolist()
+        return self._snapshot(sheet_name).get_all_sa_numbers()
     
-    def get_phone_number_by_sa(self, sa: str) -> Optional[str]:
+    def get_phone_number_by_sa(self, sa: str, sheet_name: Optional[str] = None) -> Optional[str]:
         """
         Obtém o número de telefone associado a uma SA.
         
         Args:
             sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
             
         Returns:
             Número de telefone ou None se não encontrado
         """
-        if self.data is None or self.data.empty:
-            return None
-            
-        if 'SA' not in self.data.columns or 'Telefone' not in self.data.columns:
-            print("Colunas SA ou Telefone não encontradas na planilha.")
-            return None
-            
-        result = self.data[self.data['SA'] == sa]['Telefone'].values
-        return str(result[0]) if len(result) > 0 else None
+        return self._snapshot(sheet_name).get_phone_number(sa)
     
-    def get_client_info_by_sa(self, sa: str) -> Dict[str, Any]:
+    def get_client_info_by_sa(self, sa: str, sheet_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Obtém todas as informações de um cliente por SA.
         
         Args:
             sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
             
         Returns:
             Dicionário com informações do cliente
         """
-        if self.data is None or self.data.empty:
-            return {}
+        return self._snapshot(sheet_name).get_client_info(sa)
+    
+    def get_client_info_by_sa_many(self, sa_list: List[str],
+                                   sheet_name: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Obtém as informações de vários clientes por SA numa única consulta.
+        
+        Args:
+            sa_list: Lista de SAs
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
             
-        if 'SA' not in self.data.columns:
-            print("Coluna SA não encontrada na planilha.")
-            return {}
+        Returns:
+            Lista alinhada com sa_list: dicionário do cliente ou None para as
+            SAs não encontradas
+        """
+        return self._snapshot(sheet_name).get_client_info_many(sa_list)
+    
+    def search(self, query: str, limit: Optional[int] = 50,
+               sheet_name: Optional[str] = None) -> List[str]:
+        """
+        Busca clientes por texto, ignorando maiúsculas e acentos.
+        
+        Todas as palavras da consulta precisam aparecer na linha, em qualquer
+        coluna (o telefone também é comparado só pelos dígitos).
+        
+        Args:
+            query: Texto buscado
+            limit: Máximo de SAs retornadas (None para todas)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
             
-        result = self.data[self.data['SA'] == sa]
-        return result.to_dict('records')[0] if not result.empty else {}
-
+        Returns:
+            SAs encontradas, da mais para a menos relevante
+        """
+        return self._snapshot(sheet_name).search(query, limit)
+    
+    def diff_sheets(self, old_sheet: str, new_sheet: Optional[str] = None,
+                    columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Compara duas abas mensais pela coluna SA.
+        
+        A comparação é feita por junção dos índices de SA das duas abas, sem
+        percorrer as linhas uma a uma; para cada SA vale a primeira linha.
+        
+        Args:
+            old_sheet: Aba anterior (por exemplo, o mês passado)
+            new_sheet: Aba nova (opcional, usa a aba atual por padrão)
+            columns: Colunas comparadas nas SAs presentes nas duas abas
+                (opcional, todas as colunas em comum por padrão)
+            
+        Returns:
+            Dicionário com SAs novas ('added'), removidas ('removed') e
+            alteradas ('changed', SA -> colunas alteradas), ou None se alguma
+            das abas não existir
+        """
+        old_snapshot = self.get_snapshot(old_sheet)
+        new_snapshot = self.get_snapshot(new_sheet)
+        if old_snapshot is None or new_snapshot is None or new_snapshot.name is None:
+            return None
+        return self._diff_frames(old_snapshot.data, new_snapshot.data, columns)
+    
+    def get_delta_sa_numbers(self, old_sheet: str, new_sheet: Optional[str] = None,
+                             include_changed: bool = True,
+                             columns: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Retorna as SAs de uma aba que não estavam (ou mudaram) em outra aba.
+        
+        Usado para campanhas que devem atingir só a diferença entre dois meses.
+        
+        Args:
+            old_sheet: Aba anterior
+            new_sheet: Aba nova (opcional, usa a aba atual por padrão)
+            include_changed: Se True, inclui também as SAs alteradas
+            columns: Colunas consideradas para decidir se uma SA mudou
+            
+        Returns:
+            SAs na ordem da aba nova, ou None se alguma das abas não existir
+        """
+        diff = self.diff_sheets(old_sheet, new_sheet, columns)
+        if diff is None:
+            return None
+        
+        delta = set(diff["added"])
+        if include_changed:
+            delta.update(diff["changed"])
+        return [sa for sa in self._snapshot(new_sheet).sa_index if sa in delta]
+    
+    def find_client_by_sa(self, sa: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Busca um cliente por SA em todas as abas, sem alterar a aba atual.
+        
+        As abas são consultadas na ordem da planilha; a primeira que tiver a SA
+        prevalece.
+        
+        Args:
+            sa: Número da SA
+            
+        Returns:
+            Tupla (aba, informações do cliente) ou None se não encontrado
+        """
+        key = self._normalize_sa(sa)
+        if key is None:
+            return None
+        
+        for sheet in list(self.sheet_names):
+            snapshot = self.get_snapshot(sheet)
+            if snapshot is not None and key in snapshot.sa_index:
+                return sheet, snapshot.get_client_info(key)
+        return None
 
 if __name__ == "__main__":
     # Teste simples da classe
@@ -0,0 +1,145 @@
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Separador entre os campos no texto indexado, para que uma busca não
+# encontre trechos formados pelo fim de um campo e o começo do próximo
+_FIELD_SEPARATOR = '\x1f'
+
+def fold_text(text: str) -> str:
+    """
+    Normaliza um texto para busca: minúsculas, sem acentos e sem espaços extras.
+    
+    Args:
+        text: Texto original
+    
+    Returns:
+        Texto normalizado
+    """
+    # Mesma normalização aplicada às colunas por _fold_series
+    folded = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(folded.lower().split())
+
+def _fold_series(values: pd.Series) -> pd.Series:
+    """
+    Normaliza uma coluna inteira para busca (células vazias viram texto vazio).
+    
+    Args:
+        values: Coluna da aba
+    
+    Returns:
+        Coluna de textos normalizados
+    """
+    text = values.astype(object).where(values.notna(), '').astype(str)
+    return (text.str.normalize('NFKD')
+                .str.encode('ascii', 'ignore').str.decode('ascii')
+                .str.lower()
+                .str.split().str.join(' '))
+
+class SearchIndex:
+    def __init__(self, df: pd.DataFrame):
+        """
+        Monta o índice de busca textual de uma aba.
+        
+        Todas as colunas de cada linha são normalizadas (minúsculas, sem
+        acentos) e concatenadas num único texto, junto com os dígitos do
+        telefone, para que uma busca percorra uma só coluna já preparada.
+        
+        Args:
+            df: Dados da aba
+        """
+        columns = list(df.columns)
+        self._sa = (_fold_series(df['SA']).to_numpy(dtype=object) if 'SA' in columns
+                    else np.array([''] * len(df), dtype=object))
+        
+        fields = [_fold_series(df[column]) for column in columns if columns.count(column) == 1]
+        key_fields = [_fold_series(df[column]) for column in ('SA', 'Nome', 'Cliente', 'Telefone')
+                      if columns.count(column) == 1]
+        
+        if 'Telefone' in columns and columns.count('Telefone') == 1:
+            digits = df['Telefone'].astype(object).where(df['Telefone'].notna(), '').astype(str) \
+                .str.replace(r'\D', '', regex=True)
+            fields.append(digits)
+            key_fields.append(digits)
+        
+        self._text = self._join(fields, len(df))
+        self._key_text = self._join(key_fields, len(df))
+        self._sa_values = df['SA'].tolist() if 'SA' in columns else [None] * len(df)
+    
+    @staticmethod
+    def _join(fields: List[pd.Series], rows: int) -> np.ndarray:
+        """
+        Concatena colunas normalizadas linha a linha.
+        
+        Args:
+            fields: Colunas normalizadas
+            rows: Quantidade de linhas
+        
+        Returns:
+            Array com o texto de cada linha
+        """
+        if not fields:
+            return np.array([''] * rows, dtype=object)
+        text = fields[0]
+        for field in fields[1:]:
+            text = text + _FIELD_SEPARATOR + field
+        return text.to_numpy(dtype=object)
+    
+    def search(self, query: str, limit: Optional[int] = 50) -> List[str]:
+        """
+        Busca SAs cujas linhas contêm todas as palavras da consulta.
+        
+        As linhas são ordenadas por relevância: SA igual à consulta, depois
+        consultas encontradas em SA, nome ou telefone, depois as demais
+        colunas; empates mantêm a ordem da planilha.
+        
+        Args:
+            query: Texto buscado (maiúsculas e acentos são ignorados)
+            limit: Máximo de SAs retornadas (None para todas)
+        
+        Returns:
+            SAs encontradas, sem repetição, da mais para a menos relevante
+        """
+        terms = fold_text(query).split()
+        if not terms:
+            return []
+        
+        text = pd.Series(self._text)
+        key_text = pd.Series(self._key_text)
+        matches = np.ones(len(text), dtype=bool)
+        key_matches = np.ones(len(text), dtype=bool)
+        for term in terms:
+            term_matches = text.str.contains(term, regex=False).to_numpy()
+            term_key_matches = key_text.str.contains(term, regex=False).to_numpy()
+            
+            # Telefones digitados com pontuação, como (19) 99735-3483, também
+            # são comparados só pelos dígitos
+            digits = ''.join(filter(str.isdigit, term))
+            if digits and digits != term and not any(char.isalpha() for char in term):
+                term_matches = term_matches | text.str.contains(digits, regex=False).to_numpy()
+                term_key_matches = term_key_matches | key_text.str.contains(digits, regex=False).to_numpy()
+            
+            matches &= term_matches
+            key_matches &= term_key_matches
+        
+        positions = np.flatnonzero(matches)
+        if not len(positions):
+            return []
+        
+        folded_query = ' '.join(terms)
+        scores = key_matches[positions].astype(int) + 2 * (self._sa[positions] == folded_query)
+        ranked = positions[np.argsort(-scores, kind='stable')]
+        
+        results = []
+        seen = set()
+        for position in ranked:
+            sa = self._sa_values[position]
+            if not isinstance(sa, str) or sa in seen:
+                continue
+            seen.add(sa)
+            results.append(sa)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
\ No newline at end of file
@@ -0,0 +1,324 @@
+import pandas as pd
+import numpy as np
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Iterator, Sequence
+
+from excel_reader.contact_view import ContactView, Contact
+from excel_reader.search_index import SearchIndex
+
+def normalize_sa(sa: Any) -> Optional[str]:
+    """
+    Normaliza uma SA para uso como chave de índice.
+    
+    Args:
+        sa: Valor da SA (str, int ou float vindo da planilha)
+    
+    Returns:
+        SA como string sem espaços (e sem sufixo ".0") ou None se vazia
+    """
+    if sa is None or (isinstance(sa, float) and pd.isna(sa)):
+        return None
+    if isinstance(sa, float) and sa.is_integer():
+        sa = int(sa)
+    key = str(sa).strip()
+    return key or None
+
+def normalize_phone(phone: Any) -> str:
+    """
+    Normaliza um telefone mantendo apenas os dígitos.
+    
+    Args:
+        phone: Telefone (str, int ou float vindo da planilha)
+    
+    Returns:
+        String com os dígitos do telefone (vazia se não houver)
+    """
+    if phone is None or (isinstance(phone, float) and pd.isna(phone)):
+        return ''
+    if isinstance(phone, float) and phone.is_integer():
+        phone = int(phone)
+    return ''.join(filter(str.isdigit, str(phone)))
+
+class SheetSnapshot:
+    __slots__ = ('name', 'data', 'sa_index', 'view', '_date_columns', '_search_index')
+    
+    def __init__(self, name: Optional[str], data: pd.DataFrame, sa_index: Dict[str, int]):
+        """
+        Inicializa uma fotografia imutável de uma aba lida.
+        
+        Dados, índice SA e visão compacta pertencem sempre à mesma versão da
+        aba. Quando a aba é relida ou a aba atual muda, o manipulador publica
+        outra fotografia em vez de alterar esta, então as consultas podem ser
+        feitas de várias threads sem lock.
+        
+        Args:
+            name: Nome da aba (None para a fotografia vazia)
+            data: Dados da aba (não devem ser alterados depois de publicados)
+            sa_index: Índice SA -> posição da linha da aba
+        """
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'data', data)
+        object.__setattr__(self, 'sa_index', MappingProxyType(sa_index))
+        object.__setattr__(self, 'view', ContactView(data))
+        object.__setattr__(self, '_date_columns', [column for column, dtype in data.dtypes.items()
+                                                   if pd.api.types.is_datetime64_any_dtype(dtype)])
+        object.__setattr__(self, '_search_index', None)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("SheetSnapshot é imutável")
+    
+    @classmethod
+    def empty(cls) -> 'SheetSnapshot':
+        """
+        Cria uma fotografia sem aba e sem dados.
+        
+        Returns:
+            Fotografia vazia
+        """
+        return cls(None, pd.DataFrame(), {})
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def __repr__(self) -> str:
+        return f"SheetSnapshot(name={self.name!r}, rows={len(self.data)})"
+    
+    def position_of(self, sa: Any) -> Optional[int]:
+        """
+        Obtém a posição da primeira linha de uma SA.
+        
+        Args:
+            sa: Número da SA
+        
+        Returns:
+            Posição da linha ou None se a SA não existir na aba
+        """
+        return self.sa_index.get(normalize_sa(sa))
+    
+    def get_client_info(self, sa: str) -> Dict[str, Any]:
+        """
+        Obtém todas as informações de um cliente por SA.
+        
+        Args:
+            sa: Número da SA
+        
+        Returns:
+            Dicionário com informações do cliente (vazio se não encontrado)
+        """
+        if self.data.empty:
+            return {}
+        
+        if 'SA' not in self.data.columns:
+            print("Coluna SA não encontrada na planilha.")
+            return {}
+        
+        position = self.position_of(sa)
+        if position is None:
+            return {}
+        return self.row_to_dict(position)
+    
+    def get_client_info_many(self, sa_list: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Obtém as informações de vários clientes de uma só vez.
+        
+        As posições são resolvidas pelo índice SA e todas as linhas encontradas
+        são convertidas numa única operação, em vez de uma conversão por SA.
+        
+        Args:
+            sa_list: Lista de SAs
+        
+        Returns:
+            Lista alinhada com sa_list: dicionário do cliente ou None para as
+            SAs não encontradas
+        """
+        if self.data.empty or 'SA' not in self.data.columns:
+            return [None] * len(sa_list)
+        
+        positions = [self.sa_index.get(normalize_sa(sa)) for sa in sa_list]
+        found = [position for position in positions if position is not None]
+        records = iter(self._to_records(found) if found else [])
+        return [next(records) if position is not None else None for position in positions]
+    
+    def search(self, query: str, limit: Optional[int] = 50) -> List[str]:
+        """
+        Busca clientes por texto em todas as colunas da aba.
+        
+        O índice de busca é montado na primeira busca e reaproveitado enquanto
+        esta fotografia estiver publicada.
+        
+        Args:
+            query: Texto buscado (maiúsculas e acentos são ignorados)
+            limit: Máximo de SAs retornadas (None para todas)
+        
+        Returns:
+            SAs encontradas, da mais para a menos relevante
+        """
+        if self.data.empty:
+            return []
+        
+        index = self._search_index
+        if index is None:
+            # Duas threads podem montar o índice ao mesmo tempo; ambos são iguais
+            index = SearchIndex(self.data)
+            object.__setattr__(self, '_search_index', index)
+        return index.search(query, limit)
+    
+    def get_phone_number(self, sa: str) -> Optional[str]:
+        """
+        Obtém o número de telefone associado a uma SA.
+        
+        Args:
+            sa: Número da SA
+        
+        Returns:
+            Número de telefone (apenas dígitos) ou None se não encontrado
+        """
+        if self.data.empty:
+            return None
+        
+        if 'SA' not in self.data.columns or 'Telefone' not in self.data.columns:
+            print("Colunas SA ou Telefone não encontradas na planilha.")
+            return None
+        
+        position = self.position_of(sa)
+        if position is None:
+            return None
+        # Telefones numéricos (int ou float com ".0") também são aceitos
+        return normalize_phone(self.data['Telefone'].iat[position]) or None
+    
+    def get_client_record(self, sa: str) -> Optional[Contact]:
+        """
+        Obtém o registro compacto de um cliente por SA.
+        
+        Args:
+            sa: Número da SA
+        
+        Returns:
+            Contato ou None se não encontrado
+        """
+        position = self.position_of(sa)
+        return self.view.record(position) if position is not None else None
+    
+    def contact_positions(self, sa_list: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """
+        Calcula as posições das linhas da aba filtradas por SA.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+        
+        Returns:
+            Posições das linhas ou None se a aba não tiver dados ou coluna SA
+        """
+        if self.data.empty:
+            return None
+        
+        # Verificar se a coluna SA existe
+        if 'SA' not in self.data.columns:
+            print("Coluna SA não encontrada na planilha.")
+            return None
+        
+        if sa_list is None:
+            return np.arange(len(self.data))
+        
+        # A coluna SA já vem normalizada da leitura (ExcelHandler.COLUMN_SCHEMA)
+        wanted = {key for key in map(normalize_sa, sa_list) if key is not None}
+        return np.flatnonzero(self.data['SA'].isin(wanted).to_numpy())
+    
+    def iter_contacts(self, sa_list: Optional[List[str]] = None,
+                      chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre os contatos da aba como dicionários, convertidos em blocos.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            chunk_size: Quantidade de linhas convertidas por vez
+        
+        Yields:
+            Dicionário com informações de cada contato, na ordem da planilha
+        """
+        positions = self.contact_positions(sa_list)
+        if positions is None:
+            return
+        
+        for start in range(0, len(positions), chunk_size):
+            yield from self._to_records(positions[start:start + chunk_size])
+    
+    def iter_contact_records(self, sa_list: Optional[List[str]] = None) -> Iterator[Contact]:
+        """
+        Percorre os contatos da aba como registros compactos.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+        
+        Yields:
+            Contato de cada linha, na ordem da planilha
+        """
+        positions = self.contact_positions(sa_list)
+        if positions is None:
+            return
+        
+        yield from self.view.records(positions)
+    
+    def count_contacts(self, sa_list: Optional[List[str]] = None, unique: bool = True) -> int:
+        """
+        Conta os contatos com telefone que seriam percorridos por iter_contacts.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            unique: Se True, conta apenas a primeira linha de cada SA
+        
+        Returns:
+            Quantidade de contatos
+        """
+        positions = self.contact_positions(sa_list)
+        if positions is None or 'Telefone' not in self.data.columns:
+            return 0
+        
+        rows = self.data.iloc[positions]
+        if unique:
+            rows = rows[~rows['SA'].duplicated(keep='first')]
+        return int(rows['Telefone'].notna().sum())
+    
+    def get_all_sa_numbers(self) -> List[str]:
+        """
+        Retorna todas as SAs da aba.
+        
+        Returns:
+            Lista de SAs
+        """
+        if self.data.empty or 'SA' not in self.data.columns:
+            return []
+        
+        return self.data['SA'].dropna().tolist()
+    
+    def row_to_dict(self, position: int) -> Dict[str, Any]:
+        """
+        Converte uma linha em dicionário com tipos nativos do Python, como to_dict('records').
+        
+        Args:
+            position: Posição da linha
+        
+        Returns:
+            Dicionário coluna -> valor
+        """
+        return self._to_records([position])[0]
+    
+    def _to_records(self, positions: Sequence[int]) -> List[Dict[str, Any]]:
+        """
+        Converte as linhas informadas em dicionários numa única operação.
+        
+        Datas vazias viram None em vez de NaT, para que os dicionários possam
+        ser serializados em JSON.
+        
+        Args:
+            positions: Posições das linhas
+        
+        Returns:
+            Lista de dicionários coluna -> valor
+        """
+        records = self.data.iloc[positions].to_dict('records')
+        for column in self._date_columns:
+            for record in records:
+                if record[column] is pd.NaT:
+                    record[column] = None
+        return records
\ No newline at end of file
@@ -0,0 +1,313 @@
+import os
+import json
+import hashlib
+import tempfile
+import datetime
+import importlib.util
+from typing import Dict, List, Any, Optional
+
+import pandas as pd
+
+# As abas são gravadas em Parquet, que requer o pyarrow (opcional)
+_HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+class WorkbookCache:
+    # Versão do formato do cache; mudar invalida os caches existentes
+    CACHE_VERSION = 4
+    # Sem pyarrow não há cache em disco e as abas são sempre lidas da planilha
+    available = _HAS_PYARROW
+    
+    def __init__(self, cache_dir: str, excel_path: str):
+        """
+        Inicializa o cache em disco de uma planilha já lida.
+        
+        Cada planilha tem um diretório próprio com um manifest.json (impressão
+        digital do arquivo e lista de abas) e, por aba, um arquivo Parquet com
+        os dados e um JSON com os índices já montados. Nenhum dos formatos
+        executa código ao ser lido, então um cache alterado por outra pessoa
+        no máximo produz dados errados ou é descartado.
+        
+        Args:
+            cache_dir: Diretório base do cache
+            excel_path: Caminho para o arquivo Excel
+        """
+        self.excel_path = os.path.abspath(excel_path)
+        key = hashlib.sha1(self.excel_path.encode('utf-8')).hexdigest()[:16]
+        self.cache_dir = os.path.join(cache_dir, key)
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        self.manifest = None
+    
+    def fingerprint(self, with_hash: bool = True) -> Dict[str, Any]:
+        """
+        Calcula a impressão digital atual do arquivo Excel.
+        
+        Args:
+            with_hash: Se True, inclui o hash SHA-256 do conteúdo
+        
+        Returns:
+            Dicionário com caminho, mtime, tamanho e (opcionalmente) hash
+        """
+        stat = os.stat(self.excel_path)
+        fingerprint = {
+            "path": self.excel_path,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size
+        }
+        if with_hash:
+            fingerprint["sha256"] = self._content_hash()
+        return fingerprint
+    
+    def _content_hash(self) -> str:
+        """
+        Calcula o hash SHA-256 do conteúdo do arquivo Excel.
+        
+        Returns:
+            Hash em hexadecimal
+        """
+        digest = hashlib.sha256()
+        with open(self.excel_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def load_manifest(self) -> Optional[Dict[str, Any]]:
+        """
+        Carrega o manifesto do cache.
+        
+        Returns:
+            Manifesto ou None se não existir, estiver corrompido ou for de outra versão
+        """
+        if not os.path.exists(self.manifest_path):
+            return None
+        
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"Erro ao carregar manifesto do cache da planilha: {str(e)}")
+            return None
+        
+        if manifest.get("version") != self.CACHE_VERSION:
+            return None
+        
+        self.manifest = manifest
+        return manifest
+    
+    def is_fresh(self, manifest: Dict[str, Any]) -> bool:
+        """
+        Verifica se o cache corresponde ao arquivo Excel atual.
+        
+        Se caminho, mtime e tamanho forem iguais o cache é considerado válido sem
+        ler o arquivo; caso contrário o hash do conteúdo decide.
+        
+        Args:
+            manifest: Manifesto do cache
+        
+        Returns:
+            True se o cache pode ser usado
+        """
+        cached = manifest.get("fingerprint", {})
+        try:
+            current = self.fingerprint(with_hash=False)
+        except OSError:
+            return False
+        
+        if all(cached.get(key) == current[key] for key in ("path", "mtime_ns", "size")):
+            return True
+        
+        # Arquivo tocado sem mudança de conteúdo (cópia, sincronização, etc.)
+        current["sha256"] = self._content_hash()
+        if cached.get("sha256") == current["sha256"]:
+            manifest["fingerprint"] = current
+            self._write_manifest(manifest)
+            return True
+        
+        return False
+    
+    def reset(self, fingerprint: Dict[str, Any], sheet_names: List[str]) -> None:
+        """
+        Inicia uma nova geração do cache, descartando as abas anteriores.
+        
+        Args:
+            fingerprint: Impressão digital do arquivo que será lido
+            sheet_names: Abas mensais da planilha, na ordem original
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for filename in os.listdir(self.cache_dir):
+            # Inclui arquivos de gerações anteriores e de gravações interrompidas
+            if filename.startswith("sheet_"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+        
+        self.manifest = {
+            "version": self.CACHE_VERSION,
+            "fingerprint": fingerprint,
+            "sheet_names": list(sheet_names),
+            "sheets": {},
+            "updated_at": datetime.datetime.now().isoformat()
+        }
+        self._write_manifest(self.manifest)
+    
+    def set_sheet_names(self, sheet_names: List[str]) -> None:
+        """
+        Atualiza a lista de abas registrada no manifesto.
+        
+        Args:
+            sheet_names: Abas mensais da planilha, na ordem original
+        """
+        if self.manifest is None:
+            return
+        self.manifest["sheet_names"] = list(sheet_names)
+        self._write_manifest(self.manifest)
+    
+    def update_fingerprint(self, fingerprint: Optional[Dict[str, Any]]) -> None:
+        """
+        Registra no manifesto a impressão digital do arquivo já refletido no cache.
+        
+        Args:
+            fingerprint: Impressão digital do arquivo
+        """
+        if self.manifest is None or not fingerprint:
+            return
+        self.manifest["fingerprint"] = fingerprint
+        self._write_manifest(self.manifest)
+    
+    def drop_sheet(self, sheet_name: str) -> None:
+        """
+        Remove uma aba do cache.
+        
+        Args:
+            sheet_name: Nome da aba
+        """
+        if self.manifest is None:
+            return
+        
+        filename = self.manifest.get("sheets", {}).pop(sheet_name, None)
+        self._write_manifest(self.manifest)
+        if filename:
+            self._remove_files(filename)
+    
+    def save_sheet(self, sheet_name: str, payload: Dict[str, Any]) -> None:
+        """
+        Salva uma aba lida (dados e índices) no cache.
+        
+        Os arquivos de cada gravação têm nome novo e só passam a valer quando
+        o manifesto é regravado, então dados e índices nunca ficam de versões
+        diferentes. Abas que o Parquet não consegue representar (ex.: colunas
+        com números e textos misturados) ficam fora do cache e são lidas da
+        planilha.
+        
+        Args:
+            sheet_name: Nome da aba
+            payload: Dados da aba e índices já montados
+        """
+        if self.manifest is None:
+            return
+        
+        sheets = self.manifest.setdefault("sheets", {})
+        previous = sheets.get(sheet_name)
+        used = set(sheets.values())
+        filename = next(f"sheet_{number}" for number in range(len(used) + 1)
+                        if f"sheet_{number}" not in used)
+        try:
+            indexes = {
+                "sa_index": payload.get("sa_index"),
+                "phone_index": payload.get("phone_index"),
+                "size": payload.get("size")
+            }
+            base_path = os.path.join(self.cache_dir, filename)
+            self._atomic_write(base_path + ".parquet", payload["data"].to_parquet(engine='pyarrow'))
+            self._atomic_write(base_path + ".json", json.dumps(indexes, ensure_ascii=False).encode('utf-8'))
+        except Exception as e:
+            print(f"Erro ao salvar aba '{sheet_name}' no cache: {str(e)}")
+            self._remove_files(filename)
+            # A versão anterior da aba no cache não corresponde mais à planilha
+            if previous:
+                self.drop_sheet(sheet_name)
+            return
+        
+        sheets[sheet_name] = filename
+        self.manifest["updated_at"] = datetime.datetime.now().isoformat()
+        self._write_manifest(self.manifest)
+        if previous:
+            self._remove_files(previous)
+    
+    def load_sheet(self, sheet_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Carrega uma aba do cache.
+        
+        Args:
+            sheet_name: Nome da aba
+        
+        Returns:
+            Dados da aba e índices, ou None se a aba não estiver no cache
+        """
+        if self.manifest is None:
+            return None
+        
+        filename = self.manifest.get("sheets", {}).get(sheet_name)
+        if not filename:
+            return None
+        
+        base_path = os.path.join(self.cache_dir, filename)
+        try:
+            with open(base_path + ".json", 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            payload["data"] = pd.read_parquet(base_path + ".parquet", engine='pyarrow')
+            return payload
+        except Exception as e:
+            print(f"Erro ao carregar aba '{sheet_name}' do cache: {str(e)}")
+            return None
+    
+    def _remove_files(self, filename: str) -> None:
+        """
+        Remove os arquivos de dados e de índices de uma aba.
+        
+        Args:
+            filename: Nome base dos arquivos da aba no cache
+        """
+        for extension in (".parquet", ".json"):
+            try:
+                os.remove(os.path.join(self.cache_dir, filename + extension))
+            except OSError:
+                pass
+    
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        """
+        Grava o manifesto do cache.
+        
+        Args:
+            manifest: Manifesto a ser gravado
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._atomic_write(self.manifest_path,
+                               json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        except Exception as e:
+            print(f"Erro ao salvar manifesto do cache da planilha: {str(e)}")
+    
+    @staticmethod
+    def _atomic_write(path: str, content: bytes) -> None:
+        """
+        Grava um arquivo por meio de um arquivo temporário e renomeação.
+        
+        Args:
+            path: Caminho final do arquivo
+            content: Conteúdo a ser gravado
+        """
+        # Nome temporário único: dois processos atualizando a mesma entrada do
+        # cache não gravam no mesmo arquivo temporário
+        directory, filename = os.path.split(path)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{filename}.", suffix=".tmp", dir=directory or ".")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
\ No newline at end of file
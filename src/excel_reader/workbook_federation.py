@@ -0,0 +1,552 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Union
+
+from excel_reader.contact_view import ContactView, Contact
+from excel_reader.excel_handler import ExcelHandler
+from excel_reader.sheet_snapshot import SheetSnapshot, normalize_sa
+
+class WorkbookFederation:
+    # Separador entre o rótulo da planilha e o nome da aba ("LAS / Janeiro")
+    SHEET_SEPARATOR = ' / '
+    
+    # Chave adicionada aos dicionários de cliente com o rótulo da planilha de origem
+    SOURCE_KEY = 'Fonte'
+    
+    def __init__(self, workbooks: Union[List[str], Dict[str, str]], **handler_options: Any):
+        """
+        Inicializa um conjunto de planilhas consultadas como se fossem uma só.
+        
+        Cada planilha continua com seu próprio ExcelHandler (leitura, cache e
+        observação do arquivo); as abas são expostas com o nome qualificado
+        "<rótulo> / <aba>" e as buscas por SA e telefone usam índices únicos
+        montados sobre todas as planilhas, na ordem em que foram informadas.
+        
+        Args:
+            workbooks: Lista de caminhos (o rótulo é o nome do arquivo sem
+                extensão) ou dicionário rótulo -> caminho
+            handler_options: Opções repassadas a cada ExcelHandler
+        """
+        if isinstance(workbooks, dict):
+            items = list(workbooks.items())
+        else:
+            items = [(self._default_label(path), path) for path in workbooks]
+        
+        self.handlers = OrderedDict()  # Rótulo -> manipulador da planilha
+        for label, path in items:
+            # Rótulos repetidos (arquivos com o mesmo nome) ganham um número
+            unique_label = label
+            counter = 2
+            while unique_label in self.handlers:
+                unique_label = f"{label} ({counter})"
+                counter += 1
+            print(f"Carregando planilha '{unique_label}': {path}")
+            self.handlers[unique_label] = ExcelHandler(path, **handler_options)
+        
+        self.excel_paths = [handler.excel_path for handler in self.handlers.values()]
+        self._current_label = None  # Rótulo da planilha da aba atual
+        self._lock = threading.Lock()
+        self._index_generations = None  # Gerações dos manipuladores usadas nos índices
+        self.sa_sheet_index = {}  # SA -> aba qualificada, sobre todas as planilhas
+        self.phone_index = {}  # Dígitos do telefone -> (aba qualificada, SA)
+        self.phone_suffix_index = {}  # Últimos dígitos do telefone -> (aba qualificada, SA)
+        
+        # Usar a aba atual da primeira planilha que tiver abas mensais
+        for label, handler in self.handlers.items():
+            if handler.current_sheet is not None:
+                self._current_label = label
+                break
+    
+    @staticmethod
+    def _default_label(path: str) -> str:
+        """
+        Gera o rótulo de uma planilha a partir do caminho.
+        
+        Args:
+            path: Caminho do arquivo ou diretório
+        
+        Returns:
+            Nome do arquivo sem extensão
+        """
+        return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    
+    def qualify(self, label: str, sheet_name: str) -> str:
+        """
+        Monta o nome qualificado de uma aba.
+        
+        Args:
+            label: Rótulo da planilha
+            sheet_name: Nome da aba na planilha
+        
+        Returns:
+            Nome "<rótulo> / <aba>"
+        """
+        return f"{label}{self.SHEET_SEPARATOR}{sheet_name}"
+    
+    def split_sheet_name(self, sheet_name: str) -> Optional[Tuple[str, str]]:
+        """
+        Separa um nome qualificado em rótulo da planilha e nome da aba.
+        
+        Args:
+            sheet_name: Nome qualificado da aba
+        
+        Returns:
+            Tupla (rótulo, aba) ou None se o rótulo não existir
+        """
+        label, separator, sheet = sheet_name.partition(self.SHEET_SEPARATOR)
+        if not separator or label not in self.handlers:
+            return None
+        return label, sheet
+    
+    def _route(self, sheet_name: Optional[str]) -> Tuple[Optional[str], Optional[ExcelHandler], Optional[str]]:
+        """
+        Encontra o manipulador responsável por uma aba.
+        
+        Args:
+            sheet_name: Nome qualificado da aba (None para a aba atual)
+        
+        Returns:
+            Tupla (rótulo, manipulador, aba na planilha); manipulador None se a
+            aba não existir
+        """
+        if sheet_name is None:
+            label = self._current_label
+            return label, self.handlers.get(label), None
+        
+        parts = self.split_sheet_name(sheet_name)
+        if parts is None:
+            return None, None, None
+        label, sheet = parts
+        return label, self.handlers[label], sheet
+    
+    def _tag(self, label: Optional[str], info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Marca o dicionário de um cliente com a planilha de origem.
+        
+        Args:
+            label: Rótulo da planilha
+            info: Informações do cliente (vazio ou None se não encontrado)
+        
+        Returns:
+            O próprio dicionário, com a chave SOURCE_KEY quando não vazio
+        """
+        if info:
+            info[self.SOURCE_KEY] = label
+        return info
+    
+    @property
+    def sheet_names(self) -> List[str]:
+        """Abas mensais de todas as planilhas, com nomes qualificados"""
+        return [self.qualify(label, sheet)
+                for label, handler in self.handlers.items()
+                for sheet in handler.sheet_names]
+    
+    @property
+    def current_sheet(self) -> Optional[str]:
+        """Nome qualificado da aba atual"""
+        handler = self.handlers.get(self._current_label)
+        if handler is None or handler.current_sheet is None:
+            return None
+        return self.qualify(self._current_label, handler.current_sheet)
+    
+    @property
+    def data(self):
+        """Dados da aba atual"""
+        handler = self.handlers.get(self._current_label)
+        return handler.data if handler is not None else None
+    
+    def source_of(self, sheet_name: str) -> Optional[str]:
+        """
+        Obtém o rótulo da planilha de uma aba qualificada.
+        
+        Args:
+            sheet_name: Nome qualificado da aba
+        
+        Returns:
+            Rótulo da planilha ou None se a aba não existir
+        """
+        parts = self.split_sheet_name(sheet_name)
+        return parts[0] if parts else None
+    
+    def get_available_sheets(self) -> List[str]:
+        """
+        Retorna a lista de abas mensais de todas as planilhas.
+        
+        Returns:
+            Lista de nomes qualificados de abas
+        """
+        return self.sheet_names
+    
+    def set_current_sheet(self, sheet_name: str) -> bool:
+        """
+        Define a aba atual para trabalhar.
+        
+        Args:
+            sheet_name: Nome qualificado da aba
+        
+        Returns:
+            True se a aba foi encontrada e definida, False caso contrário
+        """
+        label, handler, sheet = self._route(sheet_name)
+        if handler is None or sheet is None or not handler.set_current_sheet(sheet):
+            return False
+        self._current_label = label
+        return True
+    
+    def start_watching(self, interval: float = 5.0) -> None:
+        """
+        Passa a observar todas as planilhas.
+        
+        Args:
+            interval: Intervalo entre verificações em segundos
+        """
+        for handler in self.handlers.values():
+            handler.start_watching(interval)
+    
+    def stop_watching(self) -> None:
+        """Para de observar todas as planilhas"""
+        for handler in self.handlers.values():
+            handler.stop_watching()
+    
+    def reload_changed_sheets(self) -> Dict[str, Dict[str, int]]:
+        """
+        Relê as abas alteradas de todas as planilhas.
+        
+        Returns:
+            Resumo das alterações por aba qualificada
+        """
+        changes = {}
+        for label, handler in self.handlers.items():
+            for sheet, summary in handler.reload_changed_sheets().items():
+                changes[self.qualify(label, sheet)] = summary
+        return changes
+    
+    def get_snapshot(self, sheet_name: Optional[str] = None) -> Optional[SheetSnapshot]:
+        """
+        Obtém a fotografia imutável de uma aba, sem alterar a aba atual.
+        
+        Args:
+            sheet_name: Nome qualificado da aba (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Fotografia da aba ou None se a aba não existir
+        """
+        _, handler, sheet = self._route(sheet_name)
+        return handler.get_snapshot(sheet) if handler is not None else None
+    
+    def _snapshot(self, sheet_name: Optional[str]) -> Tuple[Optional[str], SheetSnapshot]:
+        """
+        Obtém a fotografia de uma aba para consulta, vazia se a aba não existir.
+        
+        Args:
+            sheet_name: Nome qualificado da aba (None para a aba atual)
+        
+        Returns:
+            Tupla (rótulo da planilha, fotografia da aba)
+        """
+        label, handler, sheet = self._route(sheet_name)
+        snapshot = handler.get_snapshot(sheet) if handler is not None else None
+        return label, snapshot if snapshot is not None else SheetSnapshot.empty()
+    
+    def get_memory_usage(self) -> Dict[str, int]:
+        """
+        Retorna a memória ocupada por cada aba carregada de todas as planilhas.
+        
+        Returns:
+            Dicionário aba qualificada -> bytes
+        """
+        return {self.qualify(label, sheet): size
+                for label, handler in self.handlers.items()
+                for sheet, size in handler.get_memory_usage().items()}
+    
+    def get_contacts_by_sa(self, sa_list: Optional[List[str]] = None,
+                           sheet_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Obtém contatos filtrados por SA.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Lista de dicionários com informações dos contatos
+        """
+        return list(self.iter_contacts(sa_list, sheet_name=sheet_name))
+    
+    def iter_contacts(self, sa_list: Optional[List[str]] = None,
+                      chunk_size: int = 1000,
+                      sheet_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre os contatos de uma aba, marcados com a planilha de origem.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            chunk_size: Quantidade de linhas convertidas por vez
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Yields:
+            Dicionário com informações de cada contato, na ordem da planilha
+        """
+        label, snapshot = self._snapshot(sheet_name)
+        for info in snapshot.iter_contacts(sa_list, chunk_size):
+            yield self._tag(label, info)
+    
+    def iter_contact_records(self, sa_list: Optional[List[str]] = None,
+                             sheet_name: Optional[str] = None) -> Iterator[Contact]:
+        """
+        Percorre os contatos de uma aba como registros compactos.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Yields:
+            Contato de cada linha, na ordem da planilha
+        """
+        return self._snapshot(sheet_name)[1].iter_contact_records(sa_list)
+    
+    def get_client_record(self, sa: str, sheet_name: Optional[str] = None) -> Optional[Contact]:
+        """
+        Obtém o registro compacto de um cliente por SA.
+        
+        Args:
+            sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Contato ou None se não encontrado
+        """
+        return self._snapshot(sheet_name)[1].get_client_record(sa)
+    
+    def get_contact_view(self, sheet_name: Optional[str] = None) -> Optional[ContactView]:
+        """
+        Obtém a visão colunar compacta de uma aba.
+        
+        Args:
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Visão da aba ou None se a aba não existir
+        """
+        snapshot = self.get_snapshot(sheet_name)
+        return snapshot.view if snapshot is not None else None
+    
+    def count_contacts(self, sa_list: Optional[List[str]] = None, unique: bool = True,
+                       sheet_name: Optional[str] = None) -> int:
+        """
+        Conta os contatos com telefone que seriam percorridos por iter_contacts.
+        
+        Args:
+            sa_list: Lista de SAs para filtrar (opcional)
+            unique: Se True, conta apenas a primeira linha de cada SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Quantidade de contatos
+        """
+        return self._snapshot(sheet_name)[1].count_contacts(sa_list, unique)
+    
+    def get_all_sa_numbers(self, sheet_name: Optional[str] = None) -> List[str]:
+        """
+        Retorna todas as SAs de uma aba.
+        
+        Args:
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Lista de SAs
+        """
+        return self._snapshot(sheet_name)[1].get_all_sa_numbers()
+    
+    def get_phone_number_by_sa(self, sa: str, sheet_name: Optional[str] = None) -> Optional[str]:
+        """
+        Obtém o número de telefone associado a uma SA.
+        
+        Args:
+            sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Número de telefone (apenas dígitos) ou None se não encontrado
+        """
+        return self._snapshot(sheet_name)[1].get_phone_number(sa)
+    
+    def get_client_info_by_sa(self, sa: str, sheet_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Obtém todas as informações de um cliente por SA, com a planilha de origem.
+        
+        Args:
+            sa: Número da SA
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Dicionário com informações do cliente
+        """
+        label, snapshot = self._snapshot(sheet_name)
+        return self._tag(label, snapshot.get_client_info(sa))
+    
+    def get_client_info_by_sa_many(self, sa_list: List[str],
+                                   sheet_name: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Obtém as informações de vários clientes por SA numa única consulta.
+        
+        Args:
+            sa_list: Lista de SAs
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            Lista alinhada com sa_list: dicionário do cliente ou None para as
+            SAs não encontradas
+        """
+        label, snapshot = self._snapshot(sheet_name)
+        return [self._tag(label, info) for info in snapshot.get_client_info_many(sa_list)]
+    
+    def search(self, query: str, limit: Optional[int] = 50,
+               sheet_name: Optional[str] = None) -> List[str]:
+        """
+        Busca clientes por texto, ignorando maiúsculas e acentos.
+        
+        Args:
+            query: Texto buscado
+            limit: Máximo de SAs retornadas (None para todas)
+            sheet_name: Aba consultada (opcional, usa a aba atual por padrão)
+        
+        Returns:
+            SAs encontradas, da mais para a menos relevante
+        """
+        return self._snapshot(sheet_name)[1].search(query, limit)
+    
+    def diff_sheets(self, old_sheet: str, new_sheet: Optional[str] = None,
+                    columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Compara duas abas pela coluna SA, inclusive abas de planilhas diferentes.
+        
+        Args:
+            old_sheet: Nome qualificado da aba anterior
+            new_sheet: Nome qualificado da aba nova (opcional, usa a aba atual por padrão)
+            columns: Colunas comparadas nas SAs presentes nas duas abas (opcional)
+            
+        Returns:
+            Dicionário no formato de ExcelHandler.diff_sheets, ou None se alguma
+            das abas não existir
+        """
+        old_snapshot = self.get_snapshot(old_sheet)
+        _, handler, sheet = self._route(new_sheet)
+        new_snapshot = handler.get_snapshot(sheet) if handler is not None else None
+        if old_snapshot is None or new_snapshot is None or new_snapshot.name is None:
+            return None
+        return handler._diff_frames(old_snapshot.data, new_snapshot.data, columns)
+    
+    def get_delta_sa_numbers(self, old_sheet: str, new_sheet: Optional[str] = None,
+                             include_changed: bool = True,
+                             columns: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Retorna as SAs de uma aba que não estavam (ou mudaram) em outra aba.
+        
+        Args:
+            old_sheet: Nome qualificado da aba anterior
+            new_sheet: Nome qualificado da aba nova (opcional, usa a aba atual por padrão)
+            include_changed: Se True, inclui também as SAs alteradas
+            columns: Colunas consideradas para decidir se uma SA mudou
+            
+        Returns:
+            SAs na ordem da aba nova, ou None se alguma das abas não existir
+        """
+        diff = self.diff_sheets(old_sheet, new_sheet, columns)
+        if diff is None:
+            return None
+        
+        delta = set(diff["added"])
+        if include_changed:
+            delta.update(diff["changed"])
+        return [sa for sa in self._snapshot(new_sheet)[1].sa_index if sa in delta]
+    
+    def _refresh_indexes(self) -> None:
+        """
+        Remonta os índices únicos de SA e telefone quando alguma planilha mudou.
+        
+        Cada manipulador incrementa sua geração ao ler ou reler abas; os
+        índices só são remontados quando a tupla de gerações muda. Em caso de
+        repetição entre planilhas prevalece a primeira planilha informada.
+        Os índices vêm dos índices por aba de cada manipulador, que continuam
+        em memória depois que a aba é descarregada; nenhuma aba é relida.
+        """
+        generations = tuple(handler.generation for handler in self.handlers.values())
+        if generations == self._index_generations:
+            return
+        
+        with self._lock:
+            sa_index = {}
+            phone_index = {}
+            suffix_index = {}
+            for label, handler in self.handlers.items():
+                # No modo sob demanda, ler as abas ainda não indexadas
+                if handler.lazy:
+                    handler._index_all_sheets()
+                
+                with handler._lock:
+                    sheet_names = list(handler.sheet_names)
+                    sheet_sa_index = dict(handler.sheet_sa_index)
+                    handler_phones = handler.phone_index
+                    handler_suffixes = handler.phone_suffix_index
+                
+                for sheet in sheet_names:
+                    qualified = self.qualify(label, sheet)
+                    for sa in sheet_sa_index.get(sheet, ()):
+                        sa_index.setdefault(sa, qualified)
+                
+                for digits, (sheet, sa) in handler_phones.items():
+                    phone_index.setdefault(digits, (self.qualify(label, sheet), sa))
+                for suffix, (sheet, sa) in handler_suffixes.items():
+                    suffix_index.setdefault(suffix, (self.qualify(label, sheet), sa))
+            
+            self.sa_sheet_index = sa_index
+            self.phone_index = phone_index
+            self.phone_suffix_index = suffix_index
+            # Gerações lidas depois da montagem, já que ler abas sob demanda as altera
+            self._index_generations = tuple(handler.generation for handler in self.handlers.values())
+    
+    def find_client_by_phone(self, phone: str) -> Optional[Tuple[str, str]]:
+        """
+        Busca a aba e a SA de um cliente pelo telefone em todas as planilhas.
+        
+        A prioridade é a mesma de ExcelHandler.find_client_by_phone, aplicada
+        sobre o índice único: um número completo igual em qualquer planilha
+        vence uma coincidência apenas de sufixo.
+        
+        Args:
+            phone: Número de telefone em qualquer formato
+        
+        Returns:
+            Tupla (aba qualificada, SA) ou None se não encontrado
+        """
+        digits = ExcelHandler._normalize_phone(phone)
+        if not digits:
+            return None
+        
+        self._refresh_indexes()
+        return ExcelHandler.match_phone(digits, self.phone_index, self.phone_suffix_index)
+    
+    def find_client_by_sa(self, sa: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Busca um cliente por SA em todas as planilhas, sem alterar a aba atual.
+        
+        Args:
+            sa: Número da SA
+        
+        Returns:
+            Tupla (aba qualificada, informações do cliente com a planilha de
+            origem) ou None se não encontrado
+        """
+        key = normalize_sa(sa)
+        if key is None:
+            return None
+        
+        self._refresh_indexes()
+        sheet_name = self.sa_sheet_index.get(key)
+        if sheet_name is None:
+            return None
+        
+        info = self.get_client_info_by_sa(key, sheet_name=sheet_name)
+        return (sheet_name, info) if info else None
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import zipfile
+import threading
+import posixpath
+import xml.etree.ElementTree as ET
+from typing import Dict, Tuple, Optional, Callable
+
+# Namespaces usados em xl/workbook.xml e xl/_rels/workbook.xml.rels
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+def read_sheet_signatures(excel_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Lê a assinatura (CRC32 e tamanho) do XML de cada aba de um arquivo .xlsx.
+    
+    Apenas o diretório central do zip e o workbook.xml são lidos, então o custo
+    não depende do tamanho das abas.
+    
+    Args:
+        excel_path: Caminho para o arquivo Excel
+    
+    Returns:
+        Dicionário nome da aba -> (crc, tamanho) ou vazio se o arquivo não for .xlsx
+    """
+    try:
+        with zipfile.ZipFile(excel_path) as archive:
+            workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+            rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+            
+            targets = {}
+            for rel in rels.iter(f"{{{_PKG_REL_NS}}}Relationship"):
+                target = rel.get("Target", "")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join("xl", target))
+                targets[rel.get("Id")] = target
+            
+            signatures = {}
+            for sheet in workbook.iter(f"{{{_MAIN_NS}}}sheet"):
+                target = targets.get(sheet.get(f"{{{_REL_NS}}}id"))
+                if not target:
+                    continue
+                info = archive.getinfo(target)
+                signatures[sheet.get("name")] = (info.CRC, info.file_size)
+            return signatures
+    except Exception:
+        return {}
+
+class WorkbookWatcher:
+    def __init__(self, excel_path: str, on_change: Callable[[], None], interval: float = 5.0,
+                 stat_func: Optional[Callable[[], Optional[Tuple[int, int]]]] = None):
+        """
+        Inicializa o observador de alterações de um arquivo Excel.
+        
+        O arquivo é verificado periodicamente (mtime e tamanho). Uma alteração só
+        é repassada quando o arquivo fica estável por duas verificações seguidas,
+        para não ler um arquivo que ainda está sendo salvo.
+        
+        Args:
+            excel_path: Caminho para o arquivo Excel
+            on_change: Função chamada quando o arquivo muda
+            interval: Intervalo entre verificações em segundos
+            stat_func: Função que obtém o estado atual da fonte (opcional, usa
+                mtime e tamanho de excel_path por padrão)
+        """
+        self.excel_path = excel_path
+        self.on_change = on_change
+        self.interval = interval
+        self.stat_func = stat_func
+        self._last_stat = self._file_stat()
+        self._pending_stat = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        """
+        Obtém mtime e tamanho atuais do arquivo.
+        
+        Returns:
+            Tupla (mtime_ns, tamanho) ou None se o arquivo não existir
+        """
+        if self.stat_func is not None:
+            return self.stat_func()
+        try:
+            stat = os.stat(self.excel_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+    
+    def start(self) -> None:
+        """Inicia a verificação em segundo plano"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Para a verificação em segundo plano"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+    
+    def _watch_loop(self) -> None:
+        """Loop de verificação do arquivo"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Erro ao verificar alterações da planilha: {str(e)}")
+    
+    def check(self) -> bool:
+        """
+        Verifica uma vez se o arquivo mudou e chama on_change se necessário.
+        
+        Returns:
+            True se on_change foi chamado
+        """
+        stat = self._file_stat()
+        if stat is None or stat == self._last_stat:
+            self._pending_stat = None
+            return False
+        
+        # Esperar o arquivo ficar estável antes de relê-lo
+        if stat != self._pending_stat:
+            self._pending_stat = stat
+            return False
+        
+        self._last_stat = stat
+        self._pending_stat = None
+        self.on_change()
+        return True
\ No newline at end of file
@@ -36,8 +36,10 @@ system_status = {
     "errors": []
 }
 
-# Inicializar gerenciador de WhatsApp
-manager = WhatsAppManager(EXCEL_PATH, WHATSAPP_API_URL)
+# Inicializar gerenciador de WhatsApp (o webhook responde sem esperar a
+# gravação das mensagens, e a fila é gravada ao encerrar o servidor; as abas
+# alteradas da planilha são relidas enquanto o servidor está no ar)
+manager = WhatsAppManager(EXCEL_PATH, WHATSAPP_API_URL, write_behind=True, watch_workbook=True)
 
 def log_event(event_type, message):
     """Registra um evento de log"""
@@ -184,20 +186,34 @@ def webhook_handler():
 
 @app.route('/clients')
 def clients():
-    """Lista de clientes"""
+    """Lista de clientes (com ?q= filtra por texto e ?limit= limita os resultados)"""
     try:
-        # Obter lista de SAs
-        sa_list = manager.excel_handler.get_all_sa_numbers()
+        # Consultar sempre a mesma aba, mesmo que a aba atual mude no meio
+        sheet_name = manager.excel_handler.current_sheet
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', type=int)
+        
+        # Obter lista de SAs, já ordenada por relevância quando há busca
+        if query:
+            sa_list = manager.excel_handler.search(query, limit=limit, sheet_name=sheet_name)
+        else:
+            sa_list = manager.excel_handler.get_all_sa_numbers(sheet_name=sheet_name)
+            if limit is not None:
+                sa_list = sa_list[:limit]
+        
+        # Obter informações de todos os clientes numa única consulta
+        clients_info = manager.excel_handler.get_client_info_by_sa_many(sa_list, sheet_name=sheet_name)
+        
+        # Contadores de mensagens vêm dos resumos, sem ler os históricos
+        summaries = manager.storage.get_all_summaries()
         
-        # Obter informações de cada cliente
         clients_data = []
-        for sa in sa_list:
-            client_info = manager.excel_handler.get_client_info_by_sa(sa)
+        for sa, client_info in zip(sa_list, clients_info):
             if client_info:
                 # Adicionar informações sobre mensagens
-                messages = manager.storage.get_client_messages(sa)
-                client_info['mensagens_enviadas'] = sum(1 for m in messages if m.get('type', '') == 'sent')
-                client_info['mensagens_recebidas'] = sum(1 for m in messages if m.get('type', '') == 'received')
+                summary = summaries.get(sa, {})
+                client_info['mensagens_enviadas'] = summary.get('sent', 0)
+                client_info['mensagens_recebidas'] = summary.get('received', 0)
                 clients_data.append(client_info)
         
         return jsonify({
@@ -283,6 +299,7 @@ def send_bulk():
         data = request.json
         sa_list = data.get('sa_list', [])
         message_template = data.get('message_template', '')
+        since_sheet = data.get('since_sheet')
         
         if not message_template:
             return jsonify({
@@ -291,7 +308,8 @@ def send_bulk():
             })
         
         # Enviar mensagens em massa
-        result = manager.send_bulk_messages(sa_list, message_template)
+        result = manager.send_bulk_messages(sa_list, message_template, since_sheet=since_sheet,
+                                            include_changed=data.get('include_changed', True))
         
         if result.get("success", False):
             total_sent = result.get("sent", 0)
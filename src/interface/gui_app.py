@@ -18,6 +18,9 @@ from storage.message_storage import MessageStorage
 from whatsapp_manager import WhatsAppManager
 
 class WhatsAppGUI:
+    # Mensagens carregadas por vez no histórico de um cliente
+    HISTORY_PAGE_SIZE = 200
+    
     def __init__(self, root):
         """
         Inicializa a interface gráfica.
@@ -57,6 +60,10 @@ class WhatsAppGUI:
         # Iniciar monitoramento de tarefas
         self.task_monitor_thread = None
         
+        # Histórico exibido: SA e cursor da próxima página (None se não houver mais)
+        self.history_sa = None
+        self.history_cursor = None
+        
         # Gerenciadores
         self.excel_handler = None
         self.whatsapp_manager = None
@@ -353,6 +360,9 @@ class WhatsAppGUI:
         button_frame.pack(fill=tk.X, pady=5, padx=5)
         
         ttk.Button(button_frame, text="Exportar Histórico", command=self._export_history).pack(side=tk.RIGHT, padx=5)
+        self.history_more_button = ttk.Button(button_frame, text="Carregar Mais Mensagens",
+                                              command=self._load_more_history, state=tk.DISABLED)
+        self.history_more_button.pack(side=tk.LEFT, padx=5)
     
     def _setup_automation_tab(self):
         """Configura a aba de automação"""
@@ -435,7 +445,7 @@ class WhatsAppGUI:
         """Abre diálogo para selecionar arquivo Excel"""
         file_path = filedialog.askopenfilename(
             title="Selecione o arquivo Excel",
-            filetypes=[("Excel Files", "*.xlsx *.xls"), ("All Files", "*.*")]
+            filetypes=[("Excel Files", "*.xlsx *.xls"), ("CSV/Parquet Files", "*.csv *.parquet"), ("All Files", "*.*")]
         )
         
         if file_path:
@@ -555,10 +565,12 @@ class WhatsAppGUI:
                 self.info_text.configure(state='disabled')
                 print(f"Erro ao detectar porta do WhatsApp: {str(e)}")
             
-            # Inicializar gerenciador de WhatsApp
+            # Inicializar gerenciador de WhatsApp; a planilha pode ser editada
+            # com a interface aberta, então as abas alteradas são relidas
             self.whatsapp_manager = WhatsAppManager(
                 self.excel_path.get(),
-                self.whatsapp_api_url.get()
+                self.whatsapp_api_url.get(),
+                watch_workbook=True
             )
             
             # Configurar resposta automática
@@ -616,32 +628,22 @@ class WhatsAppGUI:
             for item in self.clients_tree.get_children():
                 self.clients_tree.delete(item)
                 
-            # Obter dados dos clientes
-            sa_list = self.excel_handler.get_all_sa_numbers()
+            # Contadores de mensagens vêm dos resumos, sem ler os históricos
+            summaries = self.whatsapp_manager.storage.get_all_summaries() if self.whatsapp_manager else {}
             
-            # Preencher tabela
-            for sa in sa_list:
-                client_info = self.excel_handler.get_client_info_by_sa(sa)
-                
-                if not client_info:
+            # Preencher tabela a partir dos registros compactos da aba atual
+            for contact in self.excel_handler.iter_contact_records():
+                sa = contact.sa
+                if not sa:
                     continue
                     
                 # Obter informações de mensagens
-                messages = []
-                if self.whatsapp_manager:
-                    storage = self.whatsapp_manager.storage
-                    messages = storage.get_client_messages(sa)
-                
-                sent_count = sum(1 for m in messages if m['type'] == 'sent')
-                received_count = sum(1 for m in messages if m['type'] == 'received')
-                
-                # Valores padrão para colunas que podem não existir
-                nome = client_info.get('Nome', '')
-                telefone = client_info.get('Telefone', '')
-                endereco = client_info.get('Endereço', '')
+                summary = summaries.get(sa, {})
+                sent_count = summary.get('sent', 0)
+                received_count = summary.get('received', 0)
                 
                 self.clients_tree.insert('', tk.END, values=(
-                    sa, nome, telefone, endereco, sent_count, received_count
+                    sa, contact.nome, contact.telefone, contact.endereco, sent_count, received_count
                 ))
                 
             # Também atualizar a lista de histórico se estiver disponível
@@ -654,7 +656,7 @@ class WhatsAppGUI:
     
     def _search_clients(self):
         """Pesquisa clientes na tabela"""
-        query = self.search_query.get().lower()
+        query = self.search_query.get().strip()
         
         if not query:
             self._refresh_clients()
@@ -665,42 +667,26 @@ class WhatsAppGUI:
             for item in self.clients_tree.get_children():
                 self.clients_tree.delete(item)
                 
-            # Obter dados dos clientes
-            sa_list = self.excel_handler.get_all_sa_numbers()
+            # Buscar no índice textual da aba atual
+            sheet_name = self.excel_handler.current_sheet
+            sa_list = self.excel_handler.search(query, limit=None, sheet_name=sheet_name)
+            
+            # Contadores de mensagens vêm dos resumos, sem ler os históricos
+            summaries = self.whatsapp_manager.storage.get_all_summaries() if self.whatsapp_manager else {}
             
-            # Filtrar e preencher tabela
+            # Preencher tabela, dos resultados mais para os menos relevantes
             for sa in sa_list:
-                client_info = self.excel_handler.get_client_info_by_sa(sa)
-                
-                if not client_info:
-                    continue
-                    
-                # Verificar se algum campo contém a consulta
-                found = False
-                for key, value in client_info.items():
-                    if query in str(value).lower():
-                        found = True
-                        break
-                        
-                if not found:
+                contact = self.excel_handler.get_client_record(sa, sheet_name=sheet_name)
+                if contact is None:
                     continue
                     
                 # Obter informações de mensagens
-                messages = []
-                if self.whatsapp_manager:
-                    storage = self.whatsapp_manager.storage
-                    messages = storage.get_client_messages(sa)
-                
-                sent_count = sum(1 for m in messages if m['type'] == 'sent')
-                received_count = sum(1 for m in messages if m['type'] == 'received')
-                
-                # Valores padrão para colunas que podem não existir
-                nome = client_info.get('Nome', '')
-                telefone = client_info.get('Telefone', '')
-                endereco = client_info.get('Endereço', '')
+                summary = summaries.get(sa, {})
+                sent_count = summary.get('sent', 0)
+                received_count = summary.get('received', 0)
                 
                 self.clients_tree.insert('', tk.END, values=(
-                    sa, nome, telefone, endereco, sent_count, received_count
+                    sa, contact.nome, contact.telefone, contact.endereco, sent_count, received_count
                 ))
                 
         except Exception as e:
@@ -1124,12 +1110,18 @@ class WhatsAppGUI:
     def _show_message_history(self, sa):
         """Mostra o histórico de mensagens para uma SA específica"""
         try:
-            # Obter histórico de mensagens
-            messages = self.whatsapp_manager.storage.get_client_messages(sa)
-            client_info = self.whatsapp_manager.storage.get_client_info(sa)
+            storage = self.whatsapp_manager.storage
+            client_info = storage.get_client_info(sa)
+            
+            # Total pelo resumo do cliente, sem ler todas as mensagens
+            summary = storage.get_client_summary(sa)
+            total = summary.get('sent', 0) + summary.get('received', 0)
             
             # Limpar área de texto
             self.history_text.delete(1.0, tk.END)
+            self.history_sa = sa
+            self.history_cursor = None
+            self.history_more_button.config(state=tk.DISABLED)
             
             # Mostrar informações do cliente
             if client_info:
@@ -1152,37 +1144,10 @@ class WhatsAppGUI:
                 self.history_client_info.config(text=f"SA: {sa}")
                 self.history_text.insert(tk.END, f"Cliente SA: {sa}\n\n")
                 
-            # Mostrar mensagens
-            if messages:
-                self.history_text.insert(tk.END, f"Total de mensagens: {len(messages)}\n\n")
-                
-                # Ordenar mensagens por timestamp
-                for msg in sorted(messages, key=lambda m: m.get('timestamp', '')):
-                    timestamp = msg.get('timestamp', '')
-                    if timestamp:
-                        try:
-                            # Tentar formatar o timestamp
-                            dt = datetime.fromisoformat(timestamp)
-                            timestamp = dt.strftime('%d/%m/%Y %H:%M:%S')
-                        except:
-                            pass
-                            
-                    msg_type = 'Enviada' if msg.get('type') == 'sent' else 'Recebida'
-                    
-                    # Adicionar tags para colorir o texto
-                    tag = "sent" if msg.get('type') == 'sent' else "received"
-                    
-                    position = self.history_text.index(tk.END)
-                    self.history_text.insert(tk.END, f"[{timestamp}] {msg_type}:\n")
-                    self.history_text.insert(tk.END, f"{msg.get('message', '')}\n\n")
-                    
-                    # Configurar cores diferentes para mensagens enviadas e recebidas
-                    if tag == "sent":
-                        self.history_text.tag_add("sent", position, f"{position} lineend +1 lines")
-                        self.history_text.tag_config("sent", foreground="blue")
-                    else:
-                        self.history_text.tag_add("received", position, f"{position} lineend +1 lines")
-                        self.history_text.tag_config("received", foreground="green")
+            # Mostrar a primeira página de mensagens; as demais são carregadas pelo botão
+            if total:
+                self.history_text.insert(tk.END, f"Total de mensagens: {total}\n\n")
+                self._load_more_history()
             else:
                 self.history_text.insert(tk.END, "Nenhuma mensagem encontrada para este cliente.")
                 
@@ -1190,6 +1155,48 @@ class WhatsAppGUI:
             traceback.print_exc()
             messagebox.showerror("Erro", f"Erro ao carregar histórico de mensagens:\n{str(e)}")
     
+    def _load_more_history(self):
+        """Acrescenta ao histórico exibido a próxima página de mensagens, em ordem de horário"""
+        if self.history_sa is None:
+            return
+        
+        try:
+            messages, self.history_cursor = self.whatsapp_manager.storage.query(
+                sa=self.history_sa, limit=self.HISTORY_PAGE_SIZE, cursor=self.history_cursor)
+            
+            for msg in messages:
+                timestamp = msg.get('timestamp', '')
+                if timestamp:
+                    try:
+                        # Tentar formatar o timestamp
+                        dt = datetime.fromisoformat(timestamp)
+                        timestamp = dt.strftime('%d/%m/%Y %H:%M:%S')
+                    except:
+                        pass
+                        
+                msg_type = 'Enviada' if msg.get('type') == 'sent' else 'Recebida'
+                
+                # Adicionar tags para colorir o texto
+                tag = "sent" if msg.get('type') == 'sent' else "received"
+                
+                position = self.history_text.index(tk.END)
+                self.history_text.insert(tk.END, f"[{timestamp}] {msg_type}:\n")
+                self.history_text.insert(tk.END, f"{msg.get('message', '')}\n\n")
+                
+                # Configurar cores diferentes para mensagens enviadas e recebidas
+                if tag == "sent":
+                    self.history_text.tag_add("sent", position, f"{position} lineend +1 lines")
+                    self.history_text.tag_config("sent", foreground="blue")
+                else:
+                    self.history_text.tag_add("received", position, f"{position} lineend +1 lines")
+                    self.history_text.tag_config("received", foreground="green")
+            
+            self.history_more_button.config(state=tk.NORMAL if self.history_cursor else tk.DISABLED)
+            
+        except Exception as e:
+            traceback.print_exc()
+            messagebox.showerror("Erro", f"Erro ao carregar histórico de mensagens:\n{str(e)}")
+    
     def _export_history(self):
         """Exporta o histórico de mensagens atual para arquivo"""
         if not self.history_text.get(1.0, tk.END).strip():
@@ -1,110 +1,1174 @@
 import os
 import json
+import bisect
 import datetime
-from typing import Dict, List, Any, Optional
+import threading
+import atexit
+import tempfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Union, Iterator, Tuple
+
+from storage.sqlite_storage import SqliteMessageStorage
+from storage.timestamps import normalize_timestamp
+
+# Extensões que indicam um banco SQLite em vez de um diretório de arquivos JSON
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
 
 class MessageStorage:
-    def __init__(self, storage_dir: str = "storage"):
+    # Extensões dos arquivos de cada cliente: cabeçalho com as informações do
+    # cliente (gravado uma vez) e registro de mensagens, uma por linha
+    HEADER_SUFFIX = ".info.json"
+    LOG_SUFFIX = ".jsonl"
+    
+    # Resumo de cada cliente (contadores e última mensagem), atualizado a cada gravação
+    SUMMARY_SUFFIX = ".summary.json"
+    
+    # Índice dos clientes com mensagens (SA -> quantidade, tamanho e última
+    # gravação); cada gravação acrescenta uma linha e a compactação deixa uma por SA
+    MANIFEST_FILE = "manifest.jsonl"
+    
+    # Índice de horários de todas as mensagens (horário, SA, posição no
+    # registro do cliente e tipo), usado por query() para consultas por período.
+    # Fica em disco, num arquivo por dia (segmento), e só os segmentos
+    # consultados são lidos; o marcador indica que o índice já foi montado
+    TIME_INDEX_DIR = "time_index"
+    TIME_INDEX_READY_FILE = "complete"
+    TIME_INDEX_SEGMENT_LENGTH = 10  # Caracteres do horário que formam a chave (AAAA-MM-DD)
+    TIME_INDEX_CACHED_SEGMENTS = 8  # Segmentos mantidos em memória já ordenados
+    
+    # Quantidade de locks por SA: clientes em locks diferentes gravam em paralelo
+    LOCK_STRIPES = 64
+    
+    # Threads usadas para percorrer os diretórios de clientes em paralelo
+    SCAN_WORKERS = 8
+    
+    def __init__(self, storage_dir: str = "storage", cache_size: int = 256,
+                 write_behind: bool = False, flush_interval: float = 1.0, fsync: bool = False):
+        """
+        Inicializa o sistema de armazenamento de mensagens.
+        
+        Cada cliente tem um cabeçalho client_{sa}.info.json e um registro
+        client_{sa}.jsonl ao qual as mensagens são apenas acrescentadas, sem
+        reler nem regravar o histórico. Os arquivos ficam em dois níveis de
+        subdiretórios escolhidos pelo hash da SA (storage/ab/cd/client_{sa}.jsonl),
+        para que nenhum diretório acumule todos os clientes. Arquivos
+        client_{sa}.json do formato antigo são convertidos, e arquivos ainda
+        na raiz do diretório são movidos para o subdiretório, no primeiro
+        acesso ao cliente ou por migrate_to_shards().
+        
+        Args:
+            storage_dir: Diretório para armazenar as mensagens
+            cache_size: Quantidade de clientes mantidos em memória já lidos
+                (0 desativa o cache)
+            write_behind: Se True, as mensagens são gravadas por uma thread em
+                segundo plano, agrupadas por cliente, em vez de na thread de
+                quem chama; flush() e close() gravam as pendentes
+            flush_interval: Tempo máximo (segundos) que uma mensagem espera na
+                fila antes de ser gravada, no modo write_behind
+            fsync: Se True, cada gravação só termina depois de chegar ao disco
+        """
+        self.storage_dir = storage_dir
+        self.cache_size = cache_size
+        # Documentos já lidos, do menos para o mais recentemente usado:
+        # SA -> {'messages' | 'info': (assinatura do arquivo, conteúdo)}
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._needs_compaction = set()  # SAs com linhas inválidas no registro
+        # Resumos já lidos ou atualizados: SA -> (assinatura do arquivo, resumo)
+        self._summaries = {}
+        self._summary_lock = threading.Lock()
+        self._manifest = None  # Índice de clientes em memória (lido no primeiro uso)
+        self._manifest_signature = None  # Assinatura do arquivo do índice lido ou gravado
+        self._manifest_lines = 0  # Linhas do arquivo do índice, para decidir a compactação
+        self._manifest_lock = threading.Lock()
+        # Segmentos do índice de horários já lidos, do menos para o mais
+        # recentemente usado: chave -> (assinatura do arquivo, entradas em ordem)
+        self._segments = OrderedDict()
+        self._time_index_lock = threading.Lock()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        # Mensagens aguardando gravação: SA -> {'client_info', 'messages'}
+        self._pending = OrderedDict()
+        self._pending_cond = threading.Condition()
+        # Locks por faixa de SA: serializam as gravações de um mesmo cliente
+        # (webhook, laço de mensagens e envio em massa) sem bloquear os demais
+        self._sa_locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+        self._closing = False
+        self._writer = None
+        self._ready_dirs = set()  # Subdiretórios que já se sabe existirem
+        self._ensure_storage_dir()
+        # Arquivos de clientes na raiz (layout antigo, sem subdiretórios)
+        self._has_flat_files = self._detect_flat_files()
+        
+        if write_behind:
+            self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer.start()
+            # Não perder mensagens pendentes se o programa terminar sem close()
+            atexit.register(self.close)
+    
+    def _ensure_storage_dir(self) -> None:
+        """Garante que o diretório de armazenamento exista"""
+        os.makedirs(self.storage_dir, exist_ok=True)
+    
+    def _ensure_parent_dir(self, file_path: str) -> None:
+        """
+        Garante que o diretório de um arquivo exista.
+        
+        Args:
+            file_path: Caminho do arquivo
+        """
+        directory = os.path.dirname(file_path)
+        if directory and directory not in self._ready_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._ready_dirs.add(directory)
+    
+    def _detect_flat_files(self) -> bool:
+        """
+        Verifica se ainda há arquivos de clientes na raiz do diretório.
+        
+        Returns:
+            True se algum arquivo client_* estiver fora dos subdiretórios
+        """
+        try:
+            with os.scandir(self.storage_dir) as entries:
+                for entry in entries:
+                    # Parar no primeiro: a raiz pode ter centenas de milhares de arquivos
+                    if entry.name.startswith("client_") and entry.is_file():
+                        return True
+        except OSError as e:
+            print(f"Erro ao verificar diretório de armazenamento: {str(e)}")
+        return False
+    
+    def _get_shard_dir(self, sa: str) -> str:
+        """
+        Obtém o subdiretório dos arquivos de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Caminho do subdiretório (storage/ab/cd)
+        """
+        shard = f"{zlib.crc32(str(sa).encode('utf-8')):08x}"
+        return os.path.join(self.storage_dir, shard[:2], shard[2:4])
+    
+    def _get_client_path(self, sa: str, suffix: str) -> str:
+        """
+        Obtém o caminho de um arquivo de cliente no seu subdiretório.
+        
+        Enquanto houver arquivos na raiz, um arquivo que ainda não foi movido
+        continua sendo usado no lugar antigo.
+        
+        Args:
+            sa: Número da SA do cliente
+            suffix: Extensão do arquivo (HEADER_SUFFIX, LOG_SUFFIX ou SUMMARY_SUFFIX)
+            
+        Returns:
+            Caminho do arquivo
+        """
+        file_path = os.path.join(self._get_shard_dir(sa), f"client_{sa}{suffix}")
+        if self._has_flat_files and not os.path.exists(file_path):
+            flat_path = os.path.join(self.storage_dir, f"client_{sa}{suffix}")
+            if os.path.exists(flat_path):
+                return flat_path
+        return file_path
+    
+    def _get_client_file_path(self, sa: str) -> str:
+        """
+        Obtém o caminho do arquivo de um cliente no formato antigo (documento JSON único).
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Caminho do arquivo
+        """
+        return os.path.join(self.storage_dir, f"client_{sa}.json")
+    
+    def _get_header_path(self, sa: str) -> str:
+        """
+        Obtém o caminho do cabeçalho (informações do cliente) de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Caminho do arquivo
+        """
+        return self._get_client_path(sa, self.HEADER_SUFFIX)
+    
+    def _get_log_path(self, sa: str) -> str:
+        """
+        Obtém o caminho do registro de mensagens de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Caminho do arquivo
+        """
+        return self._get_client_path(sa, self.LOG_SUFFIX)
+    
+    def _lock_for(self, sa: str) -> threading.RLock:
+        """
+        Obtém o lock da faixa de uma SA.
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Lock compartilhado pelas SAs da mesma faixa
+        """
+        return self._sa_locks[zlib.crc32(str(sa).encode('utf-8')) % self.LOCK_STRIPES]
+    
+    def _get_summary_path(self, sa: str) -> str:
+        """
+        Obtém o caminho do resumo de mensagens de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Caminho do arquivo
+        """
+        return self._get_client_path(sa, self.SUMMARY_SUFFIX)
+    
+    def save_sent_message(self, sa: str, phone: str, message: str,
+                         client_info: Dict[str, Any]) -> None:
+        """
+        Salva uma mensagem enviada.
+        
+        Args:
+            sa: Número da SA do cliente
+            phone: Número de telefone do cliente
+            message: Mensagem enviada
+            client_info: Informações adicionais do cliente
+        """
+        message_data = {
+            "type": "sent",
+            "timestamp": datetime.datetime.now().isoformat(),
+            "message": message,
+            "phone": phone
+        }
+        
+        if self.write_behind:
+            self._enqueue(sa, message_data, client_info)
+        else:
+            self._commit_client(sa, [message_data], client_info)
+    
+    def save_received_message(self, sa: str, phone: str, message: str,
+                            received_timestamp: Optional[str] = None) -> None:
+        """
+        Salva uma mensagem recebida.
+        
+        Args:
+            sa: Número da SA do cliente
+            phone: Número de telefone do cliente
+            message: Mensagem recebida
+            received_timestamp: Timestamp de recebimento (opcional, ISO ou
+                segundos desde a época, como enviado pelo bot)
+        """
+        message_data = {
+            "type": "received",
+            "timestamp": normalize_timestamp(received_timestamp) or datetime.datetime.now().isoformat(),
+            "message": message,
+            "phone": phone
+        }
+        
+        if self.write_behind:
+            self._enqueue(sa, message_data, None)
+        else:
+            self._commit_client(sa, [message_data], None)
+    
+    def _enqueue(self, sa: str, message_data: Dict[str, Any],
+                 client_info: Optional[Dict[str, Any]]) -> None:
+        """
+        Coloca uma mensagem na fila de gravação em segundo plano.
+        
+        Args:
+            sa: Número da SA do cliente
+            message_data: Mensagem a ser gravada
+            client_info: Informações do cliente (None para mensagens recebidas)
+        """
+        with self._pending_cond:
+            if not self._closing:
+                was_empty = not self._pending
+                entry = self._pending.setdefault(sa, {"client_info": None, "messages": []})
+                if entry["client_info"] is None:
+                    entry["client_info"] = client_info
+                entry["messages"].append(message_data)
+                if was_empty:
+                    self._pending_cond.notify()
+                return
+        
+        # Depois de close() não há mais gravação em segundo plano
+        self._commit_client(sa, [message_data], client_info)
+    
+    def _writer_loop(self) -> None:
+        """Thread que grava as mensagens da fila em lotes"""
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._closing:
+                    self._pending_cond.wait()
+                if self._closing:
+                    break
+                # Esperar o intervalo para juntar mais mensagens no mesmo lote
+                self._pending_cond.wait(self.flush_interval)
+            self.flush()
+    
+    def flush(self) -> None:
+        """Grava imediatamente todas as mensagens pendentes da fila"""
+        with self._pending_cond:
+            pending_sas = list(self._pending)
+        for sa in pending_sas:
+            self._flush_pending(sa)
+    
+    def _flush_pending(self, sa: str) -> None:
+        """
+        Grava as mensagens pendentes de um cliente antes de uma leitura.
+        
+        Args:
+            sa: Número da SA do cliente
+        """
+        if not self.write_behind:
+            return
+        # Retirar da fila e gravar com o lock do cliente mantém a ordem das
+        # mensagens; o lock é tomado mesmo sem mensagens na fila, porque a
+        # thread de gravação pode já ter retirado o lote e ainda estar gravando
+        with self._lock_for(sa):
+            with self._pending_cond:
+                entry = self._pending.pop(sa, None)
+            if entry is not None:
+                self._commit_client(sa, entry["messages"], entry["client_info"])
+    
+    def close(self) -> None:
+        """Para a thread de gravação e grava as mensagens pendentes"""
+        writer = self._writer
+        if writer is not None:
+            with self._pending_cond:
+                self._closing = True
+                self._pending_cond.notify_all()
+            writer.join()
+            self._writer = None
+        self.flush()
+    
+    def _commit_client(self, sa: str, messages: List[Dict[str, Any]],
+                       client_info: Optional[Dict[str, Any]]) -> None:
+        """
+        Grava mensagens de um cliente (e o cabeçalho, se ainda não existir).
+        
+        Args:
+            sa: Número da SA do cliente
+            messages: Mensagens a serem gravadas, em ordem
+            client_info: Informações do cliente (None para não criar o cabeçalho)
+        """
+        # Registro, resumo e índice de um cliente são atualizados por uma thread de cada vez
+        with self._lock_for(sa):
+            self._migrate_legacy_file(sa)
+            
+            # Adicionar informações do cliente se ainda não existirem
+            if client_info is not None and not os.path.exists(self._get_header_path(sa)):
+                self._write_header(sa, client_info)
+            
+            self._append_messages(sa, messages)
+    
+    def _append_messages(self, sa: str, messages: List[Dict[str, Any]]) -> None:
+        """
+        Acrescenta mensagens ao fim do registro do cliente numa única gravação.
+        
+        Args:
+            sa: Número da SA do cliente
+            messages: Mensagens a serem gravadas
+        """
+        lines = "".join(json.dumps(message_data, ensure_ascii=False) + "\n" for message_data in messages)
+        try:
+            log_path = self._get_log_path(sa)
+            self._ensure_parent_dir(log_path)
+            with open(log_path, 'a+b') as f:
+                size_before = f.tell()
+                # Uma gravação interrompida pode ter deixado a última linha
+                # incompleta; começar a nova mensagem numa linha própria
+                if size_before > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = "\n" + lines
+                        self._needs_compaction.add(sa)
+                f.write(lines.encode('utf-8'))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception as e:
+            print(f"Erro ao salvar dados do cliente {sa}: {str(e)}")
+            return
+        
+        self._cache_append(sa, messages, size_before)
+        summary = self._update_summary(sa, messages)
+        message_count = summary["sent"] + summary["received"]
+        self._record_manifest(sa, message_count)
+        self._record_time_index(sa, messages, message_count - len(messages))
+    
+    @staticmethod
+    def _empty_summary() -> Dict[str, Any]:
+        """
+        Cria o resumo de um cliente sem mensagens.
+        
+        Returns:
+            Resumo com contadores zerados
+        """
+        return {"sent": 0, "received": 0, "last_type": None, "last_timestamp": None, "last_phone": None}
+    
+    @staticmethod
+    def _apply_to_summary(summary: Dict[str, Any], message_data: Dict[str, Any]) -> None:
+        """
+        Acrescenta uma mensagem ao resumo de um cliente.
+        
+        A última mensagem é a de maior timestamp (comparado como texto, como na
+        ordenação do histórico); em caso de empate vale a gravada por último.
+        
+        Args:
+            summary: Resumo a ser atualizado
+            message_data: Mensagem gravada
+        """
+        message_type = message_data.get("type")
+        if message_type in ("sent", "received"):
+            summary[message_type] += 1
+        
+        timestamp = message_data.get("timestamp", "")
+        if summary["last_type"] is None or str(timestamp) >= str(summary["last_timestamp"]):
+            summary["last_type"] = message_type
+            summary["last_timestamp"] = timestamp
+            summary["last_phone"] = message_data.get("phone")
+    
+    def _build_summary(self, sa: str) -> Dict[str, Any]:
+        """
+        Calcula o resumo de um cliente percorrendo o registro de mensagens
+        (ou o arquivo do formato antigo, se ainda não foi convertido).
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Resumo do cliente
+        """
+        if os.path.exists(self._get_log_path(sa)):
+            messages = self._read_log(sa)
+        else:
+            messages = self._load_client_data(sa).get("messages", [])
+        
+        summary = self._empty_summary()
+        for message_data in messages:
+            self._apply_to_summary(summary, message_data)
+        return summary
+    
+    def _load_summary(self, sa: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtém o resumo de um cliente da memória ou do arquivo de resumo.
+        
+        O resumo em memória só é usado se o arquivo não mudou desde a última
+        leitura ou gravação (outro processo pode ter gravado no mesmo diretório).
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Resumo do cliente ou None se ainda não existir
+        """
+        summary_path = self._get_summary_path(sa)
+        signature = self._file_signature(summary_path)
+        cached = self._summaries.get(sa)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        self._summaries.pop(sa, None)
+        if signature is not None:
+            try:
+                with open(summary_path, 'r', encoding='utf-8') as f:
+                    summary = json.load(f)
+                self._summaries[sa] = (signature, summary)
+                return summary
+            except Exception as e:
+                print(f"Erro ao carregar resumo do cliente {sa}: {str(e)}")
+        return None
+    
+    def _save_summary(self, sa: str, summary: Dict[str, Any]) -> None:
+        """
+        Guarda o resumo de um cliente na memória e no arquivo de resumo.
+        
+        Args:
+            sa: Número da SA do cliente
+            summary: Resumo do cliente
+        """
+        summary_path = self._get_summary_path(sa)
+        try:
+            self._write_file(summary_path, json.dumps(summary, ensure_ascii=False))
+        except Exception as e:
+            print(f"Erro ao salvar resumo do cliente {sa}: {str(e)}")
+            self._summaries.pop(sa, None)
+            return
+        self._summaries[sa] = (self._file_signature(summary_path), summary)
+    
+    def _update_summary(self, sa: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Atualiza o resumo de um cliente depois de gravar mensagens.
+        
+        Args:
+            sa: Número da SA do cliente
+            messages: Mensagens gravadas
+            
+        Returns:
+            Resumo atualizado
+        """
+        with self._summary_lock:
+            summary = self._load_summary(sa)
+            if summary is None:
+                # Clientes gravados antes dos resumos: o registro já inclui as mensagens
+                summary = self._build_summary(sa)
+            else:
+                summary = dict(summary)
+                for message_data in messages:
+                    self._apply_to_summary(summary, message_data)
+            self._save_summary(sa, summary)
+            return summary
+    
+    def _get_manifest_path(self) -> str:
+        """
+        Obtém o caminho do índice de clientes com mensagens.
+        
+        Returns:
+            Caminho do arquivo
+        """
+        return os.path.join(self.storage_dir, self.MANIFEST_FILE)
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtém o índice de clientes, lendo o arquivo (ou remontando-o) no primeiro uso.
+        
+        Returns:
+            Dicionário SA -> entrada do índice (deve ser usado com _manifest_lock)
+        """
+        manifest_path = self._get_manifest_path()
+        signature = self._file_signature(manifest_path)
+        # Outro processo pode ter acrescentado clientes ao arquivo desde a leitura
+        if self._manifest is not None and signature == self._manifest_signature:
+            return self._manifest
+        
+        if signature is None:
+            # Armazenamento anterior ao índice: montar a partir dos arquivos
+            return self._rebuild_manifest()
+        
+        manifest = {}
+        lines = 0
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Linha cortada por uma gravação interrompida
+                    # A entrada mais recente de cada SA prevalece
+                    manifest[entry.pop("sa")] = entry
+        except Exception as e:
+            print(f"Erro ao carregar índice de clientes: {str(e)}")
+            return self._rebuild_manifest()
+        
+        self._manifest = manifest
+        self._manifest_lines = lines
+        self._manifest_signature = signature
+        return manifest
+    
+    def _record_manifest(self, sa: str, message_count: int) -> None:
+        """
+        Atualiza a entrada de um cliente no índice, acrescentando uma linha ao arquivo.
+        
+        Args:
+            sa: Número da SA do cliente
+            message_count: Quantidade de mensagens do cliente
+        """
+        log_path = self._get_log_path(sa)
+        entry = {
+            "messages": message_count,
+            "size": os.path.getsize(log_path) if os.path.exists(log_path) else 0,
+            "updated": datetime.datetime.now().isoformat()
+        }
+        with self._manifest_lock:
+            manifest = self._load_manifest()
+            manifest.pop(sa, None)  # Manter o índice na ordem da última gravação
+            manifest[sa] = entry
+            try:
+                with open(self._get_manifest_path(), 'a+b') as f:
+                    line = json.dumps({"sa": sa, **entry}, ensure_ascii=False) + "\n"
+                    if f.tell() > 0:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            line = "\n" + line
+                    f.write(line.encode('utf-8'))
+                self._manifest_lines += 1
+                self._manifest_signature = self._file_signature(self._get_manifest_path())
+            except Exception as e:
+                print(f"Erro ao salvar índice de clientes: {str(e)}")
+    
+    def _write_manifest(self) -> None:
+        """Regrava o arquivo do índice com uma linha por cliente (usar com _manifest_lock)"""
+        try:
+            self._write_file(self._get_manifest_path(),
+                             "".join(json.dumps({"sa": sa, **entry}, ensure_ascii=False) + "\n"
+                                     for sa, entry in self._manifest.items()))
+            self._manifest_lines = len(self._manifest)
+            self._manifest_signature = self._file_signature(self._get_manifest_path())
+        except Exception as e:
+            print(f"Erro ao salvar índice de clientes: {str(e)}")
+    
+    def _rebuild_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Monta o índice de clientes percorrendo os arquivos do diretório (usar com _manifest_lock).
+        
+        Returns:
+            Dicionário SA -> entrada do índice
+        """
+        manifest = {}
+        for sa in self._scan_clients_with_messages():
+            summary = self._client_summary(sa)
+            log_path = self._get_log_path(sa)
+            file_path = log_path if os.path.exists(log_path) else self._get_client_file_path(sa)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            manifest[sa] = {
+                "messages": summary["sent"] + summary["received"],
+                "size": stat.st_size,
+                "updated": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
+            }
+        
+        self._manifest = manifest
+        self._write_manifest()
+        return manifest
+    
+    def rebuild_manifest(self) -> int:
+        """
+        Remonta o índice de clientes a partir dos arquivos de mensagens.
+        
+        Usado para recuperação, por exemplo se o índice for apagado ou se
+        arquivos de clientes forem copiados de outro armazenamento.
+        
+        Returns:
+            Quantidade de clientes com mensagens
+        """
+        self.flush()
+        # Arquivos copiados para a raiz passam a ser encontrados pelos caminhos dos clientes
+        self._has_flat_files = self._detect_flat_files()
+        with self._manifest_lock:
+            return len(self._rebuild_manifest())
+    
+    def get_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtém o índice de clientes com mensagens.
+        
+        Returns:
+            Dicionário SA -> {'messages', 'size', 'updated'}
+        """
+        self.flush()
+        with self._manifest_lock:
+            return {sa: dict(entry) for sa, entry in self._load_manifest().items()}
+    
+    def _get_time_index_dir(self) -> str:
+        """
+        Obtém o diretório do índice de horários das mensagens.
+        
+        Returns:
+            Caminho do diretório
+        """
+        return os.path.join(self.storage_dir, self.TIME_INDEX_DIR)
+    
+    @classmethod
+    def _segment_key(cls, timestamp: str) -> str:
+        """
+        Obtém o segmento do índice de horários de um horário.
+        
+        O segmento é o início do texto do horário (o dia, em horários ISO);
+        como a ordem dos prefixos acompanha a dos horários, percorrer os
+        segmentos em ordem e cada segmento em ordem dá a ordem geral.
+        
+        Args:
+            timestamp: Horário da mensagem (texto)
+            
+        Returns:
+            Chave do segmento
+        """
+        return timestamp[:cls.TIME_INDEX_SEGMENT_LENGTH]
+    
+    def _get_segment_path(self, key: str) -> str:
+        """
+        Obtém o caminho do arquivo de um segmento do índice de horários.
+        
+        Args:
+            key: Chave do segmento
+            
+        Returns:
+            Caminho do arquivo (chaves com caracteres fora de dígitos e '-'
+            são gravadas em hexadecimal, com o prefixo '~')
+        """
+        if key and all(char.isdigit() or char == '-' for char in key) and key.isascii():
+            name = key
+        else:
+            name = "~" + key.encode('utf-8').hex()
+        return os.path.join(self._get_time_index_dir(), name + self.LOG_SUFFIX)
+    
+    def _list_segments(self) -> List[str]:
+        """
+        Lista as chaves dos segmentos do índice de horários, em ordem.
+        
+        Returns:
+            Chaves dos segmentos existentes
+        """
+        keys = []
+        try:
+            with os.scandir(self._get_time_index_dir()) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(self.LOG_SUFFIX):
+                        continue
+                    name = entry.name[:-len(self.LOG_SUFFIX)]
+                    try:
+                        keys.append(bytes.fromhex(name[1:]).decode('utf-8') if name.startswith("~") else name)
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        keys.sort()
+        return keys
+    
+    @staticmethod
+    def _time_index_entry(sa: str, position: int, message_data: Dict[str, Any]) -> Tuple[str, str, int, str]:
+        """
+        Monta a entrada do índice de horários de uma mensagem.
+        
+        Args:
+            sa: Número da SA do cliente
+            position: Posição da mensagem no registro do cliente
+            message_data: Mensagem
+            
+        Returns:
+            Tupla (horário, SA, posição, tipo), na ordem usada pelo índice
+        """
+        return (str(message_data.get("timestamp") or ""), str(sa), position,
+                str(message_data.get("type") or ""))
+    
+    def _load_segment(self, key: str) -> List[Tuple[str, str, int, str]]:
+        """
+        Obtém as entradas de um segmento do índice de horários, em ordem (usar com _time_index_lock).
+        
+        Os segmentos lidos por último ficam em memória enquanto o arquivo não
+        mudar por outro caminho que não _record_time_index.
+        
+        Args:
+            key: Chave do segmento
+            
+        Returns:
+            Lista ordenada de entradas
+        """
+        segment_path = self._get_segment_path(key)
+        signature = self._file_signature(segment_path)
+        cached = self._segments.get(key)
+        if cached is not None and signature is not None and cached[0] == signature:
+            self._segments.move_to_end(key)
+            return cached[1]
+        
+        entries = []
+        try:
+            with open(segment_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        timestamp, sa, position, message_type = json.loads(line)
+                    except ValueError:
+                        continue  # Linha cortada por uma gravação interrompida
+                    entries.append((timestamp, sa, position, message_type))
+        except OSError:
+            pass
+        
+        entries.sort()
+        # Uma mensagem gravada durante a montagem do índice pode aparecer duas vezes
+        entries = [entry for index, entry in enumerate(entries)
+                   if index == 0 or entry != entries[index - 1]]
+        
+        if signature is not None:
+            self._segments[key] = (signature, entries)
+            self._segments.move_to_end(key)
+            while len(self._segments) > self.TIME_INDEX_CACHED_SEGMENTS:
+                self._segments.popitem(last=False)
+        return entries
+    
+    def _record_time_index(self, sa: str, messages: List[Dict[str, Any]], first_position: int) -> None:
+        """
+        Acrescenta ao índice de horários as mensagens gravadas para um cliente.
+        
+        Cada mensagem vira uma linha no fim do arquivo do seu segmento; o
+        índice não é lido nem ordenado aqui. Num armazenamento cujo índice
+        ainda não foi montado as linhas também são gravadas, e a montagem
+        (na primeira consulta ou por rebuild_time_index) as substitui.
+        
+        Args:
+            sa: Número da SA do cliente
+            messages: Mensagens gravadas
+            first_position: Posição da primeira delas no registro do cliente
+        """
+        segments = OrderedDict()
+        for offset, message_data in enumerate(messages):
+            entry = self._time_index_entry(sa, first_position + offset, message_data)
+            segments.setdefault(self._segment_key(entry[0]), []).append(entry)
+        
+        with self._time_index_lock:
+            for key, entries in segments.items():
+                lines = "".join(json.dumps(list(entry), ensure_ascii=False) + "\n" for entry in entries)
+                try:
+                    segment_path = self._get_segment_path(key)
+                    self._ensure_parent_dir(segment_path)
+                    with open(segment_path, 'a+b') as f:
+                        size_before = f.tell()
+                        if size_before > 0:
+                            f.seek(-1, os.SEEK_END)
+                            if f.read(1) != b"\n":
+                                lines = "\n" + lines
+                        f.write(lines.encode('utf-8'))
+                except Exception as e:
+                    print(f"Erro ao salvar índice de horários: {str(e)}")
+                    self._segments.pop(key, None)
+                    continue
+                
+                # Segmento em memória igual ao arquivo antes desta gravação: acrescentar
+                cached = self._segments.get(key)
+                if cached is not None and cached[0][1] == size_before:
+                    for entry in entries:
+                        bisect.insort(cached[1], entry)
+                    self._segments[key] = (self._file_signature(segment_path), cached[1])
+                else:
+                    self._segments.pop(key, None)
+    
+    def _time_index_ready(self) -> bool:
         """
-        Inicializa o sistema de armazenamento de mensagens.
+        Verifica se o índice de horários já foi montado para este armazenamento.
+        
+        Returns:
+            True se o marcador de índice completo existe
+        """
+        return os.path.exists(os.path.join(self._get_time_index_dir(), self.TIME_INDEX_READY_FILE))
+    
+    def _invalidate_time_index(self) -> None:
+        """Marca o índice de horários para ser remontado na próxima consulta (usar com _time_index_lock)"""
+        try:
+            os.remove(os.path.join(self._get_time_index_dir(), self.TIME_INDEX_READY_FILE))
+        except OSError:
+            pass
+        self._segments.clear()
+    
+    def _rebuild_time_index(self) -> int:
+        """
+        Monta o índice de horários percorrendo os registros dos clientes (usar com _time_index_lock).
+        
+        Returns:
+            Quantidade de mensagens no índice
+        """
+        self._invalidate_time_index()
+        segments = {}
+        count = 0
+        for sa in self._scan_clients_with_messages():
+            if os.path.exists(self._get_log_path(sa)):
+                messages = self._read_log(sa)
+            else:
+                messages = self._load_client_data(sa).get("messages", [])
+            for position, message_data in enumerate(messages):
+                entry = self._time_index_entry(sa, position, message_data)
+                segments.setdefault(self._segment_key(entry[0]), []).append(entry)
+                count += 1
+        
+        time_index_dir = self._get_time_index_dir()
+        os.makedirs(time_index_dir, exist_ok=True)
+        # Segmentos que não têm mais mensagens são removidos
+        for key in self._list_segments():
+            if key not in segments:
+                try:
+                    os.remove(self._get_segment_path(key))
+                except OSError:
+                    pass
+        for key, entries in segments.items():
+            entries.sort()
+            self._write_file(self._get_segment_path(key),
+                             "".join(json.dumps(list(entry), ensure_ascii=False) + "\n"
+                                     for entry in entries))
+        self._write_file(os.path.join(time_index_dir, self.TIME_INDEX_READY_FILE),
+                         datetime.datetime.now().isoformat() + "\n")
+        return count
+    
+    def rebuild_time_index(self) -> int:
+        """
+        Remonta o índice de horários a partir dos registros de mensagens.
+        
+        Returns:
+            Quantidade de mensagens no índice
+        """
+        self.flush()
+        with self._time_index_lock:
+            return self._rebuild_time_index()
+    
+    def _write_header(self, sa: str, client_info: Dict[str, Any]) -> None:
+        """
+        Grava o cabeçalho com as informações do cliente.
         
         Args:
-            storage_dir: Diretório para armazenar as mensagens
+            sa: Número da SA do cliente
+            client_info: Informações do cliente
         """
-        self.storage_dir = storage_dir
-        self._ensure_storage_dir()
+        header_path = self._get_header_path(sa)
+        try:
+            # Datas da planilha (Timestamp) viram texto, como no banco SQLite
+            content = json.dumps(client_info, ensure_ascii=False, indent=2, default=str)
+            self._write_file(header_path, content)
+        except Exception as e:
+            print(f"Erro ao salvar dados do cliente {sa}: {str(e)}")
+            return
+        # O cache guarda o que uma nova leitura do arquivo devolveria
+        self._cache_put(sa, "info", self._file_signature(header_path), json.loads(content))
     
-    def _ensure_storage_dir(self) -> None:
-        """Garante que o diretório de armazenamento exista"""
-        os.makedirs(self.storage_dir, exist_ok=True)
+    @staticmethod
+    def _file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+        """
+        Obtém a assinatura (data de modificação e tamanho) de um arquivo.
+        
+        Args:
+            file_path: Caminho do arquivo
+            
+        Returns:
+            Tupla (mtime em nanossegundos, tamanho) ou None se o arquivo não existir
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
     
-    def _get_client_file_path(self, sa: str) -> str:
+    def _cache_get(self, sa: str, kind: str, file_path: str) -> Optional[Any]:
         """
-        Obtém o caminho do arquivo para um cliente específico.
+        Obtém um documento do cache se o arquivo não mudou desde a leitura.
         
         Args:
             sa: Número da SA do cliente
+            kind: 'messages' (registro) ou 'info' (cabeçalho)
+            file_path: Arquivo de origem do documento
             
         Returns:
-            Caminho do arquivo
+            Conteúdo em cache ou None se ausente ou desatualizado
         """
-        return os.path.join(self.storage_dir, f"client_{sa}.json")
+        with self._cache_lock:
+            entry = self._cache.get(sa)
+            if entry is None or kind not in entry:
+                return None
+            signature, value = entry[kind]
+            # Arquivo alterado por outro processo: descartar a cópia em memória
+            if signature is None or self._file_signature(file_path) != signature:
+                del entry[kind]
+                return None
+            self._cache.move_to_end(sa)
+            return value
     
-    def save_sent_message(self, sa: str, phone: str, message: str, 
-                         client_info: Dict[str, Any]) -> None:
+    def _cache_put(self, sa: str, kind: str, signature: Optional[Tuple[int, int]], value: Any) -> None:
         """
-        Salva uma mensagem enviada.
+        Guarda um documento no cache, descartando os clientes menos usados.
         
         Args:
             sa: Número da SA do cliente
-            phone: Número de telefone do cliente
-            message: Mensagem enviada
-            client_info: Informações adicionais do cliente
+            kind: 'messages' (registro) ou 'info' (cabeçalho)
+            signature: Assinatura do arquivo lida antes do conteúdo, sob o
+                lock do cliente
+            value: Conteúdo lido
         """
-        file_path = self._get_client_file_path(sa)
+        if self.cache_size <= 0 or signature is None:
+            return
+        with self._cache_lock:
+            entry = self._cache.setdefault(sa, {})
+            entry[kind] = (signature, value)
+            self._cache.move_to_end(sa)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def _cache_append(self, sa: str, new_messages: List[Dict[str, Any]], size_before: int) -> None:
+        """
+        Acrescenta ao cache as mensagens recém-gravadas no registro (gravação direta).
         
-        # Carregar dados existentes ou criar novo
-        data = self._load_client_data(sa)
+        A cópia em memória só é atualizada se correspondia exatamente ao
+        registro antes desta gravação; caso contrário é descartada.
         
-        # Adicionar informações do cliente se ainda não existirem
-        if "client_info" not in data:
-            data["client_info"] = client_info
+        Args:
+            sa: Número da SA do cliente
+            new_messages: Mensagens gravadas
+            size_before: Tamanho do registro antes da gravação
+        """
+        if self.cache_size <= 0:
+            return
+        signature = self._file_signature(self._get_log_path(sa))
+        with self._cache_lock:
+            entry = self._cache.get(sa)
+            if entry is not None and "messages" in entry:
+                cached_signature, messages = entry["messages"]
+                if cached_signature is not None and cached_signature[1] == size_before:
+                    messages.extend(new_messages)
+                    entry["messages"] = (signature, messages)
+                    self._cache.move_to_end(sa)
+                else:
+                    del entry["messages"]
+                return
         
-        # Inicializar lista de mensagens se não existir
-        if "messages" not in data:
-            data["messages"] = []
+        # Registro novo: o cache já pode começar com a primeira mensagem
+        if size_before == 0:
+            self._cache_put(sa, "messages", signature, list(new_messages))
+    
+    def _write_file(self, file_path: str, content: str) -> None:
+        """
+        Grava um arquivo inteiro num arquivo temporário e o coloca no lugar do original.
         
-        # Adicionar nova mensagem
-        message_data = {
-            "type": "sent",
-            "timestamp": datetime.datetime.now().isoformat(),
-            "message": message,
-            "phone": phone
-        }
-        data["messages"].append(message_data)
+        Args:
+            file_path: Caminho do arquivo
+            content: Conteúdo do arquivo
+        """
+        # Nome temporário único: gravações simultâneas não usam o mesmo arquivo,
+        # e quem lê vê sempre a versão anterior inteira ou a nova inteira
+        self._ensure_parent_dir(file_path)
+        directory, filename = os.path.split(file_path)
+        fd, temp_path = tempfile.mkstemp(prefix=f"{filename}.", suffix=".tmp", dir=directory or ".")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    
+    def _migrate_legacy_file(self, sa: str) -> None:
+        """
+        Converte o arquivo client_{sa}.json do formato antigo, se existir.
+        
+        O cabeçalho e o registro são gravados antes de o arquivo antigo ser
+        removido; se a conversão for interrompida, ela é refeita no próximo acesso.
+        
+        Args:
+            sa: Número da SA do cliente
+        """
+        if self._has_flat_files:
+            self._move_to_shard(sa)
+        
+        legacy_path = self._get_client_file_path(sa)
+        if not os.path.exists(legacy_path):
+            return
         
-        # Salvar dados
-        self._save_client_data(sa, data)
+        with self._lock_for(sa):
+            # Outra thread pode ter concluído a conversão enquanto esperávamos
+            if not os.path.exists(legacy_path):
+                return
+            try:
+                # Registro já criado: a conversão foi interrompida só na remoção
+                if not os.path.exists(self._get_log_path(sa)):
+                    data = self._load_client_data(sa)
+                    if "client_info" in data:
+                        self._write_file(self._get_header_path(sa),
+                                         json.dumps(data["client_info"], ensure_ascii=False, indent=2,
+                                                    default=str))
+                    self._write_file(self._get_log_path(sa),
+                                     "".join(json.dumps(message_data, ensure_ascii=False) + "\n"
+                                             for message_data in data.get("messages", [])))
+                os.remove(legacy_path)
+            except Exception as e:
+                print(f"Erro ao converter arquivo do cliente {sa}: {str(e)}")
     
-    def save_received_message(self, sa: str, phone: str, message: str,
-                            received_timestamp: Optional[str] = None) -> None:
+    def _move_to_shard(self, sa: str) -> bool:
         """
-        Salva uma mensagem recebida.
+        Move os arquivos de um cliente da raiz do diretório para o seu subdiretório.
         
         Args:
             sa: Número da SA do cliente
-            phone: Número de telefone do cliente
-            message: Mensagem recebida
-            received_timestamp: Timestamp de recebimento (opcional)
+            
+        Returns:
+            True se algum arquivo foi movido
         """
-        file_path = self._get_client_file_path(sa)
+        moved = False
+        with self._lock_for(sa):
+            for suffix in (self.HEADER_SUFFIX, self.LOG_SUFFIX, self.SUMMARY_SUFFIX):
+                flat_path = os.path.join(self.storage_dir, f"client_{sa}{suffix}")
+                if not os.path.exists(flat_path):
+                    continue
+                target_path = os.path.join(self._get_shard_dir(sa), f"client_{sa}{suffix}")
+                try:
+                    if os.path.exists(target_path):
+                        # Não sobrescrever: os dois arquivos precisam ser conferidos
+                        print(f"Arquivo {flat_path} já existe em {target_path}; mantido na raiz")
+                        continue
+                    self._ensure_parent_dir(target_path)
+                    os.replace(flat_path, target_path)
+                    moved = True
+                except FileNotFoundError:
+                    pass  # Movido por outro processo (migração em execução)
+                except Exception as e:
+                    print(f"Erro ao mover arquivo do cliente {sa}: {str(e)}")
+        return moved
+    
+    def migrate_to_shards(self) -> int:
+        """
+        Move todos os arquivos de clientes da raiz do diretório para os subdiretórios.
         
-        # Carregar dados existentes ou criar novo
-        data = self._load_client_data(sa)
+        Pode ser executado com o programa em funcionamento: cada cliente é
+        movido sob o seu lock, e clientes ainda não movidos continuam sendo
+        lidos e gravados no lugar antigo. Arquivos do formato antigo
+        (client_{sa}.json) são convertidos no caminho.
         
-        # Inicializar lista de mensagens se não existir
-        if "messages" not in data:
-            data["messages"] = []
+        Returns:
+            Quantidade de clientes migrados
+        """
+        self.flush()
+        suffixes = (self.HEADER_SUFFIX, self.SUMMARY_SUFFIX, self.LOG_SUFFIX, ".json")
         
-        # Adicionar nova mensagem
-        message_data = {
-            "type": "received",
-            "timestamp": received_timestamp or datetime.datetime.now().isoformat(),
-            "message": message,
-            "phone": phone
-        }
-        data["messages"].append(message_data)
+        sa_list = {}
+        try:
+            with os.scandir(self.storage_dir) as entries:
+                for entry in entries:
+                    if not entry.name.startswith("client_") or not entry.is_file():
+                        continue
+                    for suffix in suffixes:
+                        if entry.name.endswith(suffix):
+                            sa_list[entry.name[7:-len(suffix)]] = True
+                            break
+        except OSError as e:
+            print(f"Erro ao listar diretório de armazenamento: {str(e)}")
+            return 0
         
-        # Salvar dados
-        self._save_client_data(sa, data)
+        migrated = 0
+        for sa in sa_list:
+            legacy = os.path.exists(self._get_client_file_path(sa))
+            moved = self._move_to_shard(sa)
+            self._migrate_legacy_file(sa)
+            if moved or legacy:
+                migrated += 1
+        
+        self._has_flat_files = self._detect_flat_files()
+        return migrated
     
     def _load_client_data(self, sa: str) -> Dict[str, Any]:
         """
-        Carrega dados de cliente do arquivo.
+        Carrega dados de cliente do arquivo no formato antigo.
         
         Args:
             sa: Número da SA do cliente
-            
+        
         Returns:
             Dados do cliente
         """
@@ -118,20 +1182,154 @@ class MessageStorage:
         
         return {}
     
-    def _save_client_data(self, sa: str, data: Dict[str, Any]) -> None:
+    def iter_client_messages(self, sa: str) -> Iterator[Dict[str, Any]]:
         """
-        Salva dados de cliente no arquivo.
+        Percorre as mensagens de um cliente lendo o registro linha a linha.
+        
+        Linhas inválidas (gravação interrompida) são ignoradas e o registro
+        fica marcado para compactação.
         
         Args:
             sa: Número da SA do cliente
-            data: Dados a serem salvos
+        
+        Yields:
+            Mensagens, na ordem em que foram gravadas
         """
-        file_path = self._get_client_file_path(sa)
+        self._flush_pending(sa)
+        self._migrate_legacy_file(sa)
+        yield from self._read_log(sa)
+    
+    def _read_log(self, sa: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lê o registro de mensagens de um cliente, sem gravar as pendentes.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Yields:
+            Mensagens válidas do registro
+        """
+        log_path = self._get_log_path(sa)
+        if not os.path.exists(log_path):
+            return
+        
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        self._needs_compaction.add(sa)
         except Exception as e:
-            print(f"Erro ao salvar dados do cliente {sa}: {str(e)}")
+            print(f"Erro ao carregar dados do cliente {sa}: {str(e)}")
+    
+    def tail_client_messages(self, sa: str, count: int = 1) -> List[Dict[str, Any]]:
+        """
+        Obtém as últimas mensagens de um cliente lendo apenas o fim do registro.
+        
+        Args:
+            sa: Número da SA do cliente
+            count: Quantidade de mensagens
+        
+        Returns:
+            Últimas mensagens, da mais antiga para a mais recente
+        """
+        if count <= 0:
+            return []
+        
+        self._flush_pending(sa)
+        log_path = self._get_log_path(sa)
+        messages = self._cache_get(sa, "messages", log_path)
+        if messages is not None:
+            return messages[-count:]
+        
+        self._migrate_legacy_file(sa)
+        if not os.path.exists(log_path):
+            return []
+        
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                buffer = b""
+                # Ler blocos do fim para o começo até ter linhas suficientes
+                while position > 0 and buffer.count(b"\n") <= count:
+                    step = min(8192, position)
+                    position -= step
+                    f.seek(position)
+                    buffer = f.read(step) + buffer
+        except Exception as e:
+            print(f"Erro ao carregar dados do cliente {sa}: {str(e)}")
+            return []
+        
+        lines = buffer.split(b"\n")
+        if position > 0:
+            # A primeira linha do bloco pode ter sido cortada no meio
+            lines = lines[1:]
+        
+        messages = []
+        for line in reversed(lines):
+            if len(messages) >= count:
+                break
+            if not line.strip():
+                continue
+            try:
+                messages.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                self._needs_compaction.add(sa)
+        messages.reverse()
+        return messages
+    
+    def compact(self, sa_list: Optional[List[str]] = None) -> int:
+        """
+        Regrava registros de mensagens sem as linhas inválidas.
+        
+        Args:
+            sa_list: SAs a compactar (opcional, por padrão as SAs em que a
+                leitura ou a gravação encontrou linhas incompletas)
+        
+        Returns:
+            Quantidade de registros compactados
+        """
+        self.flush()
+        if sa_list is None:
+            sa_list = list(self._needs_compaction)
+        
+        compacted = 0
+        for sa in sa_list:
+            # Nenhuma mensagem pode ser acrescentada entre a leitura e a regravação
+            with self._lock_for(sa):
+                messages = list(self.iter_client_messages(sa))
+                try:
+                    if os.path.exists(self._get_log_path(sa)):
+                        self._write_file(self._get_log_path(sa),
+                                         "".join(json.dumps(message_data, ensure_ascii=False) + "\n"
+                                                 for message_data in messages))
+                        compacted += 1
+                        
+                        # Recalcular o resumo sem as linhas descartadas
+                        with self._summary_lock:
+                            summary = self._empty_summary()
+                            for message_data in messages:
+                                self._apply_to_summary(summary, message_data)
+                            self._save_summary(sa, summary)
+                        self._record_manifest(sa, len(messages))
+                    self._needs_compaction.discard(sa)
+                except Exception as e:
+                    print(f"Erro ao compactar mensagens do cliente {sa}: {str(e)}")
+        
+        # O índice de clientes também cresce uma linha por gravação
+        with self._manifest_lock:
+            if self._manifest is not None and self._manifest_lines > len(self._manifest):
+                self._write_manifest()
+        if compacted:
+            # As linhas descartadas mudam as posições das mensagens nos registros
+            with self._time_index_lock:
+                self._invalidate_time_index()
+        
+        return compacted
     
     def get_client_messages(self, sa: str) -> List[Dict[str, Any]]:
         """
@@ -139,12 +1337,35 @@ class MessageStorage:
         
         Args:
             sa: Número da SA do cliente
-            
+        
         Returns:
             Lista de mensagens
         """
-        data = self._load_client_data(sa)
-        return data.get("messages", [])
+        return list(self._cached_messages(sa))
+    
+    def _cached_messages(self, sa: str) -> List[Dict[str, Any]]:
+        """
+        Obtém as mensagens de um cliente, do cache ou do registro.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Lista de mensagens guardada no cache (não deve ser alterada)
+        """
+        self._flush_pending(sa)
+        log_path = self._get_log_path(sa)
+        messages = self._cache_get(sa, "messages", log_path)
+        if messages is None:
+            # Assinatura, leitura e cache sob o lock do cliente: uma gravação
+            # entre elas faria _cache_append repetir mensagens já lidas
+            with self._lock_for(sa):
+                self._migrate_legacy_file(sa)
+                log_path = self._get_log_path(sa)
+                signature = self._file_signature(log_path)
+                messages = list(self._read_log(sa))
+                self._cache_put(sa, "messages", signature, messages)
+        return messages
     
     def get_client_info(self, sa: str) -> Dict[str, Any]:
         """
@@ -152,41 +1373,389 @@ class MessageStorage:
         
         Args:
             sa: Número da SA do cliente
-            
+        
         Returns:
             Informações do cliente
         """
-        data = self._load_client_data(sa)
-        return data.get("client_info", {})
+        self._flush_pending(sa)
+        header_path = self._get_header_path(sa)
+        client_info = self._cache_get(sa, "info", header_path)
+        if client_info is not None:
+            return dict(client_info)
+        
+        with self._lock_for(sa):
+            self._migrate_legacy_file(sa)
+            header_path = self._get_header_path(sa)
+            
+            signature = self._file_signature(header_path)
+            if signature is not None:
+                try:
+                    with open(header_path, 'r', encoding='utf-8') as f:
+                        client_info = json.load(f)
+                    self._cache_put(sa, "info", signature, client_info)
+                    return dict(client_info)
+                except Exception as e:
+                    print(f"Erro ao carregar dados do cliente {sa}: {str(e)}")
+        
+        return {}
+    
+    def get_client_summary(self, sa: str) -> Dict[str, Any]:
+        """
+        Obtém o resumo de mensagens de um cliente sem ler o histórico.
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Dicionário com 'sent', 'received', 'last_type', 'last_timestamp' e
+            'last_phone' (contadores zerados se o cliente não tiver mensagens)
+        """
+        self._flush_pending(sa)
+        return self._client_summary(sa)
+    
+    def _client_summary(self, sa: str) -> Dict[str, Any]:
+        """
+        Obtém o resumo de um cliente, sem gravar as mensagens pendentes.
+        
+        Args:
+            sa: Número da SA do cliente
+            
+        Returns:
+            Cópia do resumo do cliente
+        """
+        with self._summary_lock:
+            summary = self._load_summary(sa)
+            if summary is None:
+                # Clientes gravados antes dos resumos ou ainda no formato antigo
+                # (sem converter aqui, para não depender do lock do cliente)
+                if (not os.path.exists(self._get_log_path(sa))
+                        and not os.path.exists(self._get_client_file_path(sa))):
+                    return self._empty_summary()
+                summary = self._build_summary(sa)
+                self._save_summary(sa, summary)
+            return dict(summary)
+    
+    def get_all_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtém o resumo de mensagens de todos os clientes com mensagens.
+        
+        Os resumos ficam em memória e só são lidos de novo do disco quando o
+        arquivo de resumo do cliente mudou.
+        
+        Returns:
+            Dicionário SA -> resumo (ver get_client_summary)
+        """
+        self.flush()
+        summaries = {}
+        for sa in self.get_all_clients_with_messages():
+            summary = self._client_summary(sa)
+            if summary["sent"] or summary["received"]:
+                summaries[sa] = summary
+        return summaries
+    
+    def query(self, sa: Optional[str] = None, since: Optional[Union[str, datetime.datetime]] = None,
+              until: Optional[Union[str, datetime.datetime]] = None, type: Optional[str] = None,
+              limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Consulta mensagens em ordem de horário, uma página por vez.
+        
+        Sem SA, a consulta usa o índice de horários em disco, lendo só os
+        segmentos (dias) que a página alcança e os registros dos clientes com
+        mensagens na página; com SA, usa a ordem das mensagens do cliente,
+        mantida no cache junto com o registro.
+        
+        Args:
+            sa: Número da SA do cliente (opcional, por padrão todos os clientes)
+            since: Horário inicial, inclusive (datetime ou texto ISO)
+            until: Horário final, exclusive (datetime ou texto ISO)
+            type: 'sent' ou 'received' (opcional)
+            limit: Quantidade máxima de mensagens na página
+            cursor: Cursor devolvido pela página anterior
+            
+        Returns:
+            Tupla (mensagens da página, cada uma com a chave 'sa'; cursor da
+            próxima página, ou None se esta for a última)
+        """
+        if isinstance(since, datetime.datetime):
+            since = since.isoformat()
+        if isinstance(until, datetime.datetime):
+            until = until.isoformat()
+        limit = max(limit, 1)
+        
+        start = self._query_start(since, cursor)
+        
+        if sa is not None:
+            client_messages = self._cached_messages(sa)
+            with self._cache_lock:
+                order = self._client_time_order(sa, client_messages)
+                index = bisect.bisect_left(order, start)
+                entries, next_cursor = self._query_page(
+                    (order[position] for position in range(index, len(order))), until, type, limit)
+        else:
+            self.flush()
+            client_messages = None
+            with self._time_index_lock:
+                if not self._time_index_ready():
+                    # Armazenamento anterior ao índice: montar uma vez, na primeira consulta
+                    print("Montando o índice de horários das mensagens...")
+                    self._rebuild_time_index()
+                entries, next_cursor = self._query_page(self._iter_time_index(start), until, type, limit)
+        
+        messages = []
+        loaded = {}
+        for timestamp, entry_sa, position, message_type in entries:
+            if client_messages is None:
+                # Cada cliente da página é lido uma vez (e normalmente vem do cache)
+                if entry_sa not in loaded:
+                    loaded[entry_sa] = self._cached_messages(entry_sa)
+                source = loaded[entry_sa]
+            else:
+                source = client_messages
+            if position < len(source):
+                messages.append({**source[position], "sa": entry_sa})
+        
+        return messages, next_cursor
+    
+    @staticmethod
+    def _query_start(since: Optional[str], cursor: Optional[str]) -> tuple:
+        """
+        Obtém a primeira entrada possível de uma página do índice de horários.
+        
+        Args:
+            since: Horário inicial, inclusive
+            cursor: Cursor da página anterior
+            
+        Returns:
+            Tupla comparável com as entradas (horário, SA, posição, tipo)
+        """
+        start = (since,) if since else ()
+        if cursor:
+            # Continuar logo depois da última entrada da página anterior
+            timestamp, sa, position = json.loads(cursor)
+            start = max(start, (timestamp, sa, position + 1))
+        return start
+    
+    def _client_time_order(self, sa: str, messages: List[Dict[str, Any]]) -> List[Tuple[str, str, int, str]]:
+        """
+        Obtém as entradas de um cliente em ordem de horário (usar com _cache_lock).
+        
+        A ordem fica no cache junto com as mensagens do cliente e só recebe as
+        mensagens acrescentadas desde a última consulta, sem reordenar o registro.
+        
+        Args:
+            sa: Número da SA do cliente
+            messages: Mensagens do cliente, como devolvidas por _cached_messages
+            
+        Returns:
+            Lista ordenada de entradas (horário, SA, posição, tipo)
+        """
+        entry = self._cache.get(sa)
+        cached = entry.get("order") if entry is not None else None
+        # A ordem vale para a lista de mensagens em que foi montada
+        order = cached[1] if cached is not None and cached[0] is messages else []
+        
+        added = sorted(self._time_index_entry(sa, position, messages[position])
+                       for position in range(len(order), len(messages)))
+        if order and added and added[0] < order[-1]:
+            for item in added:
+                bisect.insort(order, item)
+        else:
+            order.extend(added)
+        
+        if entry is not None and entry.get("messages", (None, None))[1] is messages:
+            entry["order"] = (messages, order)
+        return order
+    
+    def _iter_time_index(self, start: tuple) -> Iterator[Tuple[str, str, int, str]]:
+        """
+        Percorre o índice de horários em ordem a partir de uma entrada (usar com _time_index_lock).
+        
+        Os segmentos são lidos um a um, só quando a página chega neles.
+        
+        Args:
+            start: Primeira entrada possível (ver _query_start)
+            
+        Yields:
+            Entradas (horário, SA, posição, tipo)
+        """
+        first_key = self._segment_key(start[0]) if start else ""
+        for key in self._list_segments():
+            if key < first_key:
+                continue
+            entries = self._load_segment(key)
+            for index in range(bisect.bisect_left(entries, start), len(entries)):
+                yield entries[index]
+    
+    @staticmethod
+    def _query_page(entries: Iterator[Tuple[str, str, int, str]], until: Optional[str],
+                    message_type: Optional[str],
+                    limit: int) -> Tuple[List[Tuple[str, str, int, str]], Optional[str]]:
+        """
+        Seleciona uma página de entradas ordenadas do índice de horários.
+        
+        Args:
+            entries: Entradas (horário, SA, posição, tipo), em ordem, a partir
+                do início da página
+            until: Horário final, exclusive
+            message_type: Tipo das mensagens (opcional)
+            limit: Quantidade máxima de entradas
+            
+        Returns:
+            Tupla (entradas da página, cursor da próxima página ou None)
+        """
+        page = []
+        for entry in entries:
+            if until and entry[0] >= until:
+                break
+            if message_type and entry[3] != message_type:
+                continue
+            if len(page) == limit:
+                # Há pelo menos mais uma mensagem depois desta página
+                last = page[-1]
+                return page, json.dumps([last[0], last[1], last[2]], ensure_ascii=False)
+            page.append(entry)
+        
+        return page, None
     
     def get_all_clients_with_messages(self) -> List[str]:
         """
         Obtém lista de todos os clientes com mensagens.
         
+        A lista vem do índice de clientes, sem abrir os arquivos de mensagens.
+        
+        Returns:
+            Lista de SAs de clientes
+        """
+        self.flush()
+        with self._manifest_lock:
+            return [sa for sa, entry in self._load_manifest().items() if entry.get("messages")]
+    
+    def _scan_clients_with_messages(self) -> List[str]:
+        """
+        Lista os clientes com mensagens percorrendo os arquivos do diretório.
+        
+        Os subdiretórios de primeiro nível são percorridos em paralelo; a raiz
+        também é percorrida, para os arquivos ainda não movidos.
+        
         Returns:
             Lista de SAs de clientes
         """
         clients = []
         if not os.path.exists(self.storage_dir):
             return clients
+        
+        directories = [self.storage_dir]
+        try:
+            with os.scandir(self.storage_dir) as entries:
+                directories.extend(entry.path for entry in entries
+                                   if len(entry.name) == 2 and entry.is_dir())
+        except OSError as e:
+            print(f"Erro ao listar diretório de armazenamento: {str(e)}")
+        
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS) as executor:
+            for found in executor.map(self._scan_shard, directories):
+                for sa in found:
+                    # Durante a conversão os dois formatos podem existir ao mesmo tempo
+                    if sa not in seen:
+                        seen.add(sa)
+                        clients.append(sa)
+        
+        return clients
+    
+    def _scan_shard(self, directory: str) -> List[str]:
+        """
+        Lista os clientes com mensagens de um subdiretório de primeiro nível
+        (e dos subdiretórios dentro dele), ou só os arquivos da raiz.
+        
+        Args:
+            directory: Subdiretório de primeiro nível ou a raiz do armazenamento
+            
+        Returns:
+            Lista de SAs de clientes
+        """
+        if directory == self.storage_dir:
+            directories = [directory]
+        else:
+            try:
+                with os.scandir(directory) as entries:
+                    directories = sorted(entry.path for entry in entries if entry.is_dir())
+            except OSError as e:
+                print(f"Erro ao listar diretório {directory}: {str(e)}")
+                return []
+        
+        clients = []
+        for path in directories:
+            try:
+                with os.scandir(path) as entries:
+                    filenames = [entry.name for entry in entries
+                                 if entry.name.startswith("client_") and entry.is_file()]
+            except OSError as e:
+                print(f"Erro ao listar diretório {path}: {str(e)}")
+                continue
             
-        for filename in os.listdir(self.storage_dir):
-            if filename.startswith("client_") and filename.endswith(".json"):
+            for filename in filenames:
                 try:
-                    sa = filename[7:-5]  # Remover "client_" e ".json"
-                    # Verificar se o arquivo tem mensagens
-                    file_path = os.path.join(self.storage_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if data.get("messages"):
-                            clients.append(sa)
+                    file_path = os.path.join(path, filename)
+                    if filename.endswith(self.LOG_SUFFIX):
+                        sa = filename[7:-len(self.LOG_SUFFIX)]  # Remover "client_" e ".jsonl"
+                        # Registro não vazio tem pelo menos uma mensagem
+                        has_messages = os.path.getsize(file_path) > 0
+                    elif filename.endswith(".json") and not filename.endswith((self.HEADER_SUFFIX,
+                                                                               self.SUMMARY_SUFFIX)):
+                        sa = filename[7:-5]  # Remover "client_" e ".json" (formato antigo)
+                        with open(file_path, 'r', encoding='utf-8') as f:
+                            has_messages = bool(json.load(f).get("messages"))
+                    else:
+                        continue
+                    
+                    if has_messages:
+                        clients.append(sa)
                 except Exception as e:
                     print(f"Erro ao processar arquivo {filename}: {str(e)}")
         
         return clients
 
+def open_message_storage(path: str, **options: Any) -> Union[MessageStorage, SqliteMessageStorage]:
+    """
+    Abre o armazenamento de mensagens adequado ao caminho informado.
+    
+    Args:
+        path: Diretório dos arquivos JSON, ou arquivo .db/.sqlite/.sqlite3
+            para usar o banco SQLite
+        options: Opções de MessageStorage (cache_size, write_behind,
+            flush_interval, fsync); ignoradas pelo banco SQLite, que já grava
+            cada mensagem numa transação própria
+    
+    Returns:
+        Armazenamento de mensagens
+    """
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteMessageStorage(path)
+    return MessageStorage(path, **options)
 
 if __name__ == "__main__":
+    import sys
+    
+    # Recuperação dos índices de clientes e de horários:
+    #   python -m storage.message_storage --rebuild-manifest [diretório]
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild-manifest":
+        storage_dir = sys.argv[2] if len(sys.argv) > 2 else "storage"
+        storage = MessageStorage(storage_dir)
+        count = storage.rebuild_manifest()
+        print(f"Índice de {storage_dir} remontado: {count} clientes com mensagens")
+        count = storage.rebuild_time_index()
+        print(f"Índice de horários de {storage_dir} remontado: {count} mensagens")
+        sys.exit(0)
+    
+    # Migração para os subdiretórios por hash da SA (pode rodar com o programa no ar):
+    #   python -m storage.message_storage --migrate-shards [diretório]
+    if len(sys.argv) > 1 and sys.argv[1] == "--migrate-shards":
+        storage_dir = sys.argv[2] if len(sys.argv) > 2 else "storage"
+        count = MessageStorage(storage_dir).migrate_to_shards()
+        print(f"Armazenamento {storage_dir} migrado: {count} clientes movidos para subdiretórios")
+        sys.exit(0)
+    
     # Teste simples da classe
     storage = MessageStorage()
     
@@ -218,7 +1787,7 @@ if __name__ == "__main__":
     print(f"\nInformações do cliente:")
     for key, value in client_info.items():
         print(f"{key}: {value}")
-        
+    
     # Testar obtenção de todos os clientes
     all_clients = storage.get_all_clients_with_messages()
-    print(f"\nClientes com mensagens: {all_clients}") 
\ No newline at end of file
+    print(f"\nClientes com mensagens: {all_clients}")
\ No newline at end of file
@@ -0,0 +1,421 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+from storage.timestamps import normalize_timestamp
+
+# Estrutura do banco: informações do cliente gravadas uma vez por SA e uma
+# linha por mensagem, com índices por SA e por horário
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    sa TEXT PRIMARY KEY,
+    client_info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sa TEXT NOT NULL,
+    type TEXT NOT NULL,
+    timestamp,
+    message TEXT,
+    phone TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_sa_timestamp ON messages (sa, timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp);
+CREATE TABLE IF NOT EXISTS summaries (
+    sa TEXT PRIMARY KEY,
+    sent INTEGER NOT NULL,
+    received INTEGER NOT NULL,
+    last_type TEXT,
+    last_timestamp,
+    last_phone TEXT
+);
+"""
+
+# Atualiza o resumo do cliente na mesma transação da mensagem; a última
+# mensagem é a de maior timestamp comparado como texto (empate: a mais nova)
+_UPDATE_SUMMARY = """
+INSERT INTO summaries (sa, sent, received, last_type, last_timestamp, last_phone)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (sa) DO UPDATE SET
+    sent = sent + excluded.sent,
+    received = received + excluded.received,
+    last_type = CASE WHEN CAST(excluded.last_timestamp AS TEXT) >= CAST(last_timestamp AS TEXT)
+                     THEN excluded.last_type ELSE last_type END,
+    last_phone = CASE WHEN CAST(excluded.last_timestamp AS TEXT) >= CAST(last_timestamp AS TEXT)
+                      THEN excluded.last_phone ELSE last_phone END,
+    last_timestamp = CASE WHEN CAST(excluded.last_timestamp AS TEXT) >= CAST(last_timestamp AS TEXT)
+                          THEN excluded.last_timestamp ELSE last_timestamp END
+"""
+
+class SqliteMessageStorage:
+    def __init__(self, db_path: str):
+        """
+        Inicializa o armazenamento de mensagens em SQLite.
+        
+        Oferece a mesma interface de MessageStorage, mas cada mensagem é uma
+        linha inserida no banco em vez de regravar o arquivo inteiro do
+        cliente. O banco usa o modo WAL, então leituras (Flask, interface)
+        não bloqueiam as gravações e vice-versa.
+        
+        Args:
+            db_path: Caminho do arquivo do banco (.db, .sqlite ou .sqlite3)
+        """
+        self.db_path = db_path
+        self.storage_dir = os.path.dirname(os.path.abspath(db_path))
+        self._local = threading.local()  # Uma conexão por thread
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        os.makedirs(self.storage_dir, exist_ok=True)
+        
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            # Bancos criados antes dos resumos: calcular a partir das mensagens
+            if (conn.execute("SELECT 1 FROM summaries LIMIT 1").fetchone() is None
+                    and conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is not None):
+                for row in conn.execute("SELECT sa, type, timestamp, phone FROM messages ORDER BY id").fetchall():
+                    self._add_to_summary(conn, *row)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Obtém a conexão da thread atual, abrindo-a no primeiro uso.
+        
+        Returns:
+            Conexão com o banco
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Com WAL, NORMAL só perde as últimas transações numa queda de energia
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def flush(self) -> None:
+        """Sem efeito: cada mensagem é gravada no banco na própria chamada"""
+    
+    def close(self) -> None:
+        """Fecha as conexões abertas por todas as threads"""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"Erro ao fechar o banco de mensagens: {str(e)}")
+            self._connections = []
+        self._local = threading.local()
+    
+    @staticmethod
+    def _add_to_summary(conn: sqlite3.Connection, sa: str, message_type: str,
+                        timestamp: Any, phone: Optional[str]) -> None:
+        """
+        Acrescenta uma mensagem ao resumo do cliente.
+        
+        Args:
+            conn: Conexão com a transação em andamento
+            sa: Número da SA do cliente
+            message_type: 'sent' ou 'received'
+            timestamp: Timestamp da mensagem
+            phone: Telefone da mensagem
+        """
+        conn.execute(_UPDATE_SUMMARY, (sa, int(message_type == "sent"), int(message_type == "received"),
+                                       message_type, timestamp, phone))
+    
+    def _insert_message(self, conn: sqlite3.Connection, sa: str, message_type: str,
+                        timestamp: Any, message: Optional[str], phone: Optional[str]) -> None:
+        """
+        Grava uma mensagem e atualiza o resumo do cliente.
+        
+        Args:
+            conn: Conexão com a transação em andamento
+            sa: Número da SA do cliente
+            message_type: 'sent' ou 'received'
+            timestamp: Timestamp da mensagem
+            message: Texto da mensagem
+            phone: Telefone da mensagem
+        """
+        conn.execute("INSERT INTO messages (sa, type, timestamp, message, phone) VALUES (?, ?, ?, ?, ?)",
+                     (sa, message_type, timestamp, message, phone))
+        self._add_to_summary(conn, sa, message_type, timestamp, phone)
+    
+    def save_sent_message(self, sa: str, phone: str, message: str,
+                         client_info: Dict[str, Any]) -> None:
+        """
+        Salva uma mensagem enviada.
+        
+        Args:
+            sa: Número da SA do cliente
+            phone: Número de telefone do cliente
+            message: Mensagem enviada
+            client_info: Informações adicionais do cliente
+        """
+        try:
+            with self._connection() as conn:
+                # Informações do cliente gravadas apenas na primeira mensagem
+                conn.execute("INSERT OR IGNORE INTO clients (sa, client_info) VALUES (?, ?)",
+                             (str(sa), json.dumps(client_info, ensure_ascii=False, default=str)))
+                self._insert_message(conn, str(sa), "sent", datetime.datetime.now().isoformat(), message, phone)
+        except Exception as e:
+            print(f"Erro ao salvar dados do cliente {sa}: {str(e)}")
+    
+    def save_received_message(self, sa: str, phone: str, message: str,
+                            received_timestamp: Optional[str] = None) -> None:
+        """
+        Salva uma mensagem recebida.
+        
+        Args:
+            sa: Número da SA do cliente
+            phone: Número de telefone do cliente
+            message: Mensagem recebida
+            received_timestamp: Timestamp de recebimento (opcional, ISO ou
+                segundos desde a época, como enviado pelo bot)
+        """
+        timestamp = normalize_timestamp(received_timestamp) or datetime.datetime.now().isoformat()
+        try:
+            with self._connection() as conn:
+                self._insert_message(conn, str(sa), "received", timestamp, message, phone)
+        except Exception as e:
+            print(f"Erro ao salvar dados do cliente {sa}: {str(e)}")
+    
+    def get_client_messages(self, sa: str) -> List[Dict[str, Any]]:
+        """
+        Obtém todas as mensagens de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Lista de mensagens, na ordem em que foram gravadas
+        """
+        try:
+            rows = self._connection().execute(
+                "SELECT type, timestamp, message, phone FROM messages WHERE sa = ? ORDER BY id",
+                (str(sa),)).fetchall()
+        except Exception as e:
+            print(f"Erro ao carregar dados do cliente {sa}: {str(e)}")
+            return []
+        
+        return [{"type": type_, "timestamp": timestamp, "message": message, "phone": phone}
+                for type_, timestamp, message, phone in rows]
+    
+    def get_client_info(self, sa: str) -> Dict[str, Any]:
+        """
+        Obtém informações de um cliente.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Informações do cliente
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT client_info FROM clients WHERE sa = ?", (str(sa),)).fetchone()
+            return json.loads(row[0]) if row else {}
+        except Exception as e:
+            print(f"Erro ao carregar dados do cliente {sa}: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _summary_from_row(row: Tuple) -> Dict[str, Any]:
+        """
+        Converte uma linha da tabela de resumos no dicionário de MessageStorage.
+        
+        Args:
+            row: (sent, received, last_type, last_timestamp, last_phone)
+        
+        Returns:
+            Resumo do cliente
+        """
+        sent, received, last_type, last_timestamp, last_phone = row
+        return {"sent": sent, "received": received, "last_type": last_type,
+                "last_timestamp": last_timestamp, "last_phone": last_phone}
+    
+    def get_client_summary(self, sa: str) -> Dict[str, Any]:
+        """
+        Obtém o resumo de mensagens de um cliente sem ler o histórico.
+        
+        Args:
+            sa: Número da SA do cliente
+        
+        Returns:
+            Dicionário com 'sent', 'received', 'last_type', 'last_timestamp' e
+            'last_phone' (contadores zerados se o cliente não tiver mensagens)
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT sent, received, last_type, last_timestamp, last_phone FROM summaries WHERE sa = ?",
+                (str(sa),)).fetchone()
+        except Exception as e:
+            print(f"Erro ao carregar resumo do cliente {sa}: {str(e)}")
+            row = None
+        return self._summary_from_row(row if row else (0, 0, None, None, None))
+    
+    def get_all_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtém o resumo de mensagens de todos os clientes com mensagens.
+        
+        Returns:
+            Dicionário SA -> resumo (ver get_client_summary)
+        """
+        try:
+            rows = self._connection().execute(
+                "SELECT sa, sent, received, last_type, last_timestamp, last_phone FROM summaries").fetchall()
+        except Exception as e:
+            print(f"Erro ao carregar resumos: {str(e)}")
+            return {}
+        return {row[0]: self._summary_from_row(row[1:]) for row in rows}
+    
+    def query(self, sa: Optional[str] = None, since: Optional[Union[str, datetime.datetime]] = None,
+              until: Optional[Union[str, datetime.datetime]] = None, type: Optional[str] = None,
+              limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Consulta mensagens em ordem de horário, uma página por vez, pelos
+        índices de horário da tabela de mensagens.
+        
+        Args:
+            sa: Número da SA do cliente (opcional, por padrão todos os clientes)
+            since: Horário inicial, inclusive (datetime ou texto ISO)
+            until: Horário final, exclusive (datetime ou texto ISO)
+            type: 'sent' ou 'received' (opcional)
+            limit: Quantidade máxima de mensagens na página
+            cursor: Cursor devolvido pela página anterior
+            
+        Returns:
+            Tupla (mensagens da página, cada uma com a chave 'sa'; cursor da
+            próxima página, ou None se esta for a última)
+        """
+        if isinstance(since, datetime.datetime):
+            since = since.isoformat()
+        if isinstance(until, datetime.datetime):
+            until = until.isoformat()
+        limit = max(limit, 1)
+        
+        conditions = []
+        params = []
+        if sa is not None:
+            conditions.append("sa = ?")
+            params.append(str(sa))
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if type:
+            conditions.append("type = ?")
+            params.append(type)
+        if cursor:
+            # Continuar logo depois da última mensagem da página anterior
+            conditions.append("(timestamp, sa, id) > (?, ?, ?)")
+            params.extend(json.loads(cursor))
+        
+        sql = "SELECT id, sa, type, timestamp, message, phone FROM messages"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, sa, id LIMIT ?"
+        try:
+            # Uma linha a mais indica que há outra página
+            rows = self._connection().execute(sql, (*params, limit + 1)).fetchall()
+        except Exception as e:
+            print(f"Erro ao consultar mensagens: {str(e)}")
+            return [], None
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_sa, _, last_timestamp, _, _ = rows[-1]
+            next_cursor = json.dumps([last_timestamp, last_sa, last_id], ensure_ascii=False)
+        
+        return [{"type": type_, "timestamp": timestamp, "message": message, "phone": phone, "sa": row_sa}
+                for _, row_sa, type_, timestamp, message, phone in rows], next_cursor
+    
+    def get_all_clients_with_messages(self) -> List[str]:
+        """
+        Obtém lista de todos os clientes com mensagens.
+        
+        Returns:
+            Lista de SAs de clientes, na ordem da primeira mensagem
+        """
+        try:
+            rows = self._connection().execute(
+                "SELECT sa FROM messages GROUP BY sa ORDER BY MIN(id)").fetchall()
+        except Exception as e:
+            print(f"Erro ao listar clientes com mensagens: {str(e)}")
+            return []
+        return [sa for (sa,) in rows]
+    
+    def compact(self, sa_list: Optional[List[str]] = None) -> int:
+        """
+        Incorpora o WAL ao banco e reduz o arquivo de WAL, como a compactação
+        dos registros de MessageStorage.
+        
+        Args:
+            sa_list: Ignorado; presente pela compatibilidade com MessageStorage
+        
+        Returns:
+            Sempre 0 (não há registros por cliente para regravar)
+        """
+        try:
+            self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            print(f"Erro ao compactar o banco de mensagens: {str(e)}")
+        return 0
+    
+    def import_from(self, storage: Any) -> int:
+        """
+        Copia as mensagens de outro armazenamento (por exemplo, os arquivos
+        JSON de MessageStorage) para o banco.
+        
+        Clientes que já têm mensagens no banco são ignorados, então a
+        importação pode ser repetida sem duplicar mensagens.
+        
+        Args:
+            storage: Armazenamento de origem, com a interface de MessageStorage
+        
+        Returns:
+            Quantidade de clientes importados
+        """
+        existing = set(self.get_all_clients_with_messages())
+        imported = 0
+        
+        for sa in storage.get_all_clients_with_messages():
+            if sa in existing:
+                continue
+            
+            messages = storage.get_client_messages(sa)
+            client_info = storage.get_client_info(sa)
+            try:
+                with self._connection() as conn:
+                    if client_info:
+                        conn.execute("INSERT OR IGNORE INTO clients (sa, client_info) VALUES (?, ?)",
+                                     (str(sa), json.dumps(client_info, ensure_ascii=False, default=str)))
+                    for msg in messages:
+                        self._insert_message(conn, str(sa), msg.get("type"), msg.get("timestamp"),
+                                             msg.get("message"), msg.get("phone"))
+                imported += 1
+            except Exception as e:
+                print(f"Erro ao importar mensagens do cliente {sa}: {str(e)}")
+        
+        return imported
+
+
+if __name__ == "__main__":
+    # Importa os arquivos JSON de um diretório de armazenamento para um banco SQLite:
+    #   python -m storage.sqlite_storage <diretório> <banco.db>
+    import sys
+    from storage.message_storage import MessageStorage
+    
+    if len(sys.argv) != 3:
+        print("Uso: python -m storage.sqlite_storage <diretório de armazenamento> <banco.db>")
+        sys.exit(1)
+    
+    storage = SqliteMessageStorage(sys.argv[2])
+    count = storage.import_from(MessageStorage(sys.argv[1]))
+    print(f"{count} clientes importados para {sys.argv[2]}")
+    storage.close()
\ No newline at end of file
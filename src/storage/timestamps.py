@@ -0,0 +1,42 @@
+import datetime
+from typing import Any, Optional
+
+# Acima deste valor um horário numérico está em milissegundos, não em segundos
+_MILLISECONDS_THRESHOLD = 1e11
+
+def normalize_timestamp(timestamp: Any) -> Optional[str]:
+    """
+    Converte o horário de uma mensagem para texto ISO-8601.
+    
+    O bot envia o horário das mensagens recebidas como número de segundos
+    desde a época (message.timestamp); os armazenamentos comparam horários
+    como texto, então todos precisam estar no mesmo formato das mensagens
+    enviadas (datetime.now().isoformat(), horário local).
+    
+    Args:
+        timestamp: Horário em segundos ou milissegundos (número ou texto
+            numérico), datetime ou texto ISO
+    
+    Returns:
+        Horário ISO-8601, ou None se nenhum horário foi informado
+    """
+    if timestamp is None or timestamp == "":
+        return None
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.isoformat()
+    
+    value = timestamp
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            return timestamp  # Já é texto (ISO)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return str(timestamp)
+    
+    if value > _MILLISECONDS_THRESHOLD:
+        value /= 1000
+    try:
+        return datetime.datetime.fromtimestamp(value).isoformat()
+    except (OverflowError, OSError, ValueError):
+        return str(timestamp)
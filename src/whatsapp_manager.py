@@ -2,7 +2,7 @@ import os
 import json
 import time
 import requests
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterator, Union
 import threading
 import glob
 from datetime import datetime, timedelta
@@ -10,25 +10,47 @@ from queue import Queue, Empty
 import traceback
 
 from excel_reader.excel_handler import ExcelHandler
-from storage.message_storage import MessageStorage
+from excel_reader.workbook_federation import WorkbookFederation
+from storage.message_storage import open_message_storage
 
 class WhatsAppManager:
-    def __init__(self, excel_path: str, whatsapp_api_url: str = "http://localhost:3000", sheet_name: Optional[str] = None):
+    def __init__(self, excel_path: Union[str, List[str], Dict[str, str]], whatsapp_api_url: str = "http://localhost:3000", sheet_name: Optional[str] = None,
+                 storage_path: str = "storage", write_behind: bool = False,
+                 watch_workbook: bool = False):
         """
         Inicializa o gerenciador de WhatsApp.
         
         Args:
-            excel_path: Caminho para o arquivo Excel
+            excel_path: Caminho para o arquivo Excel, ou lista de caminhos /
+                dicionário rótulo -> caminho para atender várias planilhas com
+                um único gerenciador (abas no formato "<rótulo> / <aba>")
             whatsapp_api_url: URL da API do WhatsApp
             sheet_name: Nome da aba mensal (opcional, usa a primeira disponível por padrão)
+            storage_path: Diretório das mensagens em JSON, ou arquivo .db para
+                gravar as mensagens num banco SQLite
+            write_behind: Se True, as mensagens são gravadas em segundo plano,
+                fora da thread de envio e recebimento (uma falha do processo
+                pode perder as gravações dos últimos instantes); por padrão
+                cada mensagem é gravada antes de a chamada retornar
+            watch_workbook: Se True, a planilha é observada e as abas alteradas
+                são relidas automaticamente (para aplicações que ficam abertas
+                enquanto a planilha é editada); pare com stop()
         """
-        self.excel_handler = ExcelHandler(excel_path)
+        if isinstance(excel_path, str):
+            self.excel_handler = ExcelHandler(excel_path)
+        else:
+            self.excel_handler = WorkbookFederation(excel_path)
         
         # Se uma aba específica foi solicitada, tentar usá-la
         if sheet_name and sheet_name in self.excel_handler.get_available_sheets():
             self.excel_handler.set_current_sheet(sheet_name)
+        
+        # Reler automaticamente as abas alteradas enquanto a planilha é editada
+        if watch_workbook:
+            self.excel_handler.start_watching()
             
-        self.storage = MessageStorage("storage")
+        self.storage = open_message_storage(storage_path, write_behind=write_behind)
+        self.storage_compaction_interval = 3600  # Segundos entre compactações do armazenamento
         
                 # Detectar a porta automaticamente, se falhar, usar a URL padrão
         detected_port = self.detect_whatsapp_port()
@@ -167,61 +189,64 @@ class WhatsAppManager:
         progress_callback = args.get("progress_callback")
         avoid_duplicates = args.get("avoid_duplicates", True)
         
-        # Obter contatos da planilha
-        contacts = self.excel_handler.get_contacts_by_sa(sa_list)
-        
-        if not contacts:
+        # Fixar a aba do início da tarefa; trocar de aba na interface não afeta o envio
+        sheet_name = self.excel_handler.current_sheet
+        
+        # Campanha de diferença: apenas SAs novas (ou alteradas) desde a aba anterior
+        since_sheet = args.get("since_sheet")
+        if since_sheet:
+            delta = self.excel_handler.get_delta_sa_numbers(
+                since_sheet, sheet_name, include_changed=args.get("include_changed", True))
+            if delta is None:
+                return {"success": False, "message": f"Aba '{since_sheet}' não encontrada"}
+            if sa_list:
+                wanted = set(delta)
+                delta = [sa for sa in sa_list if sa in wanted]
+            print(f"Envio apenas para a diferença em relação a '{since_sheet}': {len(delta)} SAs")
+            if not delta:
+                return {"success": False, "message": "Nenhuma SA nova ou alterada em relação à aba anterior"}
+            sa_list = delta
+        
+        # Total apenas para o progresso; os contatos são lidos sob demanda
+        total_messages = self.excel_handler.count_contacts(sa_list, unique=avoid_duplicates,
+                                                           sheet_name=sheet_name)
+        
+        if not total_messages:
             return {"success": False, "message": "Nenhum contato encontrado"}
         
-        # Rastrear clientes processados (para evitar duplicações)
-        processed_clients = set()
-        
-        # Preparar lista de mensagens
-        message_list = []
-        for contact in contacts:
-            sa = str(contact.get('SA', ''))
-            phone = contact.get('Telefone')
-            
-            # Verificar duplicatas se solicitado
-            if avoid_duplicates and sa in processed_clients:
-                print(f"Cliente com SA {sa} já foi processado. Pulando.")
-                continue
-                
-            processed_clients.add(sa)
-            
-            if not phone:
-                print(f"Cliente com SA {sa} não possui número de telefone.")
-                continue
-            
-            # Formatar mensagem personalizada
-            personalized_message = message_template
-            for key, value in contact.items():
-                placeholder = '{' + key.lower() + '}'
-                if placeholder in personalized_message:
-                    personalized_message = personalized_message.replace(placeholder, str(value))
-            
-            message_list.append({
-                "phone": str(phone),
-                "message": personalized_message,
-                "sa": sa
-            })
+        message_stream = self._iter_bulk_messages(sa_list, message_template, avoid_duplicates,
+                                                  sheet_name=sheet_name)
         
         # Resultados
         results = []
-        total_messages = len(message_list)
         sent_count = 0
         
         # Enviar mensagens uma a uma com delay entre elas
-        for index, msg in enumerate(message_list):
+        for index, msg in enumerate(message_stream):
             # Verificar se cancelamento foi solicitado
             if self._cancel_requested:
                 print("Cancelamento solicitado. Interrompendo envio em massa.")
                 break
+            
+            # Aguardar delay configurado entre mensagens (exceto antes da primeira)
+            if index > 0:
+                print(f"Aguardando {self.bulk_message_delay} segundos antes da próxima mensagem...")
+                
+                # Aguardar em pequenos incrementos para poder cancelar
+                delay_remaining = self.bulk_message_delay
+                while delay_remaining > 0 and not self._cancel_requested:
+                    sleep_time = min(delay_remaining, 1)  # Dormir no máximo 1 segundo por vez
+                    time.sleep(sleep_time)
+                    delay_remaining -= sleep_time
+                
+                if self._cancel_requested:
+                    print("Cancelamento solicitado. Interrompendo envio em massa.")
+                    break
                 
             try:
                 # Atualizar progresso
                 if progress_callback:
-                    progress_callback(index + 1, total_messages)
+                    progress_callback(index + 1, max(total_messages, index + 1))
                 
                 # Extrair dados
                 phone = msg["phone"]
@@ -231,7 +256,7 @@ class WhatsAppManager:
                 print(f"Enviando mensagem {index + 1}/{total_messages} para SA {sa}")
                 
                 # Enviar mensagem individual
-                result = self.send_message(phone, message, sa)
+                result = self.send_message(phone, message, sa, sheet_name=sheet_name)
                 
                 results.append({
                     "success": result.get("success", False),
@@ -243,17 +268,6 @@ class WhatsAppManager:
                 if result.get("success", False):
                     sent_count += 1
                 
-                # Aguardar delay configurado entre mensagens (exceto após a última)
-                if index < total_messages - 1 and not self._cancel_requested:
-                    print(f"Aguardando {self.bulk_message_delay} segundos antes da próxima mensagem...")
-                    
-                    # Aguardar em pequenos incrementos para poder cancelar
-                    delay_remaining = self.bulk_message_delay
-                    while delay_remaining > 0 and not self._cancel_requested:
-                        sleep_time = min(delay_remaining, 1)  # Dormir no máximo 1 segundo por vez
-                        time.sleep(sleep_time)
-                        delay_remaining -= sleep_time
-                
             except Exception as e:
                 print(f"Erro ao enviar mensagem para {msg['phone']}: {str(e)}")
                 results.append({
@@ -272,6 +286,54 @@ class WhatsAppManager:
             "cancelled": self._cancel_requested
         }
     
+    def _iter_bulk_messages(self, sa_list: Optional[List[str]], message_template: str,
+                            avoid_duplicates: bool,
+                            sheet_name: Optional[str] = None) -> Iterator[Dict[str, str]]:
+        """
+        Gera as mensagens personalizadas do envio em massa à medida que são consumidas.
+        
+        Args:
+            sa_list: Lista de SAs para enviar mensagens (opcional)
+            message_template: Modelo de mensagem
+            avoid_duplicates: Evitar enviar para o mesmo cliente mais de uma vez
+            sheet_name: Aba de origem dos contatos (opcional, usa a aba atual por padrão)
+            
+        Yields:
+            Dicionário com telefone, mensagem e SA
+        """
+        # Rastrear clientes processados (para evitar duplicações)
+        processed_clients = set()
+        
+        # Modelo preparado uma vez por aba; os contatos não viram dicionários
+        view = None
+        render = None
+        
+        for contact in self.excel_handler.iter_contact_records(sa_list, sheet_name=sheet_name):
+            sa = contact.sa
+            phone = contact.telefone
+            
+            # Verificar duplicatas se solicitado
+            if avoid_duplicates and sa in processed_clients:
+                print(f"Cliente com SA {sa} já foi processado. Pulando.")
+                continue
+                
+            processed_clients.add(sa)
+            
+            if not phone:
+                print(f"Cliente com SA {sa} não possui número de telefone.")
+                continue
+            
+            # Formatar mensagem personalizada
+            if contact.view is not view:
+                view = contact.view
+                render = view.compile_template(message_template)
+            
+            yield {
+                "phone": phone,
+                "message": render(contact.position),
+                "sa": sa
+            }
+    
     def set_sheet(self, sheet_name: str) -> bool:
         """
         Define a aba mensal a ser usada.
@@ -307,7 +369,8 @@ class WhatsAppManager:
             print(f"Erro ao verificar status do WhatsApp: {str(e)}")
             return {"ready": False, "error": str(e)}
     
-    def send_message(self, phone: str, message: str, sa: Optional[str] = None) -> Dict[str, Any]:
+    def send_message(self, phone: str, message: str, sa: Optional[str] = None,
+                     sheet_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Envia uma mensagem para um número de telefone.
         
@@ -315,6 +378,7 @@ class WhatsAppManager:
             phone: Número de telefone
             message: Mensagem a ser enviada
             sa: Número da SA (opcional)
+            sheet_name: Aba onde está o cliente (opcional, usa a aba atual por padrão)
             
         Returns:
             Resultado do envio
@@ -334,7 +398,7 @@ class WhatsAppManager:
             
             # Se SA foi fornecido, salvar a mensagem enviada
             if sa and result.get("success"):
-                client_info = self.excel_handler.get_client_info_by_sa(sa)
+                client_info = self.excel_handler.get_client_info_by_sa(sa, sheet_name=sheet_name)
                 self.storage.save_sent_message(sa, phone, message, client_info)
                 
             return result
@@ -354,7 +418,9 @@ class WhatsAppManager:
     def send_bulk_messages(self, sa_list: Optional[List[str]] = None, 
                           message_template: str = "", 
                           progress_callback: Optional[Callable[[int, int], None]] = None,
-                          avoid_duplicates: bool = True) -> Dict[str, Any]:
+                          avoid_duplicates: bool = True,
+                          since_sheet: Optional[str] = None,
+                          include_changed: bool = True) -> Dict[str, Any]:
         """
         Envia mensagens em massa para clientes.
         
@@ -363,6 +429,9 @@ class WhatsAppManager:
             message_template: Modelo de mensagem (pode incluir marcadores como {nome}, {endereco}, etc.)
             progress_callback: Função de callback para atualizar progresso (recebe atual, total)
             avoid_duplicates: Evitar enviar para o mesmo cliente mais de uma vez
+            since_sheet: Aba anterior (opcional); se informada, só recebem mensagem
+                as SAs novas na aba atual em relação a ela
+            include_changed: Com since_sheet, incluir também as SAs cujos dados mudaram
             
         Returns:
             ID da tarefa em andamento
@@ -381,7 +450,9 @@ class WhatsAppManager:
                 "sa_list": sa_list,
                 "message_template": message_template,
                 "progress_callback": progress_callback,
-                "avoid_duplicates": avoid_duplicates
+                "avoid_duplicates": avoid_duplicates,
+                "since_sheet": since_sheet,
+                "include_changed": include_changed
             }
         })
         
@@ -435,8 +506,20 @@ class WhatsAppManager:
     
     def _process_messages_loop(self) -> None:
         """Loop para processar mensagens recebidas em segundo plano"""
+        last_compaction = time.time()
         while self.should_process_messages:
             self._process_received_messages()
+            
+            # Compactar periodicamente os registros de mensagens
+            if time.time() - last_compaction >= self.storage_compaction_interval:
+                last_compaction = time.time()
+                try:
+                    compacted = self.storage.compact()
+                    if compacted:
+                        print(f"Registros de mensagens compactados: {compacted}")
+                except Exception as e:
+                    print(f"Erro ao compactar mensagens: {str(e)}")
+            
             time.sleep(5)  # Verificar a cada 5 segundos
     
     def _process_received_messages(self) -> None:
@@ -465,29 +548,35 @@ class WhatsAppManager:
         """Processa mensagens históricas para verificar mensagens não respondidas"""
         print("Verificando mensagens históricas não respondidas...")
         try:
-            # Obter lista de clientes com mensagens
-            clients = self.storage.get_all_clients_with_messages()
+            # Clientes com mensagens recebidas nas últimas 24 horas, pelo índice de horários
+            recent_sas = {}
+            cursor = None
+            while True:
+                messages, cursor = self.storage.query(
+                    since=datetime.now() - timedelta(hours=24), type='received',
+                    limit=500, cursor=cursor)
+                for msg in messages:
+                    recent_sas[msg['sa']] = True
+                if cursor is None:
+                    break
             responded_count = 0
             
-            for sa in clients:
-                # Obter todas as mensagens do cliente
-                messages = self.storage.get_client_messages(sa)
-                
-                # Ordenar por timestamp
-                messages.sort(key=lambda x: x.get('timestamp', ''))
+            for sa in recent_sas:
+                # Resumo do cliente (contadores e última mensagem)
+                summary = self.storage.get_client_summary(sa)
                 
                 # Verificar se última mensagem é recebida e não foi respondida
-                if messages and messages[-1].get('type') == 'received':
+                if summary.get('last_type') == 'received':
                     # Verificar se a mensagem é recente (últimas 24 horas)
                     last_msg_time = None
                     try:
-                        last_msg_time = datetime.fromisoformat(messages[-1].get('timestamp', ''))
+                        last_msg_time = datetime.fromisoformat(summary.get('last_timestamp') or '')
                     except (ValueError, TypeError):
                         continue
                         
                     if last_msg_time and (datetime.now() - last_msg_time) < timedelta(hours=24):
                         # Obter telefone do cliente
-                        phone = messages[-1].get('phone')
+                        phone = summary.get('last_phone')
                         if phone:
                             # Enviar resposta automática
                             client_info = self.storage.get_client_info(sa)
@@ -519,8 +608,9 @@ class WhatsAppManager:
             print("Mensagem sem número de telefone.")
             return
         
-        # Buscar SA pelo número de telefone na planilha
-        sa = self._find_sa_by_phone(phone)
+        # Buscar aba e SA pelo número de telefone em todas as abas da planilha
+        match = self.excel_handler.find_client_by_phone(phone)
+        sheet_name, sa = match if match else (None, None)
         
         if sa:
             # Salvar mensagem recebida
@@ -534,9 +624,9 @@ class WhatsAppManager:
             
             # Enviar resposta automática se habilitado
             if self.auto_reply_enabled:
-                # Obter informações do cliente para personalização
-                client_info = self.excel_handler.get_client_info_by_sa(sa)
-                nome = client_info.get('Nome', '')
+                # Obter informações do cliente na aba onde o telefone foi encontrado
+                contact = self.excel_handler.get_client_record(sa, sheet_name=sheet_name)
+                nome = contact.get('Nome', '') if contact else ''
                 
                 # Personalizar mensagem
                 resposta = self.auto_reply_message
@@ -560,46 +650,9 @@ class WhatsAppManager:
         Returns:
             SA correspondente ou None
         """
-        # Esta implementação depende da estrutura da planilha
-        # Vamos fazer uma implementação simples
-        if self.excel_handler.data is None or self.excel_handler.data.empty:
-            return None
-        
-        # Limpar número de telefone para comparação
-        clean_phone = ''.join(filter(str.isdigit, phone))
-        
-        # Verificar se a coluna Telefone existe
-        if 'Telefone' not in self.excel_handler.data.columns:
-            print("Coluna Telefone não encontrada na planilha.")
-            return None
-        
-        # Buscar SA em todas as abas mensais disponíveis
-        for sheet_name in self.excel_handler.get_available_sheets():
-            # Salvar aba atual
-            current_sheet = self.excel_handler.current_sheet
-            
-            # Mudar temporariamente para a aba que estamos verificando
-            if current_sheet is not None:  # Garantir que current_sheet não é None
-                # Verificar se sheet_name não é None antes de passar para set_current_sheet
-                if sheet_name:
-                    self.excel_handler.set_current_sheet(sheet_name)
-                    
-                    # Buscar em todas as linhas da aba atual
-                    for _, row in self.excel_handler.data.iterrows():
-                        row_phone = str(row.get('Telefone', ''))
-                        row_phone_clean = ''.join(filter(str.isdigit, row_phone))
-                        
-                        # Comparar números com lógica flexível
-                        if row_phone_clean and clean_phone.endswith(row_phone_clean[-8:]):
-                            sa = str(row.get('SA', ''))
-                            # Restaurar aba original
-                            self.excel_handler.set_current_sheet(current_sheet)
-                            return sa
-                
-                # Restaurar aba original
-                self.excel_handler.set_current_sheet(current_sheet)
-        
-        return None
+        # Consulta os índices de telefone montados no carregamento da planilha
+        match = self.excel_handler.find_client_by_phone(phone)
+        return match[1] if match else None
     
     def set_auto_reply(self, enabled: bool, message: Optional[str] = None) -> None:
         """
@@ -617,7 +670,10 @@ class WhatsAppManager:
         """Para o processamento de mensagens em background"""
         self.should_process_messages = False
         self._cancel_requested = True
+        self.excel_handler.stop_watching()
         if self.message_thread.is_alive():
             self.message_thread.join(timeout=2)
         if self.task_thread.is_alive():
-            self.task_thread.join(timeout=2) 
\ No newline at end of file
+            self.task_thread.join(timeout=2)
+        # Gravar as mensagens que ainda estão na fila do armazenamento
+        self.storage.close() 
\ No newline at end of file
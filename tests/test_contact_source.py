@@ -0,0 +1,26 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from excel_reader.contact_source import ContactSource, CsvSource, PartitionedFileSource, SourceReader
+
+
+@pytest.mark.parametrize("cls, args", [
+    (SourceReader, ()),
+    (ContactSource, ("contatos.xlsx",)),
+    (PartitionedFileSource, ("contatos",)),
+])
+def test_base_classes_are_abstract(cls, args):
+    with pytest.raises(TypeError):
+        cls(*args)
+
+
+def test_csv_source_reads_partitions(tmp_path):
+    pd.DataFrame({"SA": ["100"], "Nome": ["Maria"]}).to_csv(tmp_path / "Janeiro 25.csv", index=False)
+
+    with CsvSource(str(tmp_path), dtype=str).open() as reader:
+        assert reader.sheet_names == ["Janeiro 25"]
+        [(sheet, df, error, _)] = list(reader.read(reader.sheet_names))
+
+    assert (sheet, error) == ("Janeiro 25", None)
+    assert df["Nome"].tolist() == ["Maria"]
@@ -0,0 +1,30 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from excel_reader.excel_handler import ExcelHandler
+
+
+def test_apply_schema_only_types_declared_columns():
+    handler = ExcelHandler.__new__(ExcelHandler)  # _apply_schema não depende da planilha
+    data = pd.DataFrame({
+        "SA": [100.0, 200.0, 300.0, 400.0],
+        "Status": ["Aberto", "Aberto", "Fechado", "Aberto"],
+        "Observação": ["ok", "ok", "ok", "ok"],
+    })
+
+    data = handler._apply_schema(data)
+
+    assert data["SA"].tolist() == ["100", "200", "300", "400"]
+    assert isinstance(data["Status"].dtype, pd.CategoricalDtype)
+    assert not isinstance(data["Observação"].dtype, pd.CategoricalDtype)
+
+
+def test_partitioned_source_reads_files_without_month_names(tmp_path):
+    pd.DataFrame({"SA": [100, 200], "Telefone": [19999990000, 19999990001]}).to_csv(
+        tmp_path / "contatos.csv", index=False)
+
+    handler = ExcelHandler(str(tmp_path), cache_dir=None)
+
+    assert handler.get_available_sheets() == ["contatos"]
+    assert handler.get_phone_number_by_sa("200") == "19999990001"
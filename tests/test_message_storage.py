@@ -0,0 +1,224 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from storage.message_storage import MessageStorage
+from storage.sqlite_storage import SqliteMessageStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = MessageStorage(str(tmp_path / "storage"))
+    yield storage
+    storage.close()
+
+
+def _save_received(storage, sa, message, timestamp):
+    storage.save_received_message(sa, "5519999999999", message, received_timestamp=timestamp)
+
+
+def test_header_and_log_round_trip(storage):
+    storage.save_sent_message("100", "5519999999999", "Olá", {"SA": "100", "Nome": "Maria"})
+    storage.save_received_message("100", "5519999999999", "Recebi")
+
+    assert storage.get_client_info("100") == {"SA": "100", "Nome": "Maria"}
+    assert [m["message"] for m in storage.get_client_messages("100")] == ["Olá", "Recebi"]
+    summary = storage.get_client_summary("100")
+    assert (summary["sent"], summary["received"], summary["last_type"]) == (1, 1, "received")
+    assert storage.get_all_clients_with_messages() == ["100"]
+
+
+def test_legacy_json_file_is_migrated(tmp_path):
+    storage_dir = tmp_path / "storage"
+    storage_dir.mkdir()
+    legacy = {
+        "client_info": {"SA": "200", "Nome": "João"},
+        "messages": [
+            {"type": "sent", "timestamp": "2026-01-01T10:00:00", "message": "a", "phone": "1"},
+            {"type": "received", "timestamp": "2026-01-01T11:00:00", "message": "b", "phone": "1"}
+        ]
+    }
+    (storage_dir / "client_200.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    storage = MessageStorage(str(storage_dir))
+    assert storage.get_client_messages("200") == legacy["messages"]
+    assert storage.get_client_info("200") == legacy["client_info"]
+    assert not (storage_dir / "client_200.json").exists()
+    assert os.path.exists(storage._get_log_path("200"))
+
+    # As novas mensagens vão para o registro convertido
+    storage.save_received_message("200", "1", "c")
+    assert [m["message"] for m in MessageStorage(str(storage_dir)).get_client_messages("200")] == ["a", "b", "c"]
+
+
+def test_concurrent_writers_with_flush(tmp_path):
+    storage = MessageStorage(str(tmp_path / "storage"), write_behind=True, flush_interval=0.01)
+    writers, per_writer = 8, 50
+
+    def write(index):
+        for number in range(per_writer):
+            # Metade dos escritores divide a mesma SA
+            sa = "shared" if index % 2 else f"own{index}"
+            storage.save_received_message(sa, "1", f"{index}-{number}")
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.flush()
+
+    shared = storage.get_client_messages("shared")
+    assert len(shared) == (writers // 2) * per_writer
+    # As mensagens de cada escritor ficam na ordem em que foram enviadas
+    for index in range(1, writers, 2):
+        mine = [m["message"] for m in shared if m["message"].startswith(f"{index}-")]
+        assert mine == [f"{index}-{number}" for number in range(per_writer)]
+    assert storage.get_client_summary("shared")["received"] == len(shared)
+    storage.close()
+
+    # Depois de close() tudo está no disco
+    reopened = MessageStorage(str(tmp_path / "storage"))
+    assert len(reopened.get_client_messages("shared")) == len(shared)
+    assert len(reopened.get_client_messages("own0")) == per_writer
+
+
+def test_summaries_and_manifest_follow_other_instances(tmp_path):
+    storage_dir = str(tmp_path / "storage")
+    reader = MessageStorage(storage_dir)
+    writer = MessageStorage(storage_dir)
+    try:
+        _save_received(writer, "100", "primeira", "2024-01-01T10:00:00")
+        assert reader.get_all_summaries()["100"]["received"] == 1
+
+        # Gravações de outra instância (ou processo) depois da primeira leitura
+        _save_received(writer, "100", "segunda", "2024-01-01T11:00:00")
+        _save_received(writer, "200", "outro cliente", "2024-01-01T12:00:00")
+
+        assert sorted(reader.get_all_clients_with_messages()) == ["100", "200"]
+        assert reader.get_manifest()["100"]["messages"] == 2
+        summaries = reader.get_all_summaries()
+        assert summaries["100"]["received"] == 2
+        assert summaries["200"]["last_timestamp"] == "2024-01-01T12:00:00"
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_write_behind_reads_see_own_writes(tmp_path):
+    storage = MessageStorage(str(tmp_path / "storage"), write_behind=True, flush_interval=5)
+    storage.save_received_message("300", "1", "pendente")
+    assert [m["message"] for m in storage.get_client_messages("300")] == ["pendente"]
+    storage.close()
+
+
+def test_query_pages_with_cursor(storage):
+    for index in range(25):
+        # Gravadas fora de ordem e em dias diferentes
+        day = 10 + (index * 7) % 5
+        _save_received(storage, f"SA{index % 3}", f"m{index}", f"2026-03-{day:02d}T08:{index:02d}:00")
+
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = storage.query(limit=4, cursor=cursor)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    messages = [m for page in pages for m in page]
+    assert len(messages) == 25
+    assert all(len(page) == 4 for page in pages[:-1])
+    assert [m["timestamp"] for m in messages] == sorted(m["timestamp"] for m in messages)
+    assert len({(m["sa"], m["message"]) for m in messages}) == 25
+
+
+def test_query_filters_and_client_pages(storage):
+    _save_received(storage, "1", "antes", "2026-03-01T08:00:00")
+    _save_received(storage, "1", "dentro", "2026-03-02T08:00:00")
+    storage.save_sent_message("1", "1", "enviada", {"SA": "1"})
+    _save_received(storage, "2", "outro", "2026-03-02T09:00:00")
+    _save_received(storage, "1", "depois", "2026-03-03T08:00:00")
+
+    page, cursor = storage.query(since="2026-03-02", until="2026-03-03", type="received")
+    assert [(m["sa"], m["message"]) for m in page] == [("1", "dentro"), ("2", "outro")]
+    assert cursor is None
+
+    first, cursor = storage.query(sa="1", limit=2)
+    assert [m["message"] for m in first] == ["antes", "dentro"]
+    second, cursor = storage.query(sa="1", limit=2, cursor=cursor)
+    assert [m["message"] for m in second] == ["depois", "enviada"]
+    assert cursor is None
+
+    # Uma mensagem mais antiga gravada depois entra na posição certa
+    _save_received(storage, "1", "mais antiga", "2026-02-01T08:00:00")
+    page, _ = storage.query(sa="1", limit=1)
+    assert page[0]["message"] == "mais antiga"
+
+
+def test_time_index_is_built_on_first_query(tmp_path):
+    storage_dir = str(tmp_path / "storage")
+    storage = MessageStorage(storage_dir)
+    _save_received(storage, "1", "a", "2026-03-01T08:00:00")
+    _save_received(storage, "2", "b", "2026-03-02T08:00:00")
+
+    index_dir = os.path.join(storage_dir, MessageStorage.TIME_INDEX_DIR)
+    assert not os.path.exists(os.path.join(index_dir, MessageStorage.TIME_INDEX_READY_FILE))
+
+    # Armazenamento sem índice montado: a primeira consulta o monta a partir dos registros
+    for filename in os.listdir(index_dir):
+        os.remove(os.path.join(index_dir, filename))
+    reopened = MessageStorage(storage_dir)
+    page, _ = reopened.query()
+    assert [m["message"] for m in page] == ["a", "b"]
+    assert os.path.exists(os.path.join(index_dir, MessageStorage.TIME_INDEX_READY_FILE))
+    assert reopened.rebuild_time_index() == 2
+
+
+def test_header_with_dates_round_trips(tmp_path):
+    storage_dir = str(tmp_path / "storage")
+    storage = MessageStorage(storage_dir)
+    client_info = {"SA": "400", "Nome": "Ana", "Data": datetime.datetime(2026, 3, 5, 14, 30)}
+    storage.save_sent_message("400", "1", "Olá", client_info)
+
+    expected = {"SA": "400", "Nome": "Ana", "Data": "2026-03-05 14:30:00"}
+    assert storage.get_client_info("400") == expected
+    # A leitura do arquivo devolve o mesmo que o cache
+    assert MessageStorage(storage_dir).get_client_info("400") == expected
+
+
+@pytest.mark.parametrize("as_text", [False, True])
+def test_epoch_timestamps_are_stored_as_iso(storage, as_text):
+    storage.save_sent_message("500", "1", "Olá", {"SA": "500"})
+    # O bot envia o horário da resposta em segundos desde a época
+    epoch = int(time.time()) + 1
+    storage.save_received_message("500", "1", "Resposta", received_timestamp=str(epoch) if as_text else epoch)
+
+    received = storage.get_client_messages("500")[-1]
+    assert received["timestamp"] == datetime.datetime.fromtimestamp(epoch).isoformat()
+    assert storage.get_client_summary("500")["last_type"] == "received"
+
+    since = datetime.datetime.now() - datetime.timedelta(hours=24)
+    page, _ = storage.query(since=since, type="received")
+    assert [(m["sa"], m["message"]) for m in page] == [("500", "Resposta")]
+
+
+def test_iso_and_millisecond_timestamps(storage):
+    storage.save_received_message("600", "1", "iso", received_timestamp="2026-03-01T08:00:00")
+    storage.save_received_message("600", "1", "ms", received_timestamp=1772352000000)
+    timestamps = [m["timestamp"] for m in storage.get_client_messages("600")]
+    assert timestamps == ["2026-03-01T08:00:00", datetime.datetime.fromtimestamp(1772352000).isoformat()]
+
+
+def test_sqlite_stores_epoch_timestamps_as_iso(tmp_path):
+    storage = SqliteMessageStorage(str(tmp_path / "messages.db"))
+    storage.save_sent_message("700", "1", "Olá", {"SA": "700"})
+    epoch = int(time.time()) + 1
+    storage.save_received_message("700", "1", "Resposta", received_timestamp=epoch)
+
+    assert storage.get_client_messages("700")[-1]["timestamp"] == datetime.datetime.fromtimestamp(epoch).isoformat()
+    assert storage.get_client_summary("700")["last_type"] == "received"
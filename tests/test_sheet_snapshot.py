@@ -0,0 +1,29 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from excel_reader.sheet_snapshot import SheetSnapshot, normalize_phone
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("(19) 99999-0000", "19999990000"),
+    (19999990000, "19999990000"),
+    (19999990000.0, "19999990000"),
+    (float("nan"), ""),
+    (None, ""),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+def test_get_phone_number_accepts_numeric_columns():
+    data = pd.DataFrame({
+        "SA": ["100", "200", "300"],
+        "Telefone": [19999990000.0, 19999990001.0, float("nan")],
+    })
+    snapshot = SheetSnapshot("Plan1", data, {"100": 0, "200": 1, "300": 2})
+
+    assert snapshot.get_phone_number("100") == "19999990000"
+    assert snapshot.get_phone_number(200) == "19999990001"
+    assert snapshot.get_phone_number("300") is None
+    assert snapshot.get_phone_number("400") is None
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from excel_reader.workbook_cache import WorkbookCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    excel_path = tmp_path / "contatos.xlsx"
+    excel_path.write_bytes(b"planilha")
+    cache = WorkbookCache(str(tmp_path / "cache"), str(excel_path))
+    cache.reset(cache.fingerprint(), ["Janeiro 25"])
+    return cache
+
+
+def _payload(data):
+    return {"data": data, "sa_index": {"100": 0}, "phone_index": ({"19999990000": "100"}, {}), "size": 10}
+
+
+def test_sheet_round_trip(cache):
+    data = pd.DataFrame({
+        "SA": ["100"],
+        "Data": pd.to_datetime(["2025-01-02"]),
+        "Status": pd.Categorical(["Aberto"]),
+    })
+    cache.save_sheet("Janeiro 25", _payload(data))
+
+    reloaded = WorkbookCache(os.path.dirname(cache.cache_dir), cache.excel_path)
+    assert reloaded.is_fresh(reloaded.load_manifest())
+    payload = reloaded.load_sheet("Janeiro 25")
+
+    pd.testing.assert_frame_equal(payload["data"], data)
+    assert payload["sa_index"] == {"100": 0}
+    assert [dict(index) for index in payload["phone_index"]] == [{"19999990000": "100"}, {}]
+
+
+def test_unsupported_sheet_drops_previous_version(cache):
+    cache.save_sheet("Janeiro 25", _payload(pd.DataFrame({"SA": ["100"]})))
+
+    # Colunas com números e textos misturados não são gravadas em Parquet
+    cache.save_sheet("Janeiro 25", _payload(pd.DataFrame({"SA": ["100", "200"], "Documento": [1, "a"]})))
+
+    assert cache.load_sheet("Janeiro 25") is None